@@ -0,0 +1,115 @@
+"""
+Offline Game Analysis Script
+
+This script runs gnubg's deep analysis ("analyse match") on the games saved with
+`main.py --save_sgf`, separately from game play. The saved matches are split
+into chunks and every chunk is analysed by its own gnubg instance, several
+instances in parallel and at a low CPU priority so they can use idle cores.
+The per-player error summaries are stored in analysis.jsonl of each run folder
+and show up as "gnubg_analysis" in the game statistics read by evaluate_runs.py.
+"""
+
+import argparse
+import glob
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List
+
+from src.run_store import RunStore, game_id_from_sgf
+
+
+def find_pending_games(run_folders: List[str], force: bool = False) -> List[str]:
+    """SGF files of the given runs that have not been analysed yet (all of them with force)."""
+    pending = []
+    for run_folder in run_folders:
+        run_store = RunStore(run_folder)
+        analysed = set() if force else set(run_store.read_side_records("gnubg_analysis"))
+        pending += [sgf for sgf in run_store.sgf_files() if game_id_from_sgf(sgf) not in analysed]
+    return pending
+
+
+def analyse_chunk(chunk_id: int, sgf_files: List[str], plies: int, nice: int, timeout: int):
+    """Analyse a chunk of saved matches in one gnubg instance. Returns (chunk_id, error or None)."""
+    env = os.environ.copy()
+    env.update({
+        'GAME_MODE': 'analyse',
+        'GAME_SGF_FILES': os.pathsep.join(os.path.abspath(f) for f in sgf_files),
+        'GAME_ANALYSIS_PLIES': str(plies),
+        'GAME_LOG_FILE': f"analysis_{chunk_id}",
+        'GAME_LOG_PATH': os.path.dirname(os.path.dirname(os.path.abspath(sgf_files[0]))),
+    })
+    try:
+        with open(os.devnull, 'w') as devnull:
+            # nice(1) rather than preexec_fn, which is unsafe with the other chunks' threads running
+            command = (["nice", "-n", str(nice)] if nice else []) + ["gnubg", "-t", "-p", "app.py"]
+            result = subprocess.run(command, stdout=devnull, stderr=subprocess.PIPE, text=True, env=env, timeout=timeout)
+        errors = [line for line in result.stderr.splitlines() if "ERROR" in line or "Traceback" in line]
+        return chunk_id, "\n".join(errors) if errors else None
+    except subprocess.TimeoutExpired:
+        return chunk_id, f"Chunk {chunk_id} timed out after {timeout} seconds"
+    except Exception as e:
+        return chunk_id, f"Failed to run chunk {chunk_id}: {e}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Analyse saved games with gnubg in parallel')
+    parser.add_argument('--output_dir', '--dir', type=str, default='output',
+                        help='Directory containing run folders (default: output)')
+    parser.add_argument('--run_folder', '--run', type=str, default=None,
+                        help='Analyse a specific run folder (default: all runs)')
+    parser.add_argument('--workers', '--w', type=int, default=os.cpu_count() or 1,
+                        help='Number of gnubg instances running in parallel (default: CPU count)')
+    parser.add_argument('--chunk_size', '--chunk', type=int, default=20,
+                        help='Games analysed by one gnubg instance (default: 20)')
+    parser.add_argument('--plies', type=int, default=2,
+                        help='Evaluation plies of the analysis (default: 2)')
+    parser.add_argument('--nice', type=int, default=10,
+                        help='CPU niceness of the gnubg instances, 0 keeps normal priority (default: 10)')
+    parser.add_argument('--timeout', type=int, default=3600,
+                        help='Timeout per chunk in seconds (default: 3600)')
+    parser.add_argument('--force', action='store_true', default=False,
+                        help='Analyse games again even if they were already analysed')
+    args = parser.parse_args()
+
+    if args.run_folder:
+        run_folders = [os.path.join(args.output_dir, args.run_folder)]
+    else:
+        run_folders = sorted(glob.glob(os.path.join(args.output_dir, "run_*")))
+    missing = [folder for folder in run_folders if not os.path.isdir(folder)]
+    if missing or not run_folders:
+        print(f"Error: No run folders found: {missing or args.output_dir}")
+        sys.exit(1)
+
+    pending = find_pending_games(run_folders, force=args.force)
+    if not pending:
+        print("No saved games left to analyse. Run main.py with --save_sgf to save games.")
+        return
+
+    # Chunks never mix run folders, so every gnubg instance writes to one analysis.jsonl and log folder
+    chunks = []
+    for run_folder in run_folders:
+        run_games = [sgf for sgf in pending if os.path.dirname(os.path.dirname(sgf)) == run_folder]
+        chunks += [run_games[i:i + args.chunk_size] for i in range(0, len(run_games), args.chunk_size)]
+
+    print(f"Analysing {len(pending)} games in {len(chunks)} chunks with {args.workers} gnubg instance(s) at {args.plies} plies...")
+    start = time.time()
+    failed = 0
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        futures = [executor.submit(analyse_chunk, i, chunk, args.plies, args.nice, args.timeout) for i, chunk in enumerate(chunks)]
+        for done, future in enumerate(as_completed(futures), 1):
+            chunk_id, error = future.result()
+            if error:
+                failed += 1
+                print(f"Error in chunk {chunk_id}: {error}")
+            print(f"Progress: {done}/{len(chunks)} chunks")
+
+    remaining = len(find_pending_games(run_folders))
+    print(f"\nAnalysed {len(pending) - remaining} games in {time.time() - start:.1f}s ({failed} failed chunks, {remaining} games left)")
+    print("Results are in analysis.jsonl of every run folder and in the game statistics read by evaluate_runs.py.")
+
+
+if __name__ == "__main__":
+    main()
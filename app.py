@@ -3,7 +3,15 @@ import os
 import signal
 import sys
 
+def flush_logs():
+    """Write out any log messages still queued in the logger's background writer."""
+    logger_module = sys.modules.get('src.logger')
+    if logger_module is not None:
+        logger_module.logger.flush()
+
 # allows graceful shutdown on SIGINT (Ctrl+C) or SIGTERM
+# The handler only raises SystemExit: flushing here could deadlock on the logger queue the interrupted code holds.
+# The queued logs are written by the finally below and the logger's atexit flush.
 def signal_handler(sig, frame):
     print('\nReceived interrupt signal, exiting gracefully...')
     sys.exit(0)
@@ -28,5 +36,8 @@ except ImportError as e:
     raise
 
 if __name__ == "__main__":
-    result = main()
+    try:
+        result = main()
+    finally:
+        flush_logs()
     sys.exit(result if result is not None else 0)
@@ -0,0 +1,137 @@
+"""
+LLM Agent Benchmark Script
+
+This script measures LLM agent throughput without API credits: it starts
+mock_llm_server.py with a load profile, runs main.py against it with a per-turn
+trace, and reports games per minute and the p50/p95/p99 move latency of the
+LLM agent from the trace. Everything after "--" is passed on to main.py, so
+concurrency features (--w, --gpp, --llm_cache, LLM_* settings in the
+environment) can be compared under the same profile.
+
+Usage: python benchmark_llm.py --n 20 --latency_ms 800 --tail_rate 0.05 -- --w 4 --gpp 4
+"""
+
+import argparse
+import glob
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+
+import numpy as np
+
+from mock_llm_server import POLICIES
+from src.trace import TRACE_FILE_NAME, iter_trace
+
+
+def wait_for_server(url: str, timeout: float = 10.0) -> bool:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(f"{url}/health", timeout=1):
+                return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+
+def move_latencies(trace_file: str, players) -> np.ndarray:
+    """Agent latencies of the given players' turns in a trace."""
+    return np.array([record.agent_latency for record in iter_trace(trace_file, candidates=False)
+                     if record.player in players], dtype=float)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark LLM agents against the local mock LLM server')
+    parser.add_argument('--agent', '--a', type=str, default='LLMAgent', choices=['LLMAgent', 'LiveCodeAgent'],
+                        help='LLM agent playing as player 1 (default: LLMAgent)')
+    parser.add_argument('--opponent', type=str, default='BestMoveAgent',
+                        choices=['BestMoveAgent', 'RandomAgent', 'LLMAgent', 'LiveCodeAgent'],
+                        help='Agent playing as player 2 (default: BestMoveAgent)')
+    parser.add_argument('--number_of_games', '--n', type=int, default=10, help='Number of games (default: 10)')
+    parser.add_argument('--port', type=int, default=8765, help='Port of the mock server (default: 8765)')
+    parser.add_argument('--policy', type=str, default='best_hint', choices=POLICIES,
+                        help='Response policy of the mock server (default: best_hint)')
+    parser.add_argument('--latency_ms', type=float, default=500, help='Median response latency (default: 500)')
+    parser.add_argument('--jitter', type=float, default=0.3, help='Lognormal latency sigma (default: 0.3)')
+    parser.add_argument('--tail_rate', type=float, default=0.0, help='Share of slow responses (default: 0)')
+    parser.add_argument('--tail_factor', type=float, default=10.0, help='Slowdown of slow responses (default: 10)')
+    parser.add_argument('--error_rate', type=float, default=0.0, help='Share of 500 responses (default: 0)')
+    parser.add_argument('--rate_limit_rate', type=float, default=0.0, help='Share of 429 responses (default: 0)')
+    parser.add_argument('--rpm', type=int, default=0, help='Requests per minute of the mock server, 0 for no limit (default: 0)')
+    parser.add_argument('--seed', type=int, default=None, help='Random seed of the mock server')
+    parser.add_argument('--output_dir', '--dir', type=str, default='output/benchmarks',
+                        help='Folder of the benchmark runs (default: output/benchmarks)')
+    parser.add_argument('main_args', nargs=argparse.REMAINDER, help='Arguments after -- are passed to main.py')
+    args = parser.parse_args()
+    main_args = args.main_args[1:] if args.main_args[:1] == ["--"] else args.main_args
+
+    server_args = ["--port", str(args.port), "--policy", args.policy, "--latency_ms", str(args.latency_ms),
+                   "--jitter", str(args.jitter), "--tail_rate", str(args.tail_rate), "--tail_factor", str(args.tail_factor),
+                   "--error_rate", str(args.error_rate), "--rate_limit_rate", str(args.rate_limit_rate), "--rpm", str(args.rpm)]
+    if args.seed is not None:
+        server_args += ["--seed", str(args.seed)]
+    base_url = f"http://127.0.0.1:{args.port}"
+    server = subprocess.Popen([sys.executable, "mock_llm_server.py"] + server_args, stdout=subprocess.DEVNULL)
+    try:
+        if not wait_for_server(base_url):
+            print(f"Error: mock server did not start on port {args.port}")
+            sys.exit(1)
+
+        env = os.environ.copy()
+        env.update({"LLM_API_URL": f"{base_url}/v1/chat/completions", "LLM_API_KEY": "mock",
+                    "LLM_BATCH_URL": env.get("LLM_BATCH_URL") or f"{base_url}/v1/batch"})
+        before = set(glob.glob(os.path.join(args.output_dir, "run_*")))
+        command = [sys.executable, "main.py", "--a1", args.agent, "--a2", args.opponent, "--n", str(args.number_of_games),
+                   "--fp", args.output_dir, "--trace", "--rows", "0"] + main_args
+        print(f"Running: {' '.join(command)}")
+        start = time.time()
+        result = subprocess.run(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+        wall_time = time.time() - start
+
+        with urllib.request.urlopen(f"{base_url}/stats", timeout=5) as response:
+            server_stats = json.load(response)
+    finally:
+        server.terminate()
+        server.wait()
+
+    runs = sorted(set(glob.glob(os.path.join(args.output_dir, "run_*"))) - before)
+    if result.returncode != 0 or not runs:
+        print(f"Error: main.py failed ({result.returncode}): {result.stderr[-2000:]}")
+        sys.exit(1)
+    run_folder = runs[-1]
+    trace_file = os.path.join(run_folder, TRACE_FILE_NAME)
+    llm_players = {0} | ({1} if args.opponent in ("LLMAgent", "LiveCodeAgent") else set())
+    latencies = move_latencies(trace_file, llm_players) if os.path.exists(trace_file) else np.zeros(0)
+    games = len({record.game_id for record in iter_trace(trace_file, candidates=False)}) if os.path.exists(trace_file) else 0
+
+    report = {
+        "games": games,
+        "wall_time": wall_time,
+        "games_per_minute": games / wall_time * 60 if wall_time else 0.0,
+        "moves": int(latencies.size),
+        "move_latency": {name: float(np.percentile(latencies, q)) if latencies.size else None
+                         for name, q in (("p50", 50), ("p95", 95), ("p99", 99))},
+        "mean_move_latency": float(latencies.mean()) if latencies.size else None,
+        "server": server_stats,
+        "profile": vars(args),
+    }
+    with open(os.path.join(run_folder, "benchmark.json"), 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+
+    print(f"\n⏱️ BENCHMARK ({args.agent} vs {args.opponent}, {' '.join(main_args) or 'default settings'}):")
+    print(f"   {games} games in {wall_time:.1f}s: {report['games_per_minute']:.1f} games/min")
+    if latencies.size:
+        percentiles = report["move_latency"]
+        print(f"   {latencies.size} LLM moves, latency p50 {percentiles['p50']:.2f}s, p95 {percentiles['p95']:.2f}s, "
+              f"p99 {percentiles['p99']:.2f}s (mean {report['mean_move_latency']:.2f}s)")
+    print(f"   Mock server: {server_stats['requests']} requests, {server_stats['errors']} errors, "
+          f"{server_stats['rate_limited']} rate limited, {server_stats['batches']} batches, "
+          f"{server_stats['cancelled_streams']}/{server_stats['streams']} streams cancelled")
+    print(f"   Saved to: {os.path.join(run_folder, 'benchmark.json')}")
+
+
+if __name__ == "__main__":
+    main()
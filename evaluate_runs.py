@@ -13,12 +13,27 @@ import argparse
 import sys
 from typing import Dict, List
 
+from src.run_store import RunStore
+from src.run_index import RunIndex, MANIFEST_FILE_NAME
+from src.equity import EquityReport, inputs_label, ERROR_THRESHOLD, BLUNDER_THRESHOLD, PR_SCALE
+from src.run_aggregate import RunTotals, aggregate_run
+from src.run_statistics import CI_METHODS, analyze_runs
+from src.metrics import Z_VALUES
+
 class GameRunEvaluator:
-    """Evaluates and analyzes game runs from run_timestamp folders."""
+    """Evaluates and analyzes game runs from run_timestamp folders.
+        With db_path the runs are ingested into an incremental SQLite index and reports are answered from it.
+    """
     
-    def __init__(self, output_dir: str = "output"):
+    def __init__(self, output_dir: str = "output", db_path: str = None, loader_workers: int = None):
         self.output_dir = output_dir
         self.runs_data = {}
+        self.loader_workers = loader_workers
+        self.index = RunIndex(db_path) if db_path else None
+
+    def ingest(self) -> int:
+        """Index the games added to the run folders since the last call."""
+        return self.index.ingest(self.output_dir)
         
     def find_run_folders(self) -> List[str]:
         """Find all run_timestamp folders in the output directory."""
@@ -27,100 +42,71 @@ class GameRunEvaluator:
         return sorted(run_folders)
     
     def load_game_stats(self, run_folder: str) -> List[Dict]:
-        """Load all game_stats.json files from a run folder."""
-        stats_files = glob.glob(os.path.join(run_folder, "*_stats.json"))
-        game_results = []
-        
-        for stats_file in sorted(stats_files):
-            try:
-                with open(stats_file, 'r') as f:
-                    stats = json.load(f)
-                    game_results.append(stats)
-            except Exception as e:
-                print(f"Warning: Could not read {stats_file}: {e}")
-                continue
-                
+        """Load all game statistics of a run folder, from its stats.jsonl archive and legacy game_stats.json files."""
+        game_results = list(RunStore(run_folder).iter_stats())
+        game_results.sort(key=lambda game: game.get("game_id", 0))
         return game_results
+
+    def migrate_runs(self, remove_legacy: bool = False):
+        """Move the per-game stats files of every run folder into its stats.jsonl archive."""
+        for run_folder in self.find_run_folders():
+            migrated = RunStore(run_folder).migrate(remove_legacy=remove_legacy)
+            print(f"  - {os.path.basename(run_folder)}: {migrated} games migrated")
     
-    def analyze_run(self, run_folder: str) -> Dict:
-        """Analyze a single run folder and return comprehensive statistics."""
+    def analyze_run(self, run_folder: str, include_games: bool = True) -> Dict:
+        """Analyze a single run folder and return comprehensive statistics.
+            include_games=False skips loading the per-game results when they are not printed.
+        """
         run_name = os.path.basename(run_folder)
+        if self.index:
+            return self.index.analyze_run(run_name, include_games=include_games)
+        if not include_games:
+            # Streamed into running totals by a worker pool, memory does not grow with the run size
+            return aggregate_run(run_folder, workers=self.loader_workers).analysis(run_name, run_folder)
+
+        totals = RunTotals()
         game_results = self.load_game_stats(run_folder)
-        
-        if not game_results:
-            return {
-                "run_name": run_name,
-                "run_folder": run_folder,
-                "num_games": 0,
-                "error": "No game statistics found"
-            }
-        
-        # Initialize counters
-        agent1_wins = 0
-        agent2_wins = 0
-        total_invalid_moves_p1 = 0
-        total_invalid_moves_p2 = 0
-        total_moves_p1 = 0
-        total_moves_p2 = 0
-        total_duration = 0
-        total_turns = 0
-        game_types = {"normal": 0, "gammon": 0, "backgammon": 0}
-        
-        # Get agent names from first game
-        agent1_name = game_results[0].get("player1_stats", {}).get("name", "Player1")
-        agent2_name = game_results[0].get("player2_stats", {}).get("name", "Player2")
-        
-        # Process each game
         for game in game_results:
-            winner = game.get("winner")
-            if winner == 0:
-                agent1_wins += 1
-            elif winner == 1:
-                agent2_wins += 1
-            
-            # Aggregate statistics
-            p1_stats = game.get("player1_stats", {})
-            p2_stats = game.get("player2_stats", {})
-            
-            total_invalid_moves_p1 += p1_stats.get("invalid_moves", 0)
-            total_invalid_moves_p2 += p2_stats.get("invalid_moves", 0)
-            total_moves_p1 += p1_stats.get("total_moves", 0)
-            total_moves_p2 += p2_stats.get("total_moves", 0)
-            total_duration += game.get("game_duration", 0)
-            total_turns += game.get("total_turns", 0)
-            
-            game_type = game.get("game_type", "normal")
-            game_types[game_type] = game_types.get(game_type, 0) + 1
-        
-        num_games = len(game_results)
-        
-        return {
-            "run_name": run_name,
-            "run_folder": run_folder,
-            "num_games": num_games,
-            "agent1_name": agent1_name,
-            "agent2_name": agent2_name,
-            "agent1_wins": agent1_wins,
-            "agent2_wins": agent2_wins,
-            "agent1_win_rate": agent1_wins / num_games * 100 if num_games > 0 else 0,
-            "agent2_win_rate": agent2_wins / num_games * 100 if num_games > 0 else 0,
-            "total_duration": total_duration,
-            "avg_duration": total_duration / num_games if num_games > 0 else 0,
-            "total_turns": total_turns,
-            "avg_turns": total_turns / num_games if num_games > 0 else 0,
-            "total_invalid_moves_p1": total_invalid_moves_p1,
-            "total_invalid_moves_p2": total_invalid_moves_p2,
-            "total_moves_p1": total_moves_p1,
-            "total_moves_p2": total_moves_p2,
-            "invalid_move_rate_p1": total_invalid_moves_p1 / total_moves_p1 * 100 if total_moves_p1 > 0 else 0,
-            "invalid_move_rate_p2": total_invalid_moves_p2 / total_moves_p2 * 100 if total_moves_p2 > 0 else 0,
-            "game_types": game_types,
-            "game_results": game_results
-        }
+            totals.add(game)
+        return totals.analysis(run_name, run_folder, game_results)
+    
+    def equity_report(self, run_folders: List[str]) -> List[Dict]:
+        """Aggregate the recorded equity loss of every move per agent, agent input config and game phase."""
+        report = EquityReport()
+        for run_folder in run_folders:
+            manifest_file = os.path.join(run_folder, MANIFEST_FILE_NAME)
+            manifest = {}
+            if os.path.exists(manifest_file):
+                with open(manifest_file, 'r') as f:
+                    manifest = json.load(f)
+            inputs = inputs_label(manifest.get("inputs"))
+            for game in RunStore(run_folder).iter_stats():
+                report.add_game(game, inputs)
+        return report.rows()
+
+    def print_equity_report(self, rows: List[Dict]):
+        """Print error rates and PR per agent, agent input config and game phase."""
+        print(f"\n{'='*100}")
+        print(f"{'EQUITY LOSS ANALYSIS':^100}")
+        print(f"{'='*100}")
+        if not rows:
+            print("No equity analysis recorded in these runs.")
+            return
+        print(f"Moves losing >= {ERROR_THRESHOLD} are errors, >= {BLUNDER_THRESHOLD} blunders. PR = {PR_SCALE} x mean equity loss (lower is better).\n")
+        print(f"{'Agent':<20} {'Inputs':<28} {'Phase':<8} {'Moves':<8} {'Avg Loss':<9} {'Error%':<7} {'Blunder%':<9} {'PR':<6}")
+        print(f"{'-'*100}")
+        for row in rows:
+            print(f"{row['agent'][:20]:<20} {row['inputs'][:28]:<28} {row['phase']:<8} {row['moves']:<8} "
+                  f"{row['mean_equity_loss']:<9.4f} {row['error_rate'] * 100:<7.1f} {row['blunder_rate'] * 100:<9.1f} {row['pr']:<6.1f}")
     
-    def evaluate_all_runs(self) -> Dict:
-        """Evaluate all run folders and return comprehensive analysis."""
-        run_folders = self.find_run_folders()
+    def evaluate_all_runs(self, include_games: bool = True, **filters) -> Dict:
+        """Evaluate all run folders and return comprehensive analysis.
+            filters (agent, prompt, inputs, since, until) select runs through the index, see RunIndex.query_runs.
+        """
+        if self.index:
+            run_folders = [os.path.join(self.output_dir, run_name) for run_name in self.index.query_runs(**filters)]
+        else:
+            run_folders = self.find_run_folders()
         
         if not run_folders:
             return {"error": f"No run folders found in {self.output_dir}"}
@@ -132,12 +118,12 @@ class GameRunEvaluator:
         runs_analysis = {}
         for run_folder in run_folders:
             print(f"\nAnalyzing {os.path.basename(run_folder)}...")
-            analysis = self.analyze_run(run_folder)
+            analysis = self.analyze_run(run_folder, include_games=include_games)
             runs_analysis[analysis["run_name"]] = analysis
         
         return runs_analysis
     
-    def print_detailed_report(self, runs_analysis: Dict):
+    def print_detailed_report(self, runs_analysis: Dict, statistics: Dict = None):
         """Print a detailed report similar to main.py's output format."""
         print(f"\n{'='*80}")
         print(f"{'GAME RUN EVALUATION REPORT':^80}")
@@ -207,9 +193,19 @@ class GameRunEvaluator:
                 if count > 0:
                     percentage = count / analysis['num_games'] * 100
                     print(f"   {game_type.capitalize()}: {count} games ({percentage:.1f}%)")
+
+            if statistics:
+                intervals = statistics["intervals"][run_name]
+                print(f"\n📏 CONFIDENCE INTERVALS ({statistics['confidence']:.0%}, {statistics['method']}):")
+                for metric, label in (("agent1_win_rate", f"{analysis['agent1_name']} win rate"),
+                                      ("gammon_rate", "Gammon rate"),
+                                      ("invalid_move_rate_p1", f"Invalid move rate - {analysis['agent1_name']}"),
+                                      ("invalid_move_rate_p2", f"Invalid move rate - {analysis['agent2_name']}")):
+                    rate, low, high = intervals[metric]
+                    print(f"   {label}: {rate:.2%} [{low:.2%}, {high:.2%}]")
     
     
-    def compare_runs(self, runs_analysis: Dict):
+    def compare_runs(self, runs_analysis: Dict, statistics: Dict = None):
         """Compare performance across different runs."""
         print(f"\n{'='*80}")
         print(f"{'RUN COMPARISON':^80}")
@@ -230,6 +226,84 @@ class GameRunEvaluator:
             print(f"{run_name:<20} {analysis['num_games']:<6} {analysis['agent1_win_rate']:<11.1f}% {analysis['agent2_win_rate']:<11.1f}% {analysis['avg_duration']:<11.2f}s {analysis['avg_turns']:<9.1f}")
         print(f"{'-'*80}")
 
+        if not statistics:
+            return
+
+        print(f"\n📏 CONFIDENCE INTERVALS ({statistics['confidence']:.0%}, {statistics['method']}):")
+        print(f"{'Run':<20} {'Agent1 Win%':<20} {'Gammon%':<20} {'Invalid% P1':<20} {'Invalid% P2':<20}")
+        print(f"{'-'*100}")
+        for run_name in valid_runs:
+            cells = [f"{rate * 100:.1f} [{low * 100:.1f}-{high * 100:.1f}]"
+                     for rate, low, high in statistics["intervals"][run_name].values()]
+            print(f"{run_name:<20} " + " ".join(f"{cell:<20}" for cell in cells))
+        print(f"{'-'*100}")
+
+        alpha = 1 - statistics["confidence"]
+        significant = [test for test in statistics["pairwise"] if test["p_adjusted"] < alpha]
+        print(f"\n🔬 SIGNIFICANT DIFFERENCES (Holm-adjusted p < {alpha:.2f}): {len(significant)} of {len(statistics['pairwise'])} tests")
+        for test in significant:
+            print(f"   {test['metric']}: {test['run_a']} vs {test['run_b']}: "
+                  f"{test['difference'] * 100:+.2f} points (p={test['p_value']:.4f}, adjusted {test['p_adjusted']:.4f})")
+
+def _synthetic_game(game_id: int) -> Dict:
+    winner = game_id % 2
+    return {
+        "game_id": game_id, "winner": winner, "winner_name": ["Agent1", "Agent2"][winner], "loser_name": ["Agent2", "Agent1"][winner],
+        "game_duration": 12.5, "total_turns": 40, "game_type": "normal",
+        "player1_stats": {"name": "Agent1", "total_moves": 15 + game_id % 11, "invalid_moves": game_id % 3, "checkers_remaining": 0},
+        "player2_stats": {"name": "Agent2", "total_moves": 20, "invalid_moves": 0, "checkers_remaining": 5},
+    }
+
+
+def benchmark_loading(num_games: int, workers: int = None):
+    """Time the stats loaders on a synthetic run, in both the per-game file and the stats.jsonl format."""
+    import tempfile
+    import time
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        legacy_run = os.path.join(tmp_dir, "run_legacy")
+        archive_run = os.path.join(tmp_dir, "run_archive")
+        os.makedirs(legacy_run)
+        os.makedirs(archive_run)
+        print(f"Writing a synthetic run of {num_games} games in both formats...")
+        with open(os.path.join(archive_run, "stats.jsonl"), 'w') as archive:
+            for game_id in range(num_games):
+                line = json.dumps(_synthetic_game(game_id))
+                archive.write(line + "\n")
+                with open(os.path.join(legacy_run, f"game_{game_id}_stats.json"), 'w') as f:
+                    f.write(line)
+
+        evaluator = GameRunEvaluator(tmp_dir, loader_workers=workers)
+        loaders = [
+            ("load_game_stats (serial, in memory)", lambda run: evaluator.analyze_run(run, include_games=True)),
+            ("aggregate_run (1 worker)", lambda run: aggregate_run(run, workers=1).analysis("", run)),
+            (f"aggregate_run ({workers or os.cpu_count()} threads)", lambda run: aggregate_run(run, workers=workers, processes=False).analysis("", run)),
+            (f"aggregate_run ({workers or os.cpu_count()} processes)", lambda run: aggregate_run(run, workers=workers).analysis("", run)),
+        ]
+        print(f"\n{'Loader':<40} {'Format':<12} {'Seconds':<8} {'Games/sec':<10}")
+        print(f"{'-'*72}")
+        for name, loader in loaders:
+            for run_format, run_folder in (("per-game", legacy_run), ("stats.jsonl", archive_run)):
+                start = time.perf_counter()
+                analysis = loader(run_folder)
+                elapsed = time.perf_counter() - start
+                assert analysis["num_games"] == num_games, analysis.get("error")
+                print(f"{name:<40} {run_format:<12} {elapsed:<8.2f} {num_games / elapsed:<10.0f}")
+
+        # Bootstrap cost depends on the number of distinct histogram rows, not on the number of games
+        analysis = aggregate_run(archive_run, workers=1).analysis("run_a", archive_run)
+        scale = max(1, 1_000_000 // num_games)
+        scaled = dict(analysis, num_games=analysis["num_games"] * scale, agent1_wins=analysis["agent1_wins"] * scale,
+                      move_histograms=[[[invalid, total, count * scale] for invalid, total, count in histogram]
+                                       for histogram in analysis["move_histograms"]])
+        for key in ("total_invalid_moves_p1", "total_invalid_moves_p2", "total_moves_p1", "total_moves_p2"):
+            scaled[key] = analysis[key] * scale
+        scaled["game_types"] = {game_type: count * scale for game_type, count in analysis["game_types"].items()}
+        start = time.perf_counter()
+        analyze_runs([scaled, dict(scaled, run_name="run_b")], method="bootstrap", resamples=10000)
+        print(f"\nBootstrap, 10000 resamples of 2 runs x {scaled['num_games']} games: {time.perf_counter() - start:.2f}s")
+
+
 def main():
     parser = argparse.ArgumentParser(description='Evaluate backgammon game runs from run_timestamp folders')
     parser.add_argument('--output_dir', '--dir', type=str, default='output',
@@ -240,15 +314,67 @@ def main():
                         help='Compare performance across runs')
     parser.add_argument('--quiet', '--q', action='store_true', default=False,
                         help='Suppress detailed output, only show summary')
+    parser.add_argument('--migrate', action='store_true', default=False,
+                        help='Move per-game stats files of old run folders into stats.jsonl archives')
+    parser.add_argument('--remove_legacy', action='store_true', default=False,
+                        help='With --migrate, delete the per-game stats files after migrating them')
+    parser.add_argument('--equity', action='store_true', default=False,
+                        help='Report equity loss, error rates and PR per agent, agent inputs and game phase')
+    parser.add_argument('--ci', type=str, default='wilson', choices=list(CI_METHODS) + ['none'],
+                        help='Confidence intervals and significance tests: wilson, bootstrap or none (default: wilson)')
+    parser.add_argument('--confidence', type=float, default=0.95, choices=sorted(Z_VALUES),
+                        help='Confidence level of the intervals (default: 0.95)')
+    parser.add_argument('--resamples', type=int, default=10000,
+                        help='Bootstrap resamples, used by --ci bootstrap and by the invalid move rates (default: 10000)')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='Random seed of the bootstrap, for reproducible intervals')
+    parser.add_argument('--loader_workers', '--lw', type=int, default=None,
+                        help='Worker processes used to aggregate stats in --quiet mode without the index (default: CPU count)')
+    parser.add_argument('--benchmark', type=int, default=None, metavar='NUM_GAMES',
+                        help='Benchmark the stats loaders on a synthetic run of NUM_GAMES games and exit')
+    parser.add_argument('--db', type=str, default=None,
+                        help='SQLite run index, updated incrementally before each report (default: <output_dir>/runs.db)')
+    parser.add_argument('--no_db', action='store_true', default=False,
+                        help='Read the run folders directly instead of using the run index')
+    parser.add_argument('--agent', type=str, default=None,
+                        help='Only runs where an agent type containing this text played, case-insensitive, e.g. llm (index only)')
+    parser.add_argument('--prompt', type=str, default=None,
+                        help='Only runs whose prompt or system prompt contains this text (index only)')
+    parser.add_argument('--inputs', type=str, nargs='+', default=None, choices=['possible_moves', 'hints', 'best_move'],
+                        help='Only runs with these agent inputs enabled (index only)')
+    parser.add_argument('--since', type=str, default=None,
+                        help='Only runs started on or after this date, e.g. 2025-09-01 (index only)')
+    parser.add_argument('--until', type=str, default=None,
+                        help='Only runs started on or before this date, e.g. 2025-09-30 (index only)')
     
     args = parser.parse_args()
+    if args.ci == 'none':
+        args.ci = None
+
+    if args.benchmark:
+        benchmark_loading(args.benchmark, args.loader_workers)
+        return
     
     # Validate output directory
     if not os.path.exists(args.output_dir):
         print(f"Error: Output directory '{args.output_dir}' does not exist")
         sys.exit(1)
     
-    evaluator = GameRunEvaluator(args.output_dir)
+    filters = {"agent": args.agent, "prompt": args.prompt, "inputs": args.inputs, "since": args.since, "until": args.until}
+    if args.no_db and any(filters.values()):
+        print("Error: --agent, --prompt, --inputs, --since and --until need the run index, remove --no_db")
+        sys.exit(1)
+
+    db_path = None if args.no_db else (args.db or os.path.join(args.output_dir, "runs.db"))
+    evaluator = GameRunEvaluator(args.output_dir, db_path=db_path, loader_workers=args.loader_workers)
+
+    if args.migrate:
+        print(f"Migrating run folders in {args.output_dir}:")
+        evaluator.migrate_runs(remove_legacy=args.remove_legacy)
+        return
+
+    if evaluator.index:
+        print(f"Indexed {evaluator.ingest()} new games into {db_path}")
     
     if args.run_folder:
         # Analyze specific run folder
@@ -257,23 +383,34 @@ def main():
             print(f"Error: Run folder '{run_path}' does not exist")
             sys.exit(1)
         
-        analysis = evaluator.analyze_run(run_path)
+        analysis = evaluator.analyze_run(run_path, include_games=not args.quiet)
         runs_analysis = {analysis["run_name"]: analysis}
     else:
         # Analyze all runs
-        runs_analysis = evaluator.evaluate_all_runs()
+        runs_analysis = evaluator.evaluate_all_runs(include_games=not args.quiet, **filters)
         
         if "error" in runs_analysis:
             print(f"Error: {runs_analysis['error']}")
             sys.exit(1)
     
+    statistics = None
+    if args.ci:
+        valid_analyses = [analysis for analysis in runs_analysis.values() if not analysis.get("error")]
+        statistics = analyze_runs(valid_analyses, method=args.ci, confidence=args.confidence,
+                                  resamples=args.resamples, seed=args.seed)
+        statistics.update(method=args.ci, confidence=args.confidence)
+
     # Print detailed report unless quiet mode
     if not args.quiet:
-        evaluator.print_detailed_report(runs_analysis)
+        evaluator.print_detailed_report(runs_analysis, statistics)
     
     # Compare runs if requested
     if args.compare and len(runs_analysis) > 1:
-        evaluator.compare_runs(runs_analysis)
+        evaluator.compare_runs(runs_analysis, statistics)
+
+    if args.equity:
+        run_folders = [os.path.join(args.output_dir, run_name) for run_name in runs_analysis]
+        evaluator.print_equity_report(evaluator.equity_report(run_folders))
         
     print(f"\n{'='*80}")
 
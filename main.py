@@ -1,13 +1,28 @@
 #!/usr/bin/env python3
 import subprocess
 import os
+import json
 import argparse
 import sys
 import time
+import threading
+import csv
+import itertools
+import random
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from src.positions import POSITION_MODES, load_position_corpus, plan_position_games
+from src.trace import TRACE_FILE_NAME
+from src.run_store import RunStore, GAMES_DIR_NAME
+from src.run_index import MANIFEST_FILE_NAME
+from src.metrics import OnlineStats
+from src.dataset_builder import DatasetBuilder
+from src.cassette import CASSETTE_MODES, CASSETTE_DIR_NAME, recorded_game_ids
 
 def _build_game_env(game_id, log_file_name, log_folder_path, agent1, agent2,
                    debug_mode, possible_moves, hints, best_move, prompt,
-                   system_prompt, json_logs):
+                   system_prompt, json_logs, position=None, position_turn=0, extra_env=None):
     """Build environment variables for game execution"""
     env = os.environ.copy()
     env.update({
@@ -22,125 +37,536 @@ def _build_game_env(game_id, log_file_name, log_folder_path, agent1, agent2,
         'GAME_BEST_MOVE': str(best_move).lower(),
         'GAME_PROMPT': prompt or "",
         'GAME_SYSTEM_PROMPT': system_prompt or "",
-        'GAME_JSON_LOGS': str(json_logs).lower()
+        'GAME_JSON_LOGS': str(json_logs).lower(),
+        'GAME_POSITION_ID': position["position_id"] if position else "",
+        'GAME_POSITION_DICE': "".join(str(d) for d in position["dice"]) if position and position.get("dice") else "",
+        'GAME_POSITION_TURN': str(position_turn)
     })
+    env.update(extra_env or {})
     return env
 
-def run_silent_game(game_id, log_file_name, log_folder_path, agent1, agent2, debug_mode, possible_moves=False, hints=False, best_move=False, prompt=None, system_prompt=None, json_logs=False):
-    """Run a single game silently and return winner and statistics"""
+# Counters of the games' LLM client and response cache metrics summed up over a batch
+LLM_TOTALS = ("calls", "attempts", "retries", "failures", "timeouts", "rate_limited", "connections_opened",
+              "requests_sent", "backoff_seconds", "streams", "early_stops",
+              "rate_limit_wait_seconds", "hedged", "hedge_wins", "hedges_over_budget")
+LLM_COALESCER_TOTALS = ("requests", "flushes", "batches", "batched_requests", "batch_failures")
+LLM_CACHE_TOTALS = ("memory_hits", "disk_hits", "misses", "stores", "expired", "evictions")
+
+def _current_rss_mb(pid):
+    """Current resident set size of a process in MB, None where /proc is not available"""
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        return None
+
+def _resources_from_rusage(rusage, wall_time):
+    """Convert the rusage of a finished child process to a GameResources dict"""
+    max_rss_kb = rusage.ru_maxrss / 1024 if sys.platform == 'darwin' else rusage.ru_maxrss  # bytes on macOS
+    return {
+        "wall_time": wall_time,
+        "cpu_user": rusage.ru_utime,
+        "cpu_system": rusage.ru_stime,
+        "max_rss_mb": max_rss_kb / 1024,
+        "voluntary_ctx_switches": rusage.ru_nvcsw,
+        "involuntary_ctx_switches": rusage.ru_nivcsw
+    }
+
+def run_silent_game(game_id, log_file_name, log_folder_path, agent1, agent2, debug_mode, possible_moves=False, hints=False, best_move=False, prompt=None, system_prompt=None, json_logs=False, position=None, position_turn=0,
+                    extra_env=None, timeout=1200, memory_limit_mb=None):
+    """Run a single game silently and return its exit code, error and resource usage.
+    The game fails if it runs longer than timeout seconds or its gnubg process uses more than memory_limit_mb.
+    """
     env = _build_game_env(game_id, log_file_name, log_folder_path, agent1, agent2,
                          debug_mode, possible_moves, hints, best_move, prompt,
-                         system_prompt, json_logs)
+                         system_prompt, json_logs, position, position_turn, extra_env)
     
+    start_time = time.time()
     try:
         # Suppress gnubg stdout but capture stderr for error checking
         with open(os.devnull, 'w') as devnull:
-            result = subprocess.run([
+            process = subprocess.Popen([
                 "gnubg", "-t", "-p", "app.py"
-            ], stdout=devnull, stderr=subprocess.PIPE, text=True, env=env, timeout=1200)
-        
-        # Check for actual errors in stderr (filter out noise)
-        if result.stderr and result.stderr.strip():
-            error_lines = [line for line in result.stderr.strip().split("\n") 
-                          if "alsa" not in line.lower()]  # Filter ALSA warnings
-            
-            if error_lines and any(keyword in "\n".join(error_lines).lower() 
-                                 for keyword in ['error', 'exception', 'traceback', 'failed', 'fatal']):
-                error_msg = "\n".join(error_lines)
-                print(f"Error in game {game_id}: {error_msg}")
-                return None, error_msg
-
-        return result.returncode, None
-        
-    except subprocess.TimeoutExpired:
-        error_msg = f"Game {game_id} timed out after 20 minutes"
-        print(error_msg)
-        return None, error_msg
+            ], stdout=devnull, stderr=subprocess.PIPE, text=True, env=env)
     except Exception as e:
         error_msg = f"Failed to run game {game_id}: {str(e)}"
         print(error_msg)
-        return None, error_msg
+        return None, error_msg, None
+
+    # Drain stderr in the background so the pipe never fills up while we wait for the process
+    stderr_chunks = []
+    stderr_reader = threading.Thread(target=lambda: stderr_chunks.append(process.stderr.read()), daemon=True)
+    stderr_reader.start()
+
+    # Kill the game when it runs out of time or memory
+    kill_reasons = []
+    finished = threading.Event()
+    kill_lock = threading.Lock()  # the process is only killed while it is not reaped, its pid could be reused after
+    def watchdog():
+        while not finished.wait(0.5):
+            reason = None
+            if timeout and time.time() - start_time > timeout:
+                reason = f"Game {game_id} timed out after {timeout} seconds"
+            elif memory_limit_mb:
+                rss_mb = _current_rss_mb(process.pid)
+                if rss_mb is not None and rss_mb > memory_limit_mb:
+                    reason = f"Game {game_id} exceeded the memory limit of {memory_limit_mb} MB ({rss_mb:.0f} MB)"
+            if reason:
+                with kill_lock:
+                    if not finished.is_set():
+                        kill_reasons.append(reason)
+                        process.kill()
+                return
+    threading.Thread(target=watchdog, daemon=True).start()
+
+    # Wait for the exit without reaping, then stop the watchdog before wait4 reaps the process and reads its resource usage
+    if hasattr(os, "waitid"):
+        os.waitid(os.P_PID, process.pid, os.WEXITED | os.WNOWAIT)
+    with kill_lock:
+        finished.set()
+    _, status, rusage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+    resources = _resources_from_rusage(rusage, time.time() - start_time)
+    stderr_reader.join()
+    process.stderr.close()
+
+    if kill_reasons:
+        print(kill_reasons[0])
+        return None, kill_reasons[0], resources
+    if memory_limit_mb and resources["max_rss_mb"] > memory_limit_mb:
+        error_msg = f"Game {game_id} exceeded the memory limit of {memory_limit_mb} MB (peak {resources['max_rss_mb']:.0f} MB)"
+        print(error_msg)
+        return None, error_msg, resources
+
+    # Check for actual errors in stderr: tracebacks and the logger's errors, not words that happen to appear in other output
+    stderr = "".join(stderr_chunks)
+    if stderr and stderr.strip():
+        error_lines = [line for line in stderr.strip().split("\n") 
+                      if "alsa" not in line.lower()]  # Filter ALSA warnings
+        
+        if any(line.startswith(("Traceback", "ERROR:")) for line in error_lines):
+            error_msg = "\n".join(error_lines)
+            print(f"Error in game {game_id}: {error_msg}")
+            return None, error_msg, resources
 
-def run_batch_games(num_games, log_file_name="game", log_folder_path="output", agent1="BestMoveAgent", agent2="RandomAgent", debug_mode=False, possible_moves=False, hints=False, best_move=False, prompt=None, system_prompt=None, export_csv=False, json_logs=False):
-    """Run multiple games and show summary with detailed statistics"""
-    # Create a distinct folder for this batch run
+    return process.returncode, None, resources
+
+def run_multiplexed_games(group, log_file_name, log_folder_path, agent1, agent2, debug_mode, possible_moves, hints, best_move, prompt,
+                          system_prompt, json_logs, extra_env, memory_limit_mb=None):
+    """Run a group of (game_id, (position, position_turn)) games concurrently in one gnubg process.
+    Returns (None, error, resources) if the process failed, else (-1, None, resources): the winners are read from
+    the games' statistics, and a game without statistics failed. The resources are those of the whole group.
+    """
+    game_ids = [game_id for game_id, _ in group]
+    positions = [{"position_id": position["position_id"], "turn": position_turn,
+                  "dice": "".join(str(d) for d in position["dice"]) if position.get("dice") else ""} if position else None
+                 for _, (position, position_turn) in group]
+    group_env = {**extra_env, 'GAME_IDS': ",".join(str(game_id) for game_id in game_ids),
+                 'GAME_LOG_PREFIX': log_file_name, 'GAME_POSITIONS': json.dumps(positions)}
+    returncode, err, resources = run_silent_game(game_ids[0], log_file_name, log_folder_path, agent1, agent2, debug_mode, possible_moves,
+                                                 hints, best_move, prompt, system_prompt, json_logs, extra_env=group_env,
+                                                 timeout=1200 * len(group), memory_limit_mb=memory_limit_mb)
+    # The exit code of a group says nothing about the winners, they are read from the games' statistics
+    if err is None and returncode != 0:
+        err = f"Process of games {game_ids[0]}-{game_ids[-1]} exited with code {returncode}"
+    return (-1 if err is None else None), err, resources
+
+def _create_run_folder(log_folder_path):
+    """Create a distinct folder for a batch run and return its path"""
     run_timestamp = time.strftime('%Y%m%d_%H%M%S')
-    base_log_folder = log_folder_path
-    os.makedirs(base_log_folder, exist_ok=True)
-    run_folder_name = f"run_{run_timestamp}"
-    log_folder_path = os.path.join(base_log_folder, run_folder_name)
     os.makedirs(log_folder_path, exist_ok=True)
-    print(f"Run folder created: {log_folder_path}")
-    print(f"Logs file are saved in: {log_folder_path}")
-    print(f"Running {num_games} games...")
+    run_folder_path = os.path.join(log_folder_path, f"run_{run_timestamp}")
+    os.makedirs(run_folder_path, exist_ok=True)
+    print(f"Run folder created: {run_folder_path}")
+    print(f"Logs file are saved in: {run_folder_path}")
+    return run_folder_path
+
+def _write_run_manifest(run_folder_path, **manifest):
+    """Write the configuration of a run to manifest.json so runs can be filtered later"""
+    manifest = {
+        "run_name": os.path.basename(run_folder_path),
+        "started_at": time.strftime('%Y-%m-%dT%H:%M:%S'),
+        **manifest
+    }
+    with open(os.path.join(run_folder_path, MANIFEST_FILE_NAME), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+def run_position_suite(suite_file, log_file_name="game", log_folder_path="output", agent="LLMAgent", debug_mode=False, possible_moves=False, hints=False, best_move=False, prompt=None, system_prompt=None, json_logs=False,
+                       concurrency=16, seed=None, log_overflow="block", llm_cache_dir=None):
+    """Score one agent's move on every position of a corpus by gnubg equity loss"""
+    log_folder_path = _create_run_folder(log_folder_path)
+    _write_run_manifest(log_folder_path, mode="suite", agent1=agent, agent2=agent, prompt=prompt, system_prompt=system_prompt,
+                        inputs={"possible_moves": possible_moves, "hints": hints, "best_move": best_move},
+                        suite_file=suite_file, seed=seed)
+    print(f"Running position suite {suite_file} for {agent} with concurrency {concurrency}...")
+
+    extra_env = {
+        'GAME_MODE': 'suite',
+        'GAME_SUITE_FILE': os.path.abspath(suite_file),
+        'GAME_SUITE_CONCURRENCY': str(concurrency),
+        'GAME_SEED': str(seed) if seed is not None else "",
+        'GAME_LOG_OVERFLOW': log_overflow
+    }
+    if llm_cache_dir:
+        extra_env['GAME_LLM_CACHE_DIR'] = os.path.abspath(llm_cache_dir)
+    _, err, _ = run_silent_game(1, log_file_name, log_folder_path, agent, agent, debug_mode, possible_moves, hints, best_move,
+                             prompt, system_prompt, json_logs, extra_env=extra_env, timeout=None)
+    results_file = os.path.join(log_folder_path, f"{log_file_name}_1_suite.json")
+    if err is not None or not os.path.exists(results_file):
+        print(f"\n❌ Position suite failed: {err or 'no results written'}")
+        return None
+
+    with open(results_file, 'r') as f:
+        summary = json.load(f)["summary"]
+
+    print(f"\n{'='*60}")
+    print(f"{'POSITION SUITE RESULTS':^60}")
+    print(f"{'='*60}")
+    print(f"   Agent: {agent}")
+    print(f"   Positions: {summary['positions']} ({summary['scored_positions']} scored, {summary['forced_positions']} forced)")
+    print(f"   Mean equity loss: {summary['mean_equity_loss']:.4f} (95% CI {summary['equity_loss_ci'][0]:.4f} - {summary['equity_loss_ci'][1]:.4f})")
+    print(f"   Mean equity loss (valid moves): {summary['mean_equity_loss_valid']:.4f} (95% CI {summary['equity_loss_valid_ci'][0]:.4f} - {summary['equity_loss_valid_ci'][1]:.4f})")
+    print(f"   Best move rate: {summary['best_move_rate']*100:.1f}%")
+    print(f"   Invalid move rate: {summary['invalid_move_rate']*100:.1f}%")
+    print(f"   Average move duration: {summary['avg_move_duration']:.2f} seconds ({summary['avg_rate_limit_wait']:.2f}s rate limiter wait)")
+    print(f"   Results: {results_file}")
+    print(f"\n{'='*60}")
+    return summary
+
+CSV_HEADER = [
+    'Game_ID', 'Winner', 'Loser', 'Winner_Agent', 'Loser_Agent',
+    'Duration_Seconds', 'Total_Turns', 'Game_Type', 'Error',
+    'P1_Invalid_Moves', 'P1_Total_Moves', 'P1_Checkers_Remaining', 'P1_Checkers_On_Bar', 'P1_Pip_Count',
+    'P2_Invalid_Moves', 'P2_Total_Moves', 'P2_Checkers_Remaining', 'P2_Checkers_On_Bar', 'P2_Pip_Count',
+    'Final_Score_Difference', 'Start_Position',
+    'Wall_Seconds', 'CPU_User_Seconds', 'CPU_System_Seconds', 'Max_RSS_MB', 'Voluntary_Ctx_Switches', 'Involuntary_Ctx_Switches'
+]
+
+def _csv_row(result):
+    """Flatten a game result into a summary.csv row"""
+    p1_stats = result.get("player1_stats", {})
+    p2_stats = result.get("player2_stats", {})
+    resources = result.get("resources") or {}
+    return [
+        result.get("game_id", ""),
+        result.get("winner", ""),
+        result.get("loser", ""),
+        result.get("winner_name", ""),
+        result.get("loser_name", ""),
+        result.get("game_duration", ""),
+        result.get("total_turns", ""),
+        result.get("game_type", ""),
+        result.get("error", ""),
+        p1_stats.get("invalid_moves", ""),
+        p1_stats.get("total_moves", ""),
+        p1_stats.get("checkers_remaining", ""),
+        p1_stats.get("checkers_on_bar", ""),
+        p1_stats.get("pip_count", ""),
+        p2_stats.get("invalid_moves", ""),
+        p2_stats.get("total_moves", ""),
+        p2_stats.get("checkers_remaining", ""),
+        p2_stats.get("checkers_on_bar", ""),
+        p2_stats.get("pip_count", ""),
+        result.get("final_score_difference", ""),
+        result.get("start_position") or "",
+        resources.get("wall_time", ""),
+        resources.get("cpu_user", ""),
+        resources.get("cpu_system", ""),
+        resources.get("max_rss_mb", ""),
+        resources.get("voluntary_ctx_switches", ""),
+        resources.get("involuntary_ctx_switches", "")
+    ]
+
+def _game_row(result):
+    """Format a game result as a row of the game-by-game table"""
+    game_id = result["game_id"]
+    winner_name = result["winner_name"][:10]
+    loser_name = result["loser_name"][:10]
+    
+    duration = f"{result.get('game_duration', 0):.1f}s" if result.get('game_duration') else "N/A"
+    turns = result.get('total_turns', 'N/A')
+    
+    p1_invalid = result.get("player1_stats", {}).get("invalid_moves", 0)
+    p2_invalid = result.get("player2_stats", {}).get("invalid_moves", 0)
+    invalid_moves = f"{p1_invalid}/{p2_invalid}"
     
+    loser_checkers = "N/A"
+    if result.get("winner") == 0:  # Player 1 won
+        loser_checkers = result.get("player2_stats", {}).get("checkers_remaining", "N/A")
+    elif result.get("winner") == 1:  # Player 2 won
+        loser_checkers = result.get("player1_stats", {}).get("checkers_remaining", "N/A")
+        
+    game_type = result.get('game_type', 'N/A')
+    error = result.get('error') or 'N/A'
+
+    return f"{game_id:<4} {winner_name:<12} {loser_name:<12} {duration:<8} {turns:<6} {invalid_moves:<20} {loser_checkers:<18} {game_type:<10} {error:<10}"
+
+def run_batch_games(num_games, log_file_name="game", log_folder_path="output", agent1="BestMoveAgent", agent2="RandomAgent", debug_mode=False, possible_moves=False, hints=False, best_move=False, prompt=None, system_prompt=None, export_csv=False, json_logs=False,
+                    positions_file=None, position_mode="sample", seed=None, workers=1, log_overflow="block", trace=False,
+                    archive=False, log_shards=8, export_jsonl=False, max_table_rows=100, memory_limit_mb=None, save_sgf=False,
+                    dataset_dir=None, dataset_sample=1.0, shard_size=100000, cassette_mode=None, cassette_dir=None, replay_games=None,
+                    games_per_process=1, llm_cache_dir=None):
+    """Run multiple games and show summary with detailed statistics.
+    Summary metrics are aggregated online and exported rows are streamed as games finish, so memory stays
+    constant in the number of games. Only the first max_table_rows games are printed (0 disables the table).
+    Games whose gnubg process uses more than memory_limit_mb fail.
+    With dataset_dir the positions of all games are exported as a training dataset, games already in it are skipped.
+    cassette_mode="record" records the LLM responses and dice seed of every game, "replay" replays the games
+    recorded in cassette_dir (or only replay_games) offline.
+    With games_per_process > 1 every gnubg process plays that many games concurrently, see run_multiplexed_games.
+    With llm_cache_dir identical LLM requests are answered from a response cache in that folder, see src/llm_cache.py.
+    """
+    # Settings passed to every game process on top of the per-game environment
+    extra_env = {
+        'GAME_LOG_OVERFLOW': log_overflow
+    }
+
+    # Plan the starting position of every game, None means the regular opening
+    if positions_file:
+        corpus = load_position_corpus(positions_file)
+        game_plan = plan_position_games(corpus, position_mode, num_games, seed)
+        num_games = len(game_plan)
+        print(f"Loaded {len(corpus)} positions from {positions_file} ({position_mode} mode)")
+    else:
+        game_plan = itertools.repeat((None, 0), num_games)
+    game_ids = itertools.count(1)
+
+    # Replays take the game ids, dice seeds and starting positions from the recorded cassettes
+    if cassette_mode == "replay":
+        recorded = recorded_game_ids(cassette_dir)
+        game_ids = [game_id for game_id in recorded if not replay_games or game_id in replay_games]
+        if not game_ids:
+            print(f"Error: No recorded games to replay in {cassette_dir}")
+            return
+        num_games = len(game_ids)
+        game_plan = itertools.repeat((None, 0), num_games)
+        print(f"Replaying {num_games} recorded games from {cassette_dir}")
+    last_game_id = game_ids[-1] if cassette_mode == "replay" else num_games
+
+    # Dataset mode: games write their positions to part files, merged into shards as they finish
+    dataset = None
+    if dataset_dir:
+        dataset = DatasetBuilder(dataset_dir, shard_size, config={
+            "agent1": agent1, "agent2": agent2, "positions_file": positions_file, "sample_rate": dataset_sample,
+            "inputs": {"possible_moves": possible_moves, "hints": hints, "best_move": best_move}})
+        done_games = sum(1 for game_id in range(1, num_games + 1) if dataset.is_completed(game_id))
+        if done_games:
+            print(f"Resuming dataset {dataset_dir}: {done_games} of {num_games} games already done")
+            num_games -= done_games
+        if num_games == 0:
+            dataset.close()
+            print(f"Dataset {dataset_dir} is complete: {dataset.summary()['records']} positions")
+            return
+        extra_env['GAME_DATASET_DIR'] = os.path.abspath(dataset_dir)
+        extra_env['GAME_DATASET_SAMPLE'] = str(dataset_sample)
+
+    log_folder_path = _create_run_folder(log_folder_path)
+    _write_run_manifest(log_folder_path, mode="games", agent1=agent1, agent2=agent2, prompt=prompt, system_prompt=system_prompt,
+                        inputs={"possible_moves": possible_moves, "hints": hints, "best_move": best_move},
+                        num_games=num_games, positions_file=positions_file, position_mode=position_mode if positions_file else None,
+                        seed=seed, archive=archive, dataset=dataset_dir, cassette=cassette_mode, llm_cache=llm_cache_dir)
+    if cassette_mode:
+        extra_env['GAME_CASSETTE_MODE'] = cassette_mode
+        extra_env['GAME_CASSETTE_DIR'] = os.path.abspath(cassette_dir or os.path.join(log_folder_path, CASSETTE_DIR_NAME))
+    if llm_cache_dir:
+        extra_env['GAME_LLM_CACHE_DIR'] = os.path.abspath(llm_cache_dir)
+    if save_sgf:
+        sgf_dir = os.path.abspath(os.path.join(log_folder_path, GAMES_DIR_NAME))
+        os.makedirs(sgf_dir, exist_ok=True)
+        extra_env['GAME_SGF_DIR'] = sgf_dir
+    if trace:
+        extra_env['GAME_TRACE_FILE'] = os.path.abspath(os.path.join(log_folder_path, TRACE_FILE_NAME))
+    # In archive mode games append their stats to one stats.jsonl, read back as games finish
+    run_store = RunStore(log_folder_path) if archive else None
+    archived_stats = {}
+    if archive:
+        extra_env['GAME_RUN_ARCHIVE'] = 'true'
+        extra_env['GAME_LOG_SHARDS'] = str(log_shards)
+    print(f"Running {num_games} games with {workers} worker(s)...")
+
+    # Online aggregates: memory does not grow with the number of games
     agent1_wins = 0
     agent2_wins = 0
-    game_results = []
-    
-    # Statistics tracking
-    total_invalid_moves_p1 = 0
-    total_invalid_moves_p2 = 0
-    total_moves_p1 = 0
-    total_moves_p2 = 0
-    total_duration = 0
-    total_turns = 0
+    failed_games = 0
     game_types = {"normal": 0, "gammon": 0, "backgammon": 0}
+    summary_stats = {name: OnlineStats() for name in ("game_duration", "total_turns")}
+    # Exact integer counters, not derived from the floating-point means
+    move_totals = {name: 0 for name in ("invalid_moves_p1", "invalid_moves_p2", "total_moves_p1", "total_moves_p2")}
+    resource_stats = {name: OnlineStats() for name in ("wall_time", "cpu_user", "cpu_system", "max_rss_mb",
+                                                       "voluntary_ctx_switches", "involuntary_ctx_switches")}
+    peak_rss_game = None
+    llm_totals = {name: 0 for name in LLM_TOTALS}
+    cache_totals = {name: 0 for name in LLM_CACHE_TOTALS}
+    coalescer_totals = {name: 0 for name in LLM_COALESCER_TOTALS}
+    backend_totals = {}  # backend name -> summed calls, failures and circuit opens, latency stats
+    route_totals = {}  # (player, model cascade route) -> summed moves, latency, equity loss and invalid moves
+    memory_failures = 0
+    resource_store = run_store or RunStore(log_folder_path)
+    batch_start_time = time.time()
+    table_rows = []  # only the first max_table_rows games are kept for the game-by-game table
+    progress_every = max(10, num_games // 100)
 
-    for i in range(num_games):
-        game_id = i + 1
-        if game_id % 10 == 0:
-            print(f"Progress: {game_id}/{num_games}")
-        
-        winner, err = run_silent_game(game_id, log_file_name, log_folder_path, agent1, agent2, debug_mode, possible_moves, hints, best_move, prompt, system_prompt, json_logs)                
-        if winner is None or err is not None:
-            game_results.append({
-                "game_id": game_id,
-                "winner": None,
-                "winner_name": "Unknown",
-                "loser_name": "Unknown",
-                "error": err
-            })
-            continue
-
-        stats_file = os.path.join(log_folder_path, f"{log_file_name}_{game_id}_stats.json")
-        
-        game_result = {
-            "game_id": game_id,
-            "winner": winner,
-            "winner_name": agent1 if winner == 0 else agent2 if winner == 1 else "Unknown",
-            "loser_name": agent2 if winner == 0 else agent1 if winner == 1 else "Unknown"
-        }
-        
-        if os.path.exists(stats_file):
-            try:
-                import json
-                with open(stats_file, 'r') as f:
-                    stats = json.load(f)
+    # Rows are written as games finish
+    csv_file = jsonl_file = csv_writer = None
+    if export_csv:
+        csv_file = open(os.path.join(log_folder_path, "summary.csv"), 'w', newline='', encoding='utf-8')
+        csv_writer = csv.writer(csv_file)
+        csv_writer.writerow(CSV_HEADER)
+    if export_jsonl:
+        jsonl_file = open(os.path.join(log_folder_path, "summary.jsonl"), 'w', encoding='utf-8')
+
+    executor = ThreadPoolExecutor(max_workers=workers)
+    def submit(group):
+        if len(group) > 1:
+            return executor.submit(run_multiplexed_games, group, log_file_name, log_folder_path, agent1, agent2, debug_mode,
+                                   possible_moves, hints, best_move, prompt, system_prompt, json_logs, extra_env, memory_limit_mb)
+        game_id, (position, position_turn) = group[0]
+        game_env = extra_env
+        if cassette_mode == "record" and seed is not None:
+            # Reproducible dice seed of every recorded game, otherwise the game picks one
+            game_env = {**extra_env, 'GAME_DICE_SEED': str(random.Random(f"{seed}:{game_id}").randrange(2 ** 31))}
+        return executor.submit(run_silent_game, game_id, log_file_name, log_folder_path, agent1, agent2, debug_mode,
+                               possible_moves, hints, best_move, prompt, system_prompt, json_logs, position, position_turn, game_env,
+                               memory_limit_mb=memory_limit_mb)
+
+    # Keep a bounded window of game processes in flight and handle their games in game order
+    plan = ((game_id, planned) for game_id, planned in zip(game_ids, game_plan) if not (dataset and dataset.is_completed(game_id)))
+    pending = deque()
+    def submit_next():
+        group = list(itertools.islice(plan, games_per_process))
+        if group:
+            future = submit(group)
+            pending.extend((game_id, future, len(group) > 1) for game_id, _ in group)
+    for _ in range(2 * workers):
+        submit_next()
+    last_future = None
+    try:
+        while pending:
+            game_id, future, multiplexed = pending.popleft()
+            if not pending or pending[0][1] is not future:
+                submit_next()
+
+            if game_id % progress_every == 0:
+                print(f"Progress: {game_id}/{last_game_id}")
+
+            winner, err, resources = future.result()
+            # The resources of a multiplexed process are recorded with its first game
+            if future is last_future:
+                resources = None
+            last_future = future
+            if dataset:
+                dataset.add_game(game_id)
+            if resources:
+                resource_store.append_resources(game_id, resources)
+                for name, stats in resource_stats.items():
+                    stats.add(resources[name])
+                if peak_rss_game is None or resources["max_rss_mb"] > peak_rss_game[1]:
+                    peak_rss_game = (game_id, resources["max_rss_mb"])
+
+            stats = None
+            if winner is not None and err is None:
+                try:
+                    if run_store:
+                        for record in run_store.read_new_stats():
+                            archived_stats[record.get("game_id")] = record
+                        stats = archived_stats.pop(game_id, None)
+                    else:
+                        stats_file = os.path.join(log_folder_path, f"{log_file_name}_{game_id}_stats.json")
+                        if os.path.exists(stats_file):
+                            with open(stats_file, 'r') as f:
+                                stats = json.load(f)
+                except Exception as e:
+                    print(f"Warning: Could not read statistics for game {game_id}: {e}")
+                # A multiplexed game that raised was skipped by its process and only its statistics tell
+                if not stats and multiplexed:
+                    winner, err = None, f"Game {game_id} failed in its multiplexed process and wrote no statistics"
+                    print(err)
+
+            if winner is None or err is not None:
+                failed_games += 1
+                if err and "exceeded the memory limit" in err:
+                    memory_failures += 1
+                game_result = {
+                    "game_id": game_id,
+                    "winner": None,
+                    "winner_name": "Unknown",
+                    "loser_name": "Unknown",
+                    "error": err
+                }
+            else:
+                game_result = {
+                    "game_id": game_id,
+                    "winner": winner
+                }
+
+                if stats:
                     game_result.update(stats)
-                    
-                    # Aggregate statistics
-                    total_invalid_moves_p1 += stats.get("player1_stats", {}).get("invalid_moves", 0)
-                    total_invalid_moves_p2 += stats.get("player2_stats", {}).get("invalid_moves", 0)
-                    total_moves_p1 += stats.get("player1_stats", {}).get("total_moves", 0)
-                    total_moves_p2 += stats.get("player2_stats", {}).get("total_moves", 0)
-                    total_duration += stats.get("game_duration", 0)
-                    total_turns += stats.get("total_turns", 0)
-                    
+                    p1_stats = stats.get("player1_stats", {})
+                    p2_stats = stats.get("player2_stats", {})
+                    summary_stats["game_duration"].add(stats.get("game_duration", 0))
+                    summary_stats["total_turns"].add(stats.get("total_turns", 0))
+                    move_totals["invalid_moves_p1"] += p1_stats.get("invalid_moves", 0)
+                    move_totals["invalid_moves_p2"] += p2_stats.get("invalid_moves", 0)
+                    move_totals["total_moves_p1"] += p1_stats.get("total_moves", 0)
+                    move_totals["total_moves_p2"] += p2_stats.get("total_moves", 0)
+
+                    for name in LLM_TOTALS:
+                        llm_totals[name] += (stats.get("llm_client") or {}).get(name, 0)
+                    for name in LLM_COALESCER_TOTALS:
+                        coalescer_totals[name] += (stats.get("llm_coalescer") or {}).get(name, 0)
+                    for name in LLM_CACHE_TOTALS:
+                        cache_totals[name] += (stats.get("llm_cache") or {}).get(name, 0)
+                    for backend, metrics in (stats.get("llm_backends") or {}).items():
+                        totals = backend_totals.setdefault(backend, {"calls": 0, "failures": 0, "circuit_opens": 0,
+                                                                     "latency_sum": 0.0, "max_latency": 0.0})
+                        totals["calls"] += metrics["calls"]
+                        totals["failures"] += metrics["failures"]
+                        totals["circuit_opens"] += metrics["circuit_opens"]
+                        totals["latency_sum"] += metrics["mean_latency"] * (metrics["calls"] - metrics["failures"])
+                        totals["max_latency"] = max(totals["max_latency"], metrics["max_latency"])
+                    for player, player_stats in ((1, p1_stats), (2, p2_stats)):
+                        for route, metrics in (player_stats.get("llm_routes") or {}).items():
+                            totals = route_totals.setdefault((player, route), {"moves": 0, "latency": 0.0, "equity_loss": 0.0,
+                                                                               "invalid": 0, "max_latency": 0.0})
+                            for name in ("moves", "latency", "equity_loss", "invalid"):
+                                totals[name] += metrics[name]
+                            totals["max_latency"] = max(totals["max_latency"], metrics["max_latency"])
+
                     game_type = stats.get("game_type", "normal")
                     game_types[game_type] = game_types.get(game_type, 0) + 1
-                    
-            except Exception as e:
-                print(f"Warning: Could not read statistics for game {game_id}: {e}")
-        
-        game_results.append(game_result)
-        
-        if winner == 0:
-            agent1_wins += 1
-        elif winner == 1:
-            agent2_wins += 1
-        else:
-            print(f"Game {game_id} ended in an unknown state. Winner: {winner}")
+
+                # The game's own statistics know the winner, the exit code is only a fallback
+                winner = game_result["winner"]
+                game_result["winner_name"] = agent1 if winner == 0 else agent2 if winner == 1 else "Unknown"
+                game_result["loser_name"] = agent2 if winner == 0 else agent1 if winner == 1 else "Unknown"
+                if winner == 0:
+                    agent1_wins += 1
+                elif winner == 1:
+                    agent2_wins += 1
+                else:
+                    print(f"Game {game_id} ended in an unknown state. Winner: {winner}")
+
+            # Games are handled in id order: records of handled games, e.g. late ones of failed games, are dropped
+            for stale_id in [archived_id for archived_id in archived_stats if archived_id is None or archived_id <= game_id]:
+                del archived_stats[stale_id]
+
+            if resources:
+                game_result["resources"] = resources
+            if len(table_rows) < max_table_rows:
+                table_rows.append(game_result)
+            if csv_writer:
+                csv_writer.writerow(_csv_row(game_result))
+                csv_file.flush()
+            if jsonl_file:
+                jsonl_file.write(json.dumps(game_result) + "\n")
+                jsonl_file.flush()
+    finally:
+        executor.shutdown(cancel_futures=True)
+        if dataset:
+            dataset.close()
+        for f in (csv_file, jsonl_file):
+            if f:
+                f.close()
 
     # Display results
     print(f"\n{'='*60}")
@@ -151,40 +577,35 @@ def run_batch_games(num_games, log_file_name="game", log_folder_path="output", a
     print(f"\n🏆 OVERALL RESULTS:")
     print(f"   Player 0 ({agent1}) won: {agent1_wins} times ({agent1_wins/num_games*100:.1f}%)")
     print(f"   Player 1 ({agent2}) won: {agent2_wins} times ({agent2_wins/num_games*100:.1f}%)")
+    if failed_games:
+        print(f"   Failed games: {failed_games}")
     
     # Game-by-game results
-    print(f"\n📊 GAME-BY-GAME RESULTS:")
-    print(f"{'Game':<4} {'Winner':<12} {'Loser':<12} {'Duration':<8} {'Turns':<6} {'Invalid Moves (P1/P2)':<20} {'Checkers Left (Loser)':<18} {'Type':<10} {'Error':<10}")
-    print(f"{'-'*100}")
-    
-    for result in game_results:
-        game_id = result["game_id"]
-        winner_name = result["winner_name"][:10]
-        loser_name = result["loser_name"][:10]
-        
-        duration = f"{result.get('game_duration', 0):.1f}s" if result.get('game_duration') else "N/A"
-        turns = result.get('total_turns', 'N/A')
-        
-        p1_invalid = result.get("player1_stats", {}).get("invalid_moves", 0)
-        p2_invalid = result.get("player2_stats", {}).get("invalid_moves", 0)
-        invalid_moves = f"{p1_invalid}/{p2_invalid}"
-        
-        loser_checkers = "N/A"
-        if result.get("winner") == 0:  # Player 1 won
-            loser_checkers = result.get("player2_stats", {}).get("checkers_remaining", "N/A")
-        elif result.get("winner") == 1:  # Player 2 won
-            loser_checkers = result.get("player1_stats", {}).get("checkers_remaining", "N/A")
-            
-        game_type = result.get('game_type', 'N/A')
-        error = result.get('error', 'N/A')
-
-        print(f"{game_id:<4} {winner_name:<12} {loser_name:<12} {duration:<8} {turns:<6} {invalid_moves:<20} {loser_checkers:<18} {game_type:<10} {error:<10}")
+    if max_table_rows > 0:
+        print(f"\n📊 GAME-BY-GAME RESULTS:")
+        print(f"{'Game':<4} {'Winner':<12} {'Loser':<12} {'Duration':<8} {'Turns':<6} {'Invalid Moves (P1/P2)':<20} {'Checkers Left (Loser)':<18} {'Type':<10} {'Error':<10}")
+        print(f"{'-'*100}")
+
+        for result in table_rows:
+            print(_game_row(result))
+        if num_games > len(table_rows):
+            exports = " and ".join(name for name, enabled in (("summary.csv", export_csv), ("summary.jsonl", export_jsonl)) if enabled)
+            print(f"... {num_games - len(table_rows)} more games not shown" + (f" (see {exports})" if exports else ""))
+
     # Aggregate statistics
-    if num_games > 0:
+    games_with_stats = summary_stats["game_duration"].count
+    if games_with_stats > 0:
+        duration = summary_stats["game_duration"]
+        turns = summary_stats["total_turns"]
         print(f"\n📈 AGGREGATE STATISTICS:")
-        print(f"   Average game duration: {total_duration/num_games:.2f} seconds")
-        print(f"   Average turns per game: {total_turns/num_games:.1f}")
+        print(f"   Average game duration: {duration.mean:.2f} seconds (std {duration.std:.2f}, min {duration.min:.2f}, max {duration.max:.2f})")
+        print(f"   Average turns per game: {turns.mean:.1f} (std {turns.std:.1f}, min {turns.min}, max {turns.max})")
+        total_invalid_moves_p1 = move_totals["invalid_moves_p1"]
+        total_invalid_moves_p2 = move_totals["invalid_moves_p2"]
+        total_moves_p1 = move_totals["total_moves_p1"]
+        total_moves_p2 = move_totals["total_moves_p2"]
         print(f"   Total invalid moves - {agent1}: {total_invalid_moves_p1}, {agent2}: {total_invalid_moves_p2}")
+        print(f"   Invalid moves per game - {agent1}: {total_invalid_moves_p1 / games_with_stats:.2f}, {agent2}: {total_invalid_moves_p2 / games_with_stats:.2f}")
         if total_moves_p1 > 0:
             print(f"   Invalid move rate - {agent1}: {total_invalid_moves_p1/total_moves_p1*100:.2f}%")
         if total_moves_p2 > 0:
@@ -194,57 +615,80 @@ def run_batch_games(num_games, log_file_name="game", log_folder_path="output", a
         for game_type, count in game_types.items():
             if count > 0:
                 print(f"   {game_type.capitalize()}: {count} games ({count/num_games*100:.1f}%)")
-    
-    # Export to CSV if requested
-    if export_csv and game_results:
-        try:
-            import csv
-            csv_file = os.path.join(log_folder_path, f"summary.csv")
-            
-            with open(csv_file, 'w', newline='', encoding='utf-8') as f:
-                writer = csv.writer(f)
-                
-                # Write header
-                writer.writerow([
-                    'Game_ID', 'Winner', 'Loser', 'Winner_Agent', 'Loser_Agent',
-                    'Duration_Seconds', 'Total_Turns', 'Game_Type', 'Error',
-                    'P1_Invalid_Moves', 'P1_Total_Moves', 'P1_Checkers_Remaining', 'P1_Checkers_On_Bar', 'P1_Pip_Count',
-                    'P2_Invalid_Moves', 'P2_Total_Moves', 'P2_Checkers_Remaining', 'P2_Checkers_On_Bar', 'P2_Pip_Count',
-                    'Final_Score_Difference'
-                ])
-                
-                # Write data rows
-                for result in game_results:
-                    p1_stats = result.get("player1_stats", {})
-                    p2_stats = result.get("player2_stats", {})
-                    
-                    writer.writerow([
-                        result.get("game_id", ""),
-                        result.get("winner", ""),
-                        result.get("loser", ""),
-                        result.get("winner_name", ""),
-                        result.get("loser_name", ""),
-                        result.get("game_duration", ""),
-                        result.get("total_turns", ""),
-                        result.get("game_type", ""),
-                        result.get("error", ""),
-                        p1_stats.get("invalid_moves", ""),
-                        p1_stats.get("total_moves", ""),
-                        p1_stats.get("checkers_remaining", ""),
-                        p1_stats.get("checkers_on_bar", ""),
-                        p1_stats.get("pip_count", ""),
-                        p2_stats.get("invalid_moves", ""),
-                        p2_stats.get("total_moves", ""),
-                        p2_stats.get("checkers_remaining", ""),
-                        p2_stats.get("checkers_on_bar", ""),
-                        p2_stats.get("pip_count", ""),
-                        result.get("final_score_difference", "")
-                    ])
-                    
-            print(f"\n📁 CSV exported to: {csv_file}")
-            
-        except Exception as e:
-            print(f"\n❌ Failed to export CSV: {e}")
+
+    if resource_stats["wall_time"].count > 0:
+        batch_duration = time.time() - batch_start_time
+        cpu_time = resource_stats["cpu_user"].total + resource_stats["cpu_system"].total
+        rss = resource_stats["max_rss_mb"]
+        print(f"\n🖥️  RESOURCES (gnubg processes):")
+        print(f"   Wall time per game: {resource_stats['wall_time'].mean:.2f}s (max {resource_stats['wall_time'].max:.2f}s)")
+        print(f"   CPU time per game: user {resource_stats['cpu_user'].mean:.2f}s, system {resource_stats['cpu_system'].mean:.2f}s")
+        print(f"   CPU utilization per game: {cpu_time / resource_stats['wall_time'].total * 100:.0f}% of one core")
+        print(f"   Peak RSS per game: {rss.mean:.1f} MB (std {rss.std:.1f}, max {rss.max:.1f} MB in game {peak_rss_game[0]})")
+        print(f"   Context switches per game: {resource_stats['voluntary_ctx_switches'].mean:.0f} voluntary, {resource_stats['involuntary_ctx_switches'].mean:.0f} involuntary")
+        print(f"   Throughput: {resource_stats['wall_time'].count / batch_duration:.2f} games/s with {workers} worker(s), {cpu_time / batch_duration:.1f} cores busy on average")
+        if memory_limit_mb:
+            print(f"   Games over the {memory_limit_mb} MB memory limit: {memory_failures}")
+
+    if dataset:
+        dataset_summary = dataset.summary()
+        print(f"\n📦 DATASET:")
+        print(f"   {dataset_summary['records']} positions from {dataset_summary['games']} games in {dataset_summary['shards']} shards ({dataset_summary['duplicates']} duplicates skipped)")
+        print(f"   Saved to: {dataset_dir}")
+
+    if llm_totals["calls"]:
+        print(f"\n🌐 LLM CALLS:")
+        print(f"   {llm_totals['calls']} calls in {llm_totals['attempts']} attempts: {llm_totals['retries']} retries "
+              f"({llm_totals['rate_limited']} rate limited, {llm_totals['timeouts']} timeouts), {llm_totals['failures']} failed")
+        print(f"   Connections opened: {llm_totals['connections_opened']} for {llm_totals['requests_sent']} requests, "
+              f"{llm_totals['backoff_seconds']:.1f}s spent in backoff")
+        if llm_totals["rate_limit_wait_seconds"]:
+            print(f"   Queued {llm_totals['rate_limit_wait_seconds']:.1f}s for the shared rate limiter, "
+                  f"{llm_totals['rate_limit_wait_seconds'] / llm_totals['calls']:.2f}s per call")
+        if llm_totals["hedged"] or llm_totals["hedges_over_budget"]:
+            print(f"   Hedged {llm_totals['hedged']} slow calls ({llm_totals['hedged'] / llm_totals['calls']:.1%} of calls), "
+                  f"{llm_totals['hedge_wins']} answered first by the duplicate, {llm_totals['hedges_over_budget']} over budget")
+        if llm_totals["streams"]:
+            print(f"   Streamed {llm_totals['streams']} calls, {llm_totals['early_stops']} stopped as soon as the move was parsed")
+        if coalescer_totals["requests"]:
+            print(f"   Coalesced {coalescer_totals['requests']} requests into {coalescer_totals['flushes']} sends "
+                  f"({coalescer_totals['batched_requests']} in {coalescer_totals['batches']} batch calls, "
+                  f"{coalescer_totals['batch_failures']} failed batches)")
+
+    if backend_totals:
+        print(f"\n🔀 LLM BACKENDS:")
+        for backend, totals in backend_totals.items():
+            answered = totals["calls"] - totals["failures"]
+            mean_latency = totals["latency_sum"] / answered if answered else 0.0
+            print(f"   {backend}: {totals['calls']} calls, {totals['failures']} failed over, "
+                  f"latency mean {mean_latency:.2f}s (max {totals['max_latency']:.2f}s), "
+                  f"circuit opened {totals['circuit_opens']} times")
+
+    if route_totals:
+        print(f"\n🧭 LLM MODEL CASCADE:")
+        for player in (1, 2):
+            routes = {route: totals for (p, route), totals in route_totals.items() if p == player}
+            player_moves = sum(totals["moves"] for totals in routes.values())
+            if not player_moves:
+                continue
+            print(f"   Player {player}:")
+            for route, totals in sorted(routes.items(), key=lambda item: -item[1]["moves"]):
+                print(f"     {route}: {totals['moves']} moves ({totals['moves'] / player_moves:.1%}), "
+                      f"latency mean {totals['latency'] / totals['moves']:.2f}s (max {totals['max_latency']:.2f}s), "
+                      f"equity loss {totals['equity_loss'] / totals['moves']:.4f} per move, {totals['invalid']} invalid")
+
+    cache_lookups = cache_totals["memory_hits"] + cache_totals["disk_hits"] + cache_totals["misses"]
+    if cache_lookups:
+        cache_hits = cache_totals["memory_hits"] + cache_totals["disk_hits"]
+        print(f"\n🗃️ LLM CACHE:")
+        print(f"   {cache_hits}/{cache_lookups} requests answered from the cache ({cache_hits / cache_lookups:.1%}): "
+              f"{cache_totals['memory_hits']} from memory, {cache_totals['disk_hits']} from disk")
+        print(f"   {cache_totals['stores']} responses stored, {cache_totals['expired']} expired, {cache_totals['evictions']} evicted")
+
+    if export_csv:
+        print(f"\n📁 CSV exported to: {os.path.join(log_folder_path, 'summary.csv')}")
+    if export_jsonl:
+        print(f"\n📁 JSONL exported to: {os.path.join(log_folder_path, 'summary.jsonl')}")
     
     print(f"\n{'='*60}")
 
@@ -278,8 +722,52 @@ def main():
                         help='Enable best move input for agents')
     parser.add_argument('--export_csv', '--csv', action='store_true', default=False,
                         help='Export detailed statistics to CSV file')
+    parser.add_argument('--export_jsonl', '--jsonl', action='store_true', default=False,
+                        help='Export every game result as one JSON line to summary.jsonl')
+    parser.add_argument('--table_rows', '--rows', type=int, default=100,
+                        help='Maximum number of games in the printed game-by-game table, 0 hides it (default: 100)')
     parser.add_argument('--json_logs', '--json', action='store_true', default=False,
                         help='Use JSON format for logs (better for parsing)')
+    parser.add_argument('--log_overflow', type=str, default='block', choices=['block', 'drop'],
+                        help='When the log queue is full: block the game (block) or drop messages (drop) (default: block)')
+    parser.add_argument('--trace', action='store_true', default=False,
+                        help='Record a binary per-turn trace of all games to trace.bin in the run folder')
+    parser.add_argument('--archive', action='store_true', default=False,
+                        help='Store all game stats in one stats.jsonl and logs in sharded, rotated files instead of files per game')
+    parser.add_argument('--save_sgf', '--sgf', action='store_true', default=False,
+                        help='Save every finished game as a gnubg match file in games/ of the run folder (see analyze_games.py)')
+    parser.add_argument('--dataset', '--ds', type=str, default=None,
+                        help='Export every position with its legal moves and gnubg equities to NumPy shards in this folder, resuming an existing dataset')
+    parser.add_argument('--dataset_sample', type=float, default=1.0,
+                        help='Probability of recording a position in dataset mode (default: 1.0)')
+    parser.add_argument('--shard_size', type=int, default=100000,
+                        help='Positions per dataset shard (default: 100000)')
+    parser.add_argument('--cassette', type=str, default=None, choices=CASSETTE_MODES,
+                        help='record: save the LLM responses and dice seed of every game, replay: replay recorded games offline (default: None)')
+    parser.add_argument('--cassette_dir', type=str, default=None,
+                        help='Folder of the cassettes (default for record: cassettes/ in the run folder, required for replay)')
+    parser.add_argument('--replay_games', type=str, default=None,
+                        help='Comma-separated game ids to replay (default: all recorded games)')
+    parser.add_argument('--llm_cache', type=str, default=None,
+                        help='Answer identical LLM requests from a response cache in this folder, shared by all games (default: off)')
+    parser.add_argument('--games_per_process', '--gpp', type=int, default=1,
+                        help='Games played concurrently by one gnubg process while their LLM agents wait for responses (default: 1)')
+    parser.add_argument('--log_shards', type=int, default=8,
+                        help='Number of shared log files in archive mode (default: 8)')
+    parser.add_argument('--memory_limit', '--mem', type=int, default=None,
+                        help='Memory budget per game in MB, games whose gnubg process exceeds it are killed and marked as failed (default: None)')
+    parser.add_argument('--positions', '--pos', type=str, default=None,
+                        help='Corpus file of gnubg position IDs to start games from (default: opening position)')
+    parser.add_argument('--position_mode', '--pmode', type=str, default='sample', choices=POSITION_MODES,
+                        help='sample: draw number_of_games games from the corpus, exhaustive: play every position (default: sample)')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='Random seed for position sampling and suite dice (default: None)')
+    parser.add_argument('--suite', type=str, default=None,
+                        help='Score agent1 on every position of this corpus file instead of playing games')
+    parser.add_argument('--concurrency', '--c', type=int, default=16,
+                        help='Number of concurrent agent calls in suite mode (default: 16)')
+    parser.add_argument('--workers', '--w', type=int, default=1,
+                        help='Number of games to run in parallel (default: 1)')
     
     args = parser.parse_args()
     
@@ -287,6 +775,49 @@ def main():
     if args.number_of_games <= 0:
         print("Error: number_of_games must be a positive integer")
         sys.exit(1)
+    if args.workers <= 0:
+        print("Error: workers must be a positive integer")
+        sys.exit(1)
+    if args.games_per_process <= 0:
+        print("Error: games_per_process must be a positive integer")
+        sys.exit(1)
+    if args.games_per_process > 1 and args.cassette:
+        print("Error: --cassette records and replays one game per process, it cannot be combined with --games_per_process")
+        sys.exit(1)
+    if args.games_per_process > 1 and args.save_sgf:
+        print("Warning: --save_sgf is skipped for multiplexed games, the gnubg match record mixes their moves")
+    if not 0 < args.dataset_sample <= 1:
+        print("Error: dataset_sample must be in (0, 1]")
+        sys.exit(1)
+    if args.cassette == "replay" and not (args.cassette_dir and os.path.isdir(args.cassette_dir)):
+        print("Error: --cassette replay needs an existing --cassette_dir")
+        sys.exit(1)
+    if args.positions and not os.path.exists(args.positions):
+        print(f"Error: positions file '{args.positions}' does not exist")
+        sys.exit(1)
+
+    if args.suite:
+        if not os.path.exists(args.suite):
+            print(f"Error: suite file '{args.suite}' does not exist")
+            sys.exit(1)
+        run_position_suite(
+            suite_file=args.suite,
+            log_file_name=args.log_file_name,
+            log_folder_path=args.log_folder_path,
+            agent=args.agent1,
+            debug_mode=args.debug_mode,
+            prompt=args.prompt,
+            system_prompt=args.system_prompt,
+            possible_moves=args.possible_moves,
+            hints=args.hints,
+            best_move=args.best_move,
+            json_logs=args.json_logs,
+            concurrency=args.concurrency,
+            seed=args.seed,
+            log_overflow=args.log_overflow,
+            llm_cache_dir=args.llm_cache
+        )
+        return
     
     run_batch_games(
         num_games=args.number_of_games,
@@ -301,7 +832,27 @@ def main():
         hints=args.hints,
         best_move=args.best_move,
         export_csv=args.export_csv,
-        json_logs=args.json_logs
+        export_jsonl=args.export_jsonl,
+        max_table_rows=args.table_rows,
+        memory_limit_mb=args.memory_limit,
+        save_sgf=args.save_sgf,
+        dataset_dir=args.dataset,
+        dataset_sample=args.dataset_sample,
+        shard_size=args.shard_size,
+        cassette_mode=args.cassette,
+        cassette_dir=args.cassette_dir,
+        replay_games={int(game_id) for game_id in args.replay_games.split(",")} if args.replay_games else None,
+        games_per_process=args.games_per_process,
+        llm_cache_dir=args.llm_cache,
+        json_logs=args.json_logs,
+        positions_file=args.positions,
+        position_mode=args.position_mode,
+        seed=args.seed,
+        workers=args.workers,
+        log_overflow=args.log_overflow,
+        trace=args.trace,
+        archive=args.archive,
+        log_shards=args.log_shards
     )
 
 if __name__ == "__main__":
@@ -0,0 +1,264 @@
+"""
+Mock LLM Server
+
+A local stand-in for an OpenAI-compatible chat completions API, for testing and
+benchmarking LLMAgent and LiveCodeAgent without API credits. It reads the moves
+and gnubg hints from the prompt and answers by a response policy:
+    best_hint  the move with the highest equity in the hints, else the first possible move
+    random     a random move of the prompt
+    malformed  broken JSON without a usable move
+    code       a select_best_move() Python function returning the best move
+Prompts that ask for a select_best_move() function (LiveCodeAgent) get code for
+the best_hint and random policies too.
+
+Latency, errors and rate limits are scriptable: a lognormal latency around a
+median with an optional slow tail, random 500 and 429 responses, and a
+requests-per-minute limit with OpenAI-style x-ratelimit headers. Streamed
+(SSE) completions, the batch endpoint of llm_coalescer.py and a /health
+endpoint are supported, GET /stats returns the request counters.
+
+Usage: python mock_llm_server.py --port 8000 --latency_ms 800 --tail_rate 0.02
+then set LLM_API_URL="http://127.0.0.1:8000/v1/chat/completions" in .env
+"""
+
+import argparse
+import json
+import math
+import random
+import re
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+POLICIES = ("best_hint", "random", "malformed", "code")
+
+_HINT = re.compile(r"'move': '([^']+)', 'equity': (-?[\d.]+(?:e-?\d+)?)")
+_MOVE = re.compile(r"'((?:bar|\d+)/(?:off|\d+)[^']*)'")
+_FILLER = ("The position calls for balancing safety against building a prime, and the gnubg evaluation "
+           "agrees that the chosen play keeps the most flexible checker distribution. ")
+
+
+def moves_from_prompt(prompt: str):
+    """(moves in prompt order, best hinted move or None) of a prompt."""
+    hints = [(move, float(equity)) for move, equity in _HINT.findall(prompt)]
+    moves = list(dict.fromkeys(_MOVE.findall(prompt)))
+    best = max(hints, key=lambda hint: hint[1])[0] if hints else None
+    return moves, best
+
+
+def answer_text(prompt: str, policy: str, answer_words: int, rng: random.Random) -> str:
+    """Completion text for a prompt under a response policy."""
+    moves, best = moves_from_prompt(prompt)
+    if policy == "malformed":
+        return '{"full_answer": "I would play' + (" the" * 5) + ', "best_move": '
+    if policy == "random":
+        move = rng.choice(moves) if moves else None
+    else:
+        move = best or (moves[0] if moves else None)
+
+    if policy == "code" or "select_best_move" in prompt:
+        return ("```python\ndef select_best_move():\n    # Best move of the mock server\n"
+                f"    return {json.dumps(move)}\n```")
+
+    prose = " ".join((_FILLER * (answer_words // 25 + 1)).split()[:answer_words])
+    # Fields in the order the prompt's schema lists them, streamed answers rely on it
+    fields = [("full_answer", prose), ("best_move", move)]
+    if prompt.find('"best_move"') != -1 and prompt.find('"best_move"') < prompt.find('"full_answer"'):
+        fields.reverse()
+    return json.dumps(dict(fields))
+
+
+class MockState:
+    """Settings and counters of the server, shared by the handler threads."""
+
+    def __init__(self, args):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.lock = threading.Lock()
+        self.recent = deque()
+        self.counts = {"requests": 0, "completions": 0, "streams": 0, "cancelled_streams": 0, "batches": 0,
+                       "errors": 0, "rate_limited": 0}
+
+    def count(self, name: str, amount: int = 1):
+        with self.lock:
+            self.counts[name] += amount
+
+    def latency(self) -> float:
+        """Seconds to wait before answering: lognormal around the median, a tail_factor times slower at tail_rate."""
+        args = self.args
+        with self.lock:
+            seconds = args.latency_ms / 1000 * math.exp(self.rng.gauss(0, args.jitter)) if args.jitter else args.latency_ms / 1000
+            if args.tail_rate and self.rng.random() < args.tail_rate:
+                seconds *= args.tail_factor
+        return seconds
+
+    def admit(self):
+        """None to answer the request, else (status, headers) of an injected or rate-limit error."""
+        args = self.args
+        now = time.time()
+        with self.lock:
+            while self.recent and now - self.recent[0] > 60:
+                self.recent.popleft()
+            headers = {}
+            if args.rpm:
+                if len(self.recent) >= args.rpm:
+                    reset = 60 - (now - self.recent[0])
+                    return 429, {"Retry-After": f"{reset:.1f}", "x-ratelimit-remaining-requests": "0",
+                                 "x-ratelimit-reset-requests": f"{reset:.1f}s"}
+                headers["x-ratelimit-remaining-requests"] = str(args.rpm - len(self.recent) - 1)
+            if args.rate_limit_rate and self.rng.random() < args.rate_limit_rate:
+                return 429, {"Retry-After": str(args.retry_after)}
+            if args.error_rate and self.rng.random() < args.error_rate:
+                return 500, {}
+            self.recent.append(now)
+            return None, headers
+
+
+def completion(body: dict, text: str) -> dict:
+    prompt_chars = sum(len(message.get("content") or "") for message in body.get("messages", []))
+    return {
+        "id": f"mock-{time.time_ns()}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "mock"),
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": prompt_chars // 4, "completion_tokens": len(text) // 4,
+                  "total_tokens": prompt_chars // 4 + len(text) // 4},
+    }
+
+
+def make_handler(state: MockState):
+    args = state.args
+
+    class MockHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *log_args):
+            if args.verbose:
+                super().log_message(format, *log_args)
+
+        def _send_json(self, status: int, payload, headers=None):
+            data = json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _prompt(self, body: dict) -> str:
+            return "\n".join(message.get("content") or "" for message in body.get("messages", []))
+
+        def do_GET(self):
+            if self.path.rstrip("/") == "/health":
+                self._send_json(200, {"status": "ok"})
+            elif self.path.rstrip("/") == "/stats":
+                with state.lock:
+                    self._send_json(200, dict(state.counts))
+            else:
+                self._send_json(404, {"error": {"message": "not found"}})
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            state.count("requests")
+            status, headers = state.admit()
+            if status is not None:
+                state.count("rate_limited" if status == 429 else "errors")
+                self._send_json(status, {"error": {"message": "mock server error", "code": status}}, headers)
+                return
+
+            if self.path.rstrip("/").endswith("/batch"):
+                state.count("batches")
+                time.sleep(state.latency())
+                texts = [answer_text(self._prompt(request), args.policy, args.answer_words, state.rng)
+                         for request in body.get("requests", [])]
+                state.count("completions", len(texts))
+                self._send_json(200, {"responses": [completion(request, text)
+                                                    for request, text in zip(body.get("requests", []), texts)]}, headers)
+                return
+            if not self.path.rstrip("/").endswith("chat/completions"):
+                self._send_json(404, {"error": {"message": "not found"}})
+                return
+
+            text = answer_text(self._prompt(body), args.policy, args.answer_words, state.rng)
+            state.count("completions")
+            if body.get("stream"):
+                self._stream(text, headers)
+            else:
+                time.sleep(state.latency())
+                self._send_json(200, completion(body, text), headers)
+
+        def _stream(self, text: str, headers):
+            """Time to the first chunk is the latency, the rest arrives at token_ms per 4 characters."""
+            state.count("streams")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.end_headers()
+            time.sleep(state.latency())
+            try:
+                for start in range(0, len(text), 4):
+                    chunk = {"choices": [{"index": 0, "delta": {"content": text[start:start + 4]}}]}
+                    self._write_chunk(f"data: {json.dumps(chunk)}\n\n")
+                    time.sleep(args.token_ms / 1000)
+                self._write_chunk("data: [DONE]\n\n")
+                self.wfile.write(b"0\r\n\r\n")
+            except (BrokenPipeError, ConnectionResetError):
+                state.count("cancelled_streams")
+                self.close_connection = True
+
+        def _write_chunk(self, data: str):
+            encoded = data.encode('utf-8')
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(encoded), encoded))
+            self.wfile.flush()
+
+    return MockHandler
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description='Local OpenAI-compatible mock LLM server')
+    parser.add_argument('--host', type=str, default='127.0.0.1', help='Address to listen on (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8000, help='Port to listen on (default: 8000)')
+    parser.add_argument('--policy', type=str, default='best_hint', choices=POLICIES,
+                        help='How answers pick a move (default: best_hint)')
+    parser.add_argument('--latency_ms', type=float, default=500,
+                        help='Median response latency in milliseconds (default: 500)')
+    parser.add_argument('--jitter', type=float, default=0.3,
+                        help='Sigma of the lognormal latency, 0 for a fixed latency (default: 0.3)')
+    parser.add_argument('--tail_rate', type=float, default=0.0,
+                        help='Share of responses that are tail_factor times slower (default: 0)')
+    parser.add_argument('--tail_factor', type=float, default=10.0,
+                        help='Slowdown of tail responses (default: 10)')
+    parser.add_argument('--token_ms', type=float, default=5,
+                        help='Milliseconds per streamed chunk of 4 characters (default: 5)')
+    parser.add_argument('--answer_words', type=int, default=150,
+                        help='Words of full_answer prose (default: 150)')
+    parser.add_argument('--error_rate', type=float, default=0.0, help='Share of 500 responses (default: 0)')
+    parser.add_argument('--rate_limit_rate', type=float, default=0.0, help='Share of random 429 responses (default: 0)')
+    parser.add_argument('--retry_after', type=float, default=1.0, help='Retry-After of random 429s in seconds (default: 1)')
+    parser.add_argument('--rpm', type=int, default=0, help='Requests per minute before 429s, 0 for no limit (default: 0)')
+    parser.add_argument('--seed', type=int, default=None, help='Random seed of latencies, errors and random moves')
+    parser.add_argument('--verbose', '--v', action='store_true', default=False, help='Log every request')
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(MockState(args)))
+    server.daemon_threads = True
+    print(f"Mock LLM server on http://{args.host}:{args.port}/v1/chat/completions (policy {args.policy}, "
+          f"median latency {args.latency_ms:.0f}ms)", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,12 @@ from ..interfaces import AgentInputConfig
 class Agent(ABC):
     """Abstract class for all agents."""
 
+    # True if choose_move reads the gnubg position itself instead of only using its arguments.
+    # Such agents can't be called concurrently on snapshots of different positions.
+    uses_gnubg_state = False
+    # True if choose_move needs gnubg's equities of all legal moves (extra_input["equities"]), e.g. to route by difficulty.
+    needs_equities = False
+
     def __init__(self, inputs: AgentInputConfig = {}):
         self.inputs = inputs
 
@@ -18,13 +24,24 @@ class Agent(ABC):
     def choose_move(self, board, possible_moves=None, hints=None, prompt=None):
         raise NotImplementedError("Subclasses must implement choose_move method")
 
+    async def choose_move_async(self, board, extra_input=None):
+        """Awaitable choose_move for games multiplexed on one event loop.
+            Agents that wait on I/O override it, the default runs choose_move without yielding.
+        """
+        return self.choose_move(board, extra_input)
+
     @abstractmethod
     def handle_invalid_move(self, invalid_move: str) -> str:
         raise NotImplementedError("Subclasses must implement handle_invalid_move method")
 
-    def filter_inputs(self, possible_moves, hints, best_move):
+    def route_metrics(self):
+        """Per-route moves, latency and equity loss of agents that route moves between models, None for the others."""
+        return None
+
+    def filter_inputs(self, possible_moves, hints, best_move, equities=None):
         """Filter inputs based on the agent's configuration. DO NOTs use this method"""
-        inputs = {"possible_moves": None, "hints": None, "best_move": None}
+        inputs = {"possible_moves": None, "hints": None, "best_move": None,
+                  "equities": equities if self.needs_equities else None}
         if self.inputs is None:
             return inputs
         if self.inputs.get("possible_moves", False):
@@ -9,6 +9,8 @@ import re
 class LiveCodeAgent(Agent):
     """Agent that uses llm to write code, then executes it to select a move."""
 
+    uses_gnubg_state = True  # reads the board tuple with get_board()
+
     def __init__(self, inputs: AgentInputConfig = {}, prompt=None, system_prompt=None):
         self.defaultPrompt = prompt
         self.system_prompt = system_prompt or "You are an expert backgammon AI that writes Python code."
@@ -63,7 +65,7 @@ class LiveCodeAgent(Agent):
                 best_move=best_move,
                 tuple_board=tuple_board
             )
-            logger.debug(f"LLM response: {llm_response}")
+            logger.debug("LLM response: %s", llm_response)
 
             if not llm_response:
                 logger.warning("No valid code returned by LLM")
@@ -71,13 +73,13 @@ class LiveCodeAgent(Agent):
             
             # Extract Python code from markdown if present
             python_code = self._extract_python_code(llm_response)
-            logger.debug(f"Generated Python code: {python_code}")
+            logger.debug("Generated Python code: %s", python_code)
             
             # Execute the generated code safely
             chosen_move = self._execute_code_safely(python_code, possible_moves, best_move)
             
             if chosen_move:
-                logger.debug(f"LiveCodeAgent selected move: {chosen_move}")
+                logger.debug("LiveCodeAgent selected move: %s", chosen_move)
                 return chosen_move
             else:
                 logger.warning("Code execution did not return a valid move")
@@ -102,18 +104,18 @@ class LiveCodeAgent(Agent):
         python_match = re.search(python_block_pattern, response, re.DOTALL)
         if python_match:
             extracted = python_match.group(1).strip()
-            logger.debug(f"Extracted Python code from ```python block: {extracted[:100]}...")
+            logger.debug("Extracted Python code from ```python block: %s...", extracted[:100])
             return extracted
         
         # Try to find any code block
         code_match = re.search(code_block_pattern, response, re.DOTALL)
         if code_match:
             extracted = code_match.group(1).strip()
-            logger.debug(f"Extracted code from ``` block: {extracted[:100]}...")
+            logger.debug("Extracted code from ``` block: %s...", extracted[:100])
             return extracted
         
         # If no code blocks found, return the response as-is (might be plain code)
-        logger.debug(f"No code blocks found, using response as-is: {response[:100]}...")
+        logger.debug("No code blocks found, using response as-is: %s...", response[:100])
         return response.strip()
 
     def _execute_code_safely(self, python_code: str, possible_moves: list, best_move: str) -> str:
@@ -123,7 +125,7 @@ class LiveCodeAgent(Agent):
                 logger.warning("Empty Python code provided")
                 return None
             
-            logger.debug(f"About to execute code: {python_code[:200]}...")
+            logger.debug("About to execute code: %s...", python_code[:200])
             
             # Create a restricted execution environment
             safe_globals = {
@@ -145,23 +147,24 @@ class LiveCodeAgent(Agent):
             
             # Execute the code in the safe environment
             exec(python_code, safe_globals)
-            logger.debug(f"Code executed successfully. Available functions: {[k for k in safe_globals.keys() if callable(safe_globals.get(k))]}")
+            if logger.is_enabled("DEBUG"):
+                logger.debug("Code executed successfully. Available functions: %s", [k for k in safe_globals.keys() if callable(safe_globals.get(k))])
             
             # Call the function if it exists
             if 'select_best_move' in safe_globals:
                 logger.debug("Found select_best_move function, calling it...")
                 result = safe_globals['select_best_move']()
-                logger.debug(f"Function returned: {result} (type: {type(result)})")
+                logger.debug("Function returned: %s (type: %s)", result, type(result))
                 
                 if isinstance(result, str) and result.strip():
                     final_move = result.strip()
-                    logger.debug(f"Returning valid move: {final_move}")
+                    logger.debug("Returning valid move: %s", final_move)
                     return final_move
                 else:
-                    logger.warning(f"Function returned invalid result: {result}")
+                    logger.warning("Function returned invalid result: %s", result)
             else:
                 available_funcs = [k for k in safe_globals.keys() if callable(safe_globals.get(k))]
-                logger.warning(f"Function 'select_best_move' not found. Available functions: {available_funcs}")
+                logger.warning("Function 'select_best_move' not found. Available functions: %s", available_funcs)
             
             return None
             
@@ -176,15 +179,15 @@ class LiveCodeAgent(Agent):
 
     def handle_invalid_move(self, invalid_move: str) -> str:
         """Handle invalid moves by trying best move, then random move."""
-        logger.info(f"LiveCodeAgent handling invalid move: '{invalid_move}'")
+        logger.info("LiveCodeAgent handling invalid move: '%s'", invalid_move)
 
         # Try random move
         try:
             random_move = random_valid_move()
             if random_move:
-                logger.debug(f"LiveCodeAgent falling back to random move: {random_move}")
+                logger.debug("LiveCodeAgent falling back to random move: %s", random_move)
                 return random_move
         except Exception as e:
-            logger.warning(f"Failed to get random move: {e}")
+            logger.warning("Failed to get random move: %s", e)
         
         return None
\ No newline at end of file
@@ -1,6 +1,10 @@
+import time
+
 from .base import Agent
 from ..interfaces import AgentInputConfig, AgentInput
-from ..utils import consult_llm
+from ..utils import consult_llm, consult_llm_async, score_move
+from ..utils.llm_cascade import ModelCascade
+from ..utils.llm_stream import stream_mode
 from ..utils.gnubg_utils import get_best_move, random_valid_move
 from ..logger import logger
 
@@ -41,34 +45,105 @@ default_prompt = """
 default_system_prompt = "You are an expert backgammon assistant."
 
 class LLMAgent(Agent):
-    """Agent that uses an LLM to select moves (uses prompt if provided)."""
+    """Agent that uses an LLM to select moves (uses prompt if provided).
+        With LLM_CASCADE_* settings easy positions are played by a rule or a cheap model, see llm_cascade.py.
+    """
     def __init__(self, inputs: AgentInputConfig = {}, prompt=None, system_prompt=None):
         self.defaultPrompt = prompt or default_prompt
         self.system_prompt = system_prompt or default_system_prompt
+        self.cascade = ModelCascade.from_env()
+        self.needs_equities = self.cascade is not None
         super().__init__(inputs)
 
-    def choose_move(self, board, extra_input: AgentInput = None):
-        try:
-            possible_moves = extra_input.get("possible_moves", [])
-            hints = extra_input.get("hints", [])
-            best_move = extra_input.get("best_move", None)
+    def route_metrics(self):
+        return self.cascade.metrics() if self.cascade else None
 
+    def _llm_request(self, board, extra_input: AgentInput, model=None) -> dict:
+        """consult_llm arguments for a move request"""
+        answer_schema = {
+            "full_answer": "str",
+            "best_move": "str",
+        }
+        # Streamed answers end at best_move, so it is asked for before the prose
+        if stream_mode() != "off":
             answer_schema = {
-                "full_answer": "str",
                 "best_move": "str",
+                "full_answer": "str",
             }
-            prompt_with_schema = self.defaultPrompt + "\n\nReturn as JSON with schema: {schema}"
-            llm_response = consult_llm(board, prompt=prompt_with_schema, system_prompt=self.system_prompt,
-                                           possible_moves=possible_moves, hints=hints, best_move=best_move, schema=answer_schema)
+        prompt_with_schema = self.defaultPrompt + "\n\nReturn as JSON with schema: {schema}"
+        return dict(board_repr=board, prompt=prompt_with_schema, system_prompt=self.system_prompt,
+                    possible_moves=extra_input.get("possible_moves", []), hints=extra_input.get("hints", []),
+                    best_move=extra_input.get("best_move", None), schema=answer_schema, stream_until="best_move",
+                    model=model)
 
-            if llm_response:
-                chosen_move = llm_response.get("best_move", None)
-                logger.debug(f"Playing LLM-recommended move: {chosen_move}")
-                return chosen_move
+    def _move_from_response(self, llm_response):
+        if llm_response:
+            chosen_move = llm_response.get("best_move", None)
+            logger.debug("Playing LLM-recommended move: %s", chosen_move)
+            return chosen_move
+
+        else:
+            logger.warning("No moves available")
+            return None
+
+    def _route(self, extra_input: AgentInput):
+        """(route, gnubg's equities of all legal moves) of a move under the model cascade"""
+        equities = (extra_input or {}).get("equities") or []
+        route = self.cascade.route(equities)
+        logger.debug("Model cascade route: %s", route)
+        return route, equities
+
+    def _record_route(self, route: str, move, equities, start: float):
+        equity_loss, valid = score_move(move, equities) if len(equities) > 1 else (0.0, bool(move))
+        self.cascade.record(route, time.time() - start, equity_loss, valid)
+
+    def choose_move(self, board, extra_input: AgentInput = None):
+        if self.cascade is None:
+            return self._choose_llm_move(board, extra_input)
+        start = time.time()
+        route, equities = self._route(extra_input)
+        if route in ("forced", "rule"):
+            move = equities[0]["move"] if equities else None
+        else:
+            move = self._choose_llm_move(board, extra_input, self.cascade.model(route))
+            # A cheap answer that is not a legal move goes up to the expensive model
+            if route == "cheap" and not score_move(move, equities)[1]:
+                route = "escalated"
+                move = self._choose_llm_move(board, extra_input)
+        self._record_route(route, move, equities, start)
+        return move
 
-            else:
-                logger.warning("No moves available")
-                return None
+    async def choose_move_async(self, board, extra_input: AgentInput = None):
+        if self.cascade is None:
+            return await self._choose_llm_move_async(board, extra_input)
+        start = time.time()
+        route, equities = self._route(extra_input)
+        if route in ("forced", "rule"):
+            move = equities[0]["move"] if equities else None
+        else:
+            move = await self._choose_llm_move_async(board, extra_input, self.cascade.model(route))
+            if route == "cheap" and not score_move(move, equities)[1]:
+                route = "escalated"
+                move = await self._choose_llm_move_async(board, extra_input)
+        self._record_route(route, move, equities, start)
+        return move
+
+    def _choose_llm_move(self, board, extra_input: AgentInput = None, model=None):
+        try:
+            llm_response = consult_llm(**self._llm_request(board, extra_input, model))
+            return self._move_from_response(llm_response)
+
+        except Exception as e:
+            logger.error(f"Error in play_llm_move: {e}")
+            import traceback
+
+            logger.error(traceback.format_exc())
+            return None
+
+    async def _choose_llm_move_async(self, board, extra_input: AgentInput = None, model=None):
+        try:
+            llm_response = await consult_llm_async(**self._llm_request(board, extra_input, model))
+            return self._move_from_response(llm_response)
 
         except Exception as e:
             logger.error(f"Error in play_llm_move: {e}")
@@ -79,25 +154,25 @@ class LLMAgent(Agent):
 
     def handle_invalid_move(self, invalid_move: str) -> str:
         """LLM agent tries to use best move, then random, then None if all fail."""
-        logger.debug(f"LLM agent handling invalid move: '{invalid_move}'")
+        logger.debug("LLM agent handling invalid move: '%s'", invalid_move)
 
         # First try the best move according to gnubg
         try:
             best_move = get_best_move()
             if best_move:
-                logger.debug(f"LLM agent falling back to best move: {best_move}")
+                logger.debug("LLM agent falling back to best move: %s", best_move)
                 return best_move
         except Exception as e:
-            logger.warning(f"Failed to get best move: {e}")
+            logger.warning("Failed to get best move: %s", e)
         
         # If best move fails, try a random valid move
         try:
             random_move = random_valid_move()
             if random_move:
-                logger.debug(f"LLM agent falling back to a random move: {random_move}")
+                logger.debug("LLM agent falling back to a random move: %s", random_move)
                 return random_move
         except Exception as e:
-            logger.warning(f"Failed to get random move: {e}")
+            logger.warning("Failed to get random move: %s", e)
         
         # If everything fails, return None to trigger gnubg auto play
         logger.warning("LLM agent could not handle invalid move")
@@ -15,20 +15,20 @@ class RandomAgent(Agent):
         """ choose a random move from the possible moves """
         possible_moves = extra_input.get("possible_moves", [])
         move = RandomAgent._random_move(possible_moves)
-        logger.debug(f"Random Move: {move}")
+        logger.debug("Random Move: %s", move)
         return move
 
     def handle_invalid_move(self, invalid_move: str) -> str:
         """RandomAgent tries another random move."""
-        logger.debug(f"RandomAgent handling invalid move: '{invalid_move}'")
+        logger.debug("RandomAgent handling invalid move: '%s'", invalid_move)
 
         try:
             new_random_move = random_valid_move()
             if new_random_move:
-                logger.debug(f"RandomAgent falling back to a random move: {new_random_move}")
+                logger.debug("RandomAgent falling back to a random move: %s", new_random_move)
                 return new_random_move
         except Exception as e:
-            logger.warning(f"Failed to get new random move: {e}")
+            logger.warning("Failed to get new random move: %s", e)
 
         logger.warning("RandomAgent could not handle invalid move")
         return None
@@ -0,0 +1,121 @@
+"""
+Record and replay of LLM responses.
+
+A cassette is a JSON-lines file per game. Its first line is a header with the
+dice seed of the game, followed by one line per LLM call (a hash of the
+request and the response, None for failed calls) and one line per turn with
+the rolled dice.
+
+In record mode call_openai_api appends every response to the cassette. In
+replay mode it answers from the cassette without any network access: the game
+is re-seeded with the recorded seed, so the dice, the agents' prompts and
+therefore the request hashes repeat, and the game runs again at full speed.
+Identical requests are answered in the order they were recorded. The recorded
+dice are compared on replay to report where a game diverges.
+
+This module does not import gnubg.
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+CASSETTE_MODES = ("record", "replay")
+CASSETTE_DIR_NAME = "cassettes"
+
+_CASSETTE_GAME_ID = re.compile(r"^cassette_(\d+)\.jsonl$")
+
+
+def cassette_file(cassette_dir: str, game_id: int) -> str:
+    return os.path.join(cassette_dir, f"cassette_{game_id}.jsonl")
+
+
+def recorded_game_ids(cassette_dir: str) -> List[int]:
+    """Sorted ids of the games recorded in a cassette folder."""
+    matches = (_CASSETTE_GAME_ID.match(name) for name in os.listdir(cassette_dir))
+    return sorted(int(match.group(1)) for match in matches if match)
+
+
+def request_key(request: Dict[str, Any]) -> str:
+    """Stable hash of an API request body."""
+    return hashlib.sha256(json.dumps(request, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+class Cassette:
+    """Recorded LLM responses and dice of one game, see the module docstring."""
+
+    def __init__(self, path: str, mode: str, seed: Optional[int] = None, header: Optional[Dict] = None):
+        if mode not in CASSETTE_MODES:
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        self.path = path
+        self.mode = mode
+        self.seed = seed
+        self.header = header or {}
+        self._lock = threading.Lock()
+        self._responses: Dict[str, Deque[Optional[Dict]]] = {}
+        self._last_responses: Dict[str, Optional[Dict]] = {}
+        self._dice: Dict[int, Tuple[int, int]] = {}
+        self.misses = 0
+        self.divergences = 0
+
+        if mode == "replay":
+            self._load()
+        else:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(json.dumps({"type": "header", "seed": seed, "created_at": time.strftime('%Y-%m-%dT%H:%M:%S'),
+                                    **self.header}) + "\n")
+
+    def _load(self):
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                if entry["type"] == "header":
+                    self.header = entry
+                    self.seed = entry.get("seed")
+                elif entry["type"] == "call":
+                    self._responses.setdefault(entry["key"], deque()).append(entry["response"])
+                elif entry["type"] == "dice":
+                    self._dice[entry["turn"]] = tuple(entry["dice"]) if entry["dice"] else None
+
+    def _append(self, entry: Dict):
+        with self._lock, open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry) + "\n")
+
+    def record(self, request: Dict[str, Any], response: Optional[Dict]):
+        self._append({"type": "call", "key": request_key(request), "response": response})
+
+    def replay(self, request: Dict[str, Any]) -> Optional[Dict]:
+        """Recorded response of a request. Repeated requests get their responses in recorded order,
+            then the last one again. Raises KeyError for a request that was never recorded.
+        """
+        key = request_key(request)
+        with self._lock:
+            queue = self._responses.get(key)
+            if queue:
+                self._last_responses[key] = queue.popleft()
+                return self._last_responses[key]
+            if key in self._last_responses:
+                return self._last_responses[key]
+            self.misses += 1
+        raise KeyError(key)
+
+    def check_dice(self, turn: int, dice: Optional[Tuple[int, int]]) -> Optional[Tuple[int, int]]:
+        """Record the dice of a turn, or compare them with the recorded dice on replay.
+            Returns the recorded dice if the replay rolled different dice, else None.
+        """
+        if self.mode == "record":
+            self._append({"type": "dice", "turn": turn, "dice": list(dice) if dice else None})
+            return None
+        recorded = self._dice.get(turn)
+        if recorded is not None and dice is not None and tuple(recorded) != tuple(dice):
+            self.divergences += 1
+            return recorded
+        return None
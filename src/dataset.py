@@ -0,0 +1,96 @@
+"""
+Training dataset records of game positions.
+
+In dataset mode (main.py --dataset) every game records the positions it plays
+through: the gnubg.board() tensor of the player on roll, the dice, the legal
+moves and their gnubg equities, best move first. The records of a game are
+collected in memory and written as one part file (parts/game_<id>.bin in the
+dataset folder) when the game is finished, so a part file means a finished
+game. dataset_builder.py merges the part files into deduplicated NumPy shards.
+
+Records are fixed width (little endian, no padding), see RECORD_DTYPE in
+dataset_builder.py for the same layout as a NumPy dtype:
+    uint64  position key (hash of position ID and dice, for deduplication)
+    uint32  game id
+    uint16  turn number
+    uint8   player on roll (0 or 1)
+    uint8   die 1, uint8 die 2
+    uint8   board[2][25], gnubg.board(): player on roll first, index 24 is the bar
+    char14  position ID
+    uint16  number of legal moves (may exceed MAX_MOVES)
+    char32  moves[MAX_MOVES], best first, zero padded
+    float32 equities[MAX_MOVES]
+
+This module does not import gnubg or NumPy.
+"""
+
+import hashlib
+import os
+import random
+import struct
+from typing import List, Optional, Sequence, Tuple
+
+from .interfaces import Hint
+
+DATASET_VERSION = 1
+MAX_MOVES = 32
+MOVE_WIDTH = 32
+POSITION_ID_WIDTH = 14
+PARTS_DIR_NAME = "parts"
+
+_RECORD = struct.Struct(f"<QIHBBB50B{POSITION_ID_WIDTH}sH" + f"{MOVE_WIDTH}s" * MAX_MOVES + f"{MAX_MOVES}f")
+RECORD_SIZE = _RECORD.size
+
+
+def position_key(position_id: str, dice: Optional[Tuple[int, int]]) -> int:
+    """64-bit key of a position and its dice, the same for both dice orders."""
+    die1, die2 = sorted(dice) if dice else (0, 0)
+    digest = hashlib.blake2b(f"{position_id}:{die1}{die2}".encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little')
+
+
+def pack_position(game_id: int, turn: int, player: int, board: Tuple[Sequence[int], Sequence[int]],
+                  dice: Optional[Tuple[int, int]], position_id: str, equities: List[Hint]) -> bytes:
+    """Encode one position as a fixed-width record. equities are all legal moves, best first."""
+    die1, die2 = dice if dice else (0, 0)
+    kept = equities[:MAX_MOVES]
+    padding = MAX_MOVES - len(kept)
+    moves = [candidate["move"].encode('utf-8')[:MOVE_WIDTH] for candidate in kept] + [b""] * padding
+    values = [float(candidate.get("equity", 0)) for candidate in kept] + [0.0] * padding
+    return _RECORD.pack(position_key(position_id, dice), game_id, turn, player, die1, die2,
+                        *board[0][:25], *board[1][:25], position_id.encode('utf-8')[:POSITION_ID_WIDTH],
+                        min(len(equities), 0xFFFF), *moves, *values)
+
+
+def part_file(dataset_dir: str, game_id: int) -> str:
+    """Part file holding the records of one finished game."""
+    return os.path.join(dataset_dir, PARTS_DIR_NAME, f"game_{game_id}.bin")
+
+
+class DatasetWriter:
+    """Collects the positions of one game and writes them as a part file when the game is finished.
+        With sample_rate < 1 each position is kept with that probability, which thins out
+        the strongly correlated positions of consecutive turns.
+    """
+
+    def __init__(self, dataset_dir: str, game_id: int, sample_rate: float = 1.0):
+        self.path = part_file(dataset_dir, game_id)
+        self.game_id = game_id
+        self.sample_rate = sample_rate
+        self._records: List[bytes] = []
+
+    def add_position(self, turn: int, player: int, board, dice, position_id: str, equities: List[Hint]):
+        """Record a position with its legal moves. Positions without a legal move are skipped."""
+        if not equities or not position_id:
+            return
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return
+        self._records.append(pack_position(self.game_id, turn, player, board, dice, position_id, equities))
+
+    def close(self):
+        """Write the part file atomically, also when no position was recorded."""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(b"".join(self._records))
+        os.replace(temp_path, self.path)
@@ -0,0 +1,193 @@
+"""
+Compressed NumPy shards of a training dataset.
+
+DatasetBuilder runs next to the batch runner. As games finish it reads their
+part files (see dataset.py), drops positions already in the dataset (same
+position and dice), and writes the new records to compressed shards of about
+shard_size records: shard_<n>.npz with a structured "records" array of
+RECORD_DTYPE and a "keys" array. manifest.json in the dataset folder lists
+the shards, the record counts and the finished games.
+
+Progress is resumable: the manifest is only updated after a shard is written,
+and part files are only deleted after the manifest lists their games. On
+restart the leftover part files are merged again and finished games are
+skipped, so main.py --dataset DIR --n N continues until N games are done.
+
+Read a dataset with load_dataset() or shard by shard with iter_dataset().
+This module does not import gnubg.
+"""
+
+import glob
+import json
+import os
+import re
+import time
+from typing import Dict, Iterator, List, Optional, Set
+
+import numpy as np
+
+from .dataset import DATASET_VERSION, MAX_MOVES, MOVE_WIDTH, POSITION_ID_WIDTH, PARTS_DIR_NAME, part_file
+from .run_index import MANIFEST_FILE_NAME
+
+RECORD_DTYPE = np.dtype([
+    ("key", "<u8"),
+    ("game_id", "<u4"),
+    ("turn", "<u2"),
+    ("player", "u1"),
+    ("dice", "u1", (2,)),
+    ("board", "u1", (2, 25)),
+    ("position_id", f"S{POSITION_ID_WIDTH}"),
+    ("num_moves", "<u2"),
+    ("moves", f"S{MOVE_WIDTH}", (MAX_MOVES,)),
+    ("equities", "<f4", (MAX_MOVES,)),
+])
+
+_PART_GAME_ID = re.compile(r"game_(\d+)\.bin$")
+
+
+def _to_ranges(game_ids: Set[int]) -> List[List[int]]:
+    """Compact sorted [first, last] ranges of game ids, for the manifest."""
+    ranges = []
+    for game_id in sorted(game_ids):
+        if ranges and game_id == ranges[-1][1] + 1:
+            ranges[-1][1] = game_id
+        else:
+            ranges.append([game_id, game_id])
+    return ranges
+
+
+def _from_ranges(ranges: List[List[int]]) -> Set[int]:
+    return {game_id for first, last in ranges for game_id in range(first, last + 1)}
+
+
+class DatasetBuilder:
+    """Merges finished games into deduplicated, compressed shards of a dataset folder."""
+
+    def __init__(self, dataset_dir: str, shard_size: int = 100000, config: Optional[Dict] = None):
+        self.dataset_dir = dataset_dir
+        self.shard_size = shard_size
+        self.manifest_file = os.path.join(dataset_dir, MANIFEST_FILE_NAME)
+        os.makedirs(os.path.join(dataset_dir, PARTS_DIR_NAME), exist_ok=True)
+
+        if os.path.exists(self.manifest_file):
+            with open(self.manifest_file, 'r', encoding='utf-8') as f:
+                self.manifest = json.load(f)
+            if self.manifest.get("version") != DATASET_VERSION or self.manifest.get("max_moves") != MAX_MOVES:
+                raise ValueError(f"Dataset {dataset_dir} was written with another record format")
+            self.resumed = True
+        else:
+            self.manifest = {
+                "version": DATASET_VERSION,
+                "created_at": time.strftime('%Y-%m-%dT%H:%M:%S'),
+                "record_dtype": str(RECORD_DTYPE.descr),
+                "max_moves": MAX_MOVES,
+                "shards": [],
+                "records": 0,
+                "duplicates": 0,
+                "completed_games": [],
+            }
+            self.resumed = False
+        self.manifest["config"] = config or self.manifest.get("config", {})
+        self.completed = _from_ranges(self.manifest["completed_games"])
+
+        # Keys of every stored position, loaded from the small "keys" member of each shard
+        self.seen: Set[int] = set()
+        for shard in self.manifest["shards"]:
+            with np.load(os.path.join(dataset_dir, shard["file"])) as data:
+                self.seen.update(data["keys"].tolist())
+
+        self._buffer: List[np.ndarray] = []
+        self._buffered = 0
+        self._buffered_games: Set[int] = set()
+        self._duplicates = 0
+
+        # Games that finished after the last shard of a previous run
+        for path in sorted(glob.glob(os.path.join(dataset_dir, PARTS_DIR_NAME, "game_*.bin"))):
+            game_id = int(_PART_GAME_ID.search(path).group(1))
+            if game_id in self.completed:
+                os.remove(path)
+            else:
+                self.add_game(game_id)
+
+    def is_completed(self, game_id: int) -> bool:
+        return game_id in self.completed or game_id in self._buffered_games
+
+    def add_game(self, game_id: int) -> int:
+        """Merge the part file of a finished game. Returns the number of new positions."""
+        path = part_file(self.dataset_dir, game_id)
+        if not os.path.exists(path) or self.is_completed(game_id):
+            return 0
+        records = np.fromfile(path, dtype=RECORD_DTYPE)
+        keep = np.zeros(len(records), dtype=bool)
+        for i, key in enumerate(records["key"].tolist()):
+            if key not in self.seen:
+                self.seen.add(key)
+                keep[i] = True
+        new_records = records[keep]
+        self._duplicates += len(records) - len(new_records)
+        self._buffer.append(new_records)
+        self._buffered += len(new_records)
+        self._buffered_games.add(game_id)
+        if self._buffered >= self.shard_size:
+            self.flush()
+        return len(new_records)
+
+    def flush(self):
+        """Write the buffered records as a shard, then mark their games finished and remove their part files."""
+        if not self._buffered_games:
+            return
+        if self._buffered:
+            records = np.concatenate(self._buffer)
+            file_name = f"shard_{len(self.manifest['shards']):05d}.npz"
+            temp_path = os.path.join(self.dataset_dir, f"{file_name}.tmp.npz")
+            np.savez_compressed(temp_path, records=records, keys=records["key"])
+            os.replace(temp_path, os.path.join(self.dataset_dir, file_name))
+            self.manifest["shards"].append({"file": file_name, "records": len(records)})
+            self.manifest["records"] += len(records)
+        self.manifest["duplicates"] += self._duplicates
+        self.completed |= self._buffered_games
+        self.manifest["completed_games"] = _to_ranges(self.completed)
+        self._write_manifest()
+
+        for game_id in self._buffered_games:
+            try:
+                os.remove(part_file(self.dataset_dir, game_id))
+            except OSError:
+                pass
+        self._buffer = []
+        self._buffered = 0
+        self._buffered_games = set()
+        self._duplicates = 0
+
+    def _write_manifest(self):
+        self.manifest["updated_at"] = time.strftime('%Y-%m-%dT%H:%M:%S')
+        temp_path = f"{self.manifest_file}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(temp_path, self.manifest_file)
+
+    def close(self):
+        self.flush()
+
+    def summary(self) -> Dict:
+        return {
+            "records": self.manifest["records"] + self._buffered,
+            "duplicates": self.manifest["duplicates"] + self._duplicates,
+            "shards": len(self.manifest["shards"]),
+            "games": len(self.completed) + len(self._buffered_games),
+        }
+
+
+def iter_dataset(dataset_dir: str) -> Iterator[np.ndarray]:
+    """Iterate over the record arrays of the shards of a dataset."""
+    with open(os.path.join(dataset_dir, MANIFEST_FILE_NAME), 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    for shard in manifest["shards"]:
+        with np.load(os.path.join(dataset_dir, shard["file"])) as data:
+            yield data["records"]
+
+
+def load_dataset(dataset_dir: str) -> np.ndarray:
+    """All records of a dataset as one structured array of RECORD_DTYPE."""
+    shards = list(iter_dataset(dataset_dir))
+    return np.concatenate(shards) if shards else np.zeros(0, dtype=RECORD_DTYPE)
@@ -0,0 +1,100 @@
+"""
+Equity-loss metrics of agent moves.
+
+Every turn the game loop already asks gnubg for the equity of each legal move.
+The equity loss of a move is the best equity minus the equity of the chosen
+move. It is recorded per player and game phase in the player statistics
+("equity_analysis"), so agent quality can be measured after a batch without
+re-evaluating any position.
+
+Thresholds follow the usual gnubg conventions: a move losing 0.08 or more is an
+error, 0.16 or more a blunder. The performance rating (PR) is 500 times the
+mean equity loss per non-forced move (lower is better).
+
+This module does not import gnubg.
+"""
+
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from .interfaces import PhaseEquityStats
+
+ERROR_THRESHOLD = 0.08
+BLUNDER_THRESHOLD = 0.16
+PR_SCALE = 500
+PHASES = ("contact", "race", "bearoff")
+
+
+def classify_phase(board: Tuple[Sequence[int], Sequence[int]]) -> str:
+    """Classify a position from gnubg.board(): the player on roll first, opponent second.
+        Each side has 25 checker counts from its own perspective, index 0 is its 1-point and 24 the bar.
+    """
+    own_back = max((i for i, count in enumerate(board[0]) if count), default=-1)
+    opponent_back = max((i for i, count in enumerate(board[1]) if count), default=-1)
+    # A checker on our point i sits on the opponent's point 23 - i, so the sides have passed each other unless i + j > 23
+    if own_back + opponent_back > 23:
+        return "contact"
+    if own_back <= 5:
+        return "bearoff"
+    return "race"
+
+
+def new_phase_stats() -> PhaseEquityStats:
+    return PhaseEquityStats(moves=0, equity_loss=0.0, errors=0, blunders=0, invalid=0)
+
+
+def record_move(equity_analysis: Dict[str, PhaseEquityStats], phase: str, equity_loss: float, valid: bool):
+    """Add one non-forced move to a player's equity analysis."""
+    stats = equity_analysis.setdefault(phase, new_phase_stats())
+    stats["moves"] += 1
+    stats["equity_loss"] += equity_loss
+    stats["errors"] += equity_loss >= ERROR_THRESHOLD
+    stats["blunders"] += equity_loss >= BLUNDER_THRESHOLD
+    stats["invalid"] += not valid
+
+
+def summarize(stats: PhaseEquityStats) -> Dict:
+    """Mean loss, error and blunder rates and PR of accumulated phase stats."""
+    moves = stats["moves"]
+    mean_loss = stats["equity_loss"] / moves if moves else 0.0
+    return {
+        "moves": moves,
+        "mean_equity_loss": mean_loss,
+        "error_rate": stats["errors"] / moves if moves else 0.0,
+        "blunder_rate": stats["blunders"] / moves if moves else 0.0,
+        "invalid_rate": stats["invalid"] / moves if moves else 0.0,
+        "pr": PR_SCALE * mean_loss,
+    }
+
+
+class EquityReport:
+    """Aggregates the equity analysis of many games per agent, agent input config and game phase."""
+
+    def __init__(self):
+        self.groups: Dict[Tuple[str, str, str], PhaseEquityStats] = {}
+
+    def add_game(self, game: Dict, inputs: str):
+        for player_stats in (game.get("player1_stats", {}), game.get("player2_stats", {})):
+            for phase, stats in (player_stats.get("equity_analysis") or {}).items():
+                for key in ((player_stats.get("name", "Unknown"), inputs, phase), (player_stats.get("name", "Unknown"), inputs, "all")):
+                    group = self.groups.setdefault(key, new_phase_stats())
+                    for field in group:
+                        group[field] += stats.get(field, 0)
+
+    def rows(self, agent: Optional[str] = None) -> List[Dict]:
+        """One summarized row per (agent, inputs, phase), sorted by agent, inputs and phase."""
+        phase_order = {phase: i for i, phase in enumerate(PHASES + ("all",))}
+        rows = []
+        for (name, inputs, phase), stats in sorted(self.groups.items(), key=lambda item: (item[0][0], item[0][1], phase_order[item[0][2]])):
+            if agent and agent.lower() not in name.lower():
+                continue
+            rows.append({"agent": name, "inputs": inputs, "phase": phase, **summarize(stats)})
+        return rows
+
+
+def inputs_label(inputs: Optional[Dict]) -> str:
+    """Short label of an agent input config, e.g. "hints+best_move" or "none"."""
+    if inputs is None:
+        return "unknown"
+    enabled = [name for name in ("possible_moves", "hints", "best_move") if inputs.get(name)]
+    return "+".join(enabled) if enabled else "none"
+
@@ -4,20 +4,43 @@ import time
 
 from .agents import Agent
 from .utils import (default_board_representation, get_dice, get_simple_board, get_possible_moves, 
-                   move_piece, roll_dice, get_hints, get_best_move, map_winner, is_cube_decision, 
+                   move_piece, roll_dice, map_winner, is_cube_decision, 
                    handle_cube_decision, get_pip_count, get_checkers_count, get_checkers_on_bar, 
-                   determine_game_type, create_player_statistics, is_valid_move)
-from .interfaces import GameStatistics
+                   determine_game_type, create_player_statistics, is_valid_move, set_position, get_position_id,
+                   get_hint_equities, score_move, save_match, set_dice_seed, get_gnubg_id, set_gnubg_id, TOP_HINTS,
+                   track_rate_limit_wait)
+from .equity import classify_phase, record_move
+from .interfaces import GameStatistics, CorpusPosition
+from .trace import TraceWriter
+from .dataset import DatasetWriter
+from .cassette import Cassette
 from .logger import logger
 
 class Game:
     """Manages a backgammon game between two agents."""
-    def __init__(self, agent1: Agent, agent2: Agent, max_turns: int = 200, board_representation: Callable[[], str] = None, game_id: int = 0):
+    def __init__(self, agent1: Agent, agent2: Agent, max_turns: int = 200, board_representation: Callable[[], str] = None, game_id: int = 0,
+                 start_position: CorpusPosition = None, start_turn: int = 0, trace_writer: TraceWriter = None,
+                 sgf_file: str = None, dataset_writer: DatasetWriter = None, dice_seed: int = None, cassette: Cassette = None):
         self.agent1 = agent1
         self.agent2 = agent2
         self.max_turns = max_turns
         self.turn_count = 0
         self.game_id = game_id
+        # Optional corpus position to start from instead of the opening, start_turn is the player on roll
+        self.start_position = start_position
+        self.start_turn = start_turn
+        # Optional binary per-turn trace, see trace.py
+        self.trace_writer = trace_writer
+        # Optional path to save the finished game in gnubg's match format, for offline analysis
+        self.sgf_file = sgf_file
+        # Optional recorder of positions, legal moves and equities for training datasets
+        self.dataset_writer = dataset_writer
+        # Optional dice seed and LLM cassette to record or replay the game deterministically, see cassette.py
+        self.dice_seed = dice_seed
+        self.cassette = cassette
+        self.last_mover = None
+        # Set by play_async: several games share the gnubg process
+        self.multiplexed = False
         self.start_time = 0
         self.end_time = 0
         
@@ -37,6 +60,9 @@ class Game:
         # Check if someone bore off all pieces - capture stats before returning True
         if player1_checkers == 0 or player2_checkers == 0:
             return True
+        # The match record of a multiplexed process mixes several games, only the board belongs to this one
+        if self.multiplexed:
+            return False
         
         match_info = gnubg.match()
         
@@ -56,9 +82,11 @@ class Game:
     
     def __find_winner(self):
         """Find and return the winner of the completed game."""
+        logger.info("Game ended after %s turns.", self.turn_count)
+        if self.multiplexed:
+            return self.__last_mover_winner()
         match_info = gnubg.match()
-        logger.info(f"Game ended after {self.turn_count} turns.")
-        logger.debug(f"Match info: {match_info}")
+        logger.debug("Match info: %s", match_info)
         
         # Check match-level result first (more reliable)
         game_result = match_info.get("games", {})[0] if match_info.get("games") else {}
@@ -67,12 +95,21 @@ class Game:
         if winner_str is not None:
             winner_index = map_winner(winner_str)
             winner_agent = self.agent1 if winner_index == 0 else self.agent2
-            logger.info(f"Game finished. Winner: {winner_agent} (Player {winner_str})")
+            logger.info("Game finished. Winner: %s (Player %s)", winner_agent, winner_str)
             return winner_index
                 
         logger.warning("No winner found in match info.")
         return None
 
+    def __last_mover_winner(self):
+        """Without doubles or resignations only the player who bore off the last checker can win."""
+        if self.turn_count < self.max_turns and self.last_mover is not None:
+            winner_agent = self.agent1 if self.last_mover == 0 else self.agent2
+            logger.info("Game finished. Winner: %s (Player %s bore off last)", winner_agent, self.last_mover)
+            return self.last_mover
+        logger.warning("No winner found, the game reached the turn limit.")
+        return None
+
     def __track_move(self, player_num: int, is_valid: bool):
         """Track move statistics for a player."""
         if player_num == 0:
@@ -120,12 +157,12 @@ class Game:
             self.player2_stats["checkers_on_bar"] = checkers_on_bar[1]
             self.player2_stats["pip_count"] = pip_counts[1]
             
-            logger.debug(f"Statistics updated - P1: {checkers_count[0]} checkers ({pip_counts[0]} pips), P2: {checkers_count[1]} checkers ({pip_counts[1]} pips)")
+            logger.debug("Statistics updated - P1: %s checkers (%s pips), P2: %s checkers (%s pips)", checkers_count[0], pip_counts[0], checkers_count[1], pip_counts[1])
             
             # If someone has 0 checkers, mark as final capture
             if checkers_count[0] == 0 or checkers_count[1] == 0:
                 self.final_stats_captured = True
-                logger.info(f"Final statistics captured - P1: {checkers_count[0]} checkers, P2: {checkers_count[1]} checkers")
+                logger.info("Final statistics captured - P1: %s checkers, P2: %s checkers", checkers_count[0], checkers_count[1])
 
     def __check_and_capture_pre_win_stats(self):
         """Check if someone is about to win and capture stats proactively."""
@@ -136,12 +173,12 @@ class Game:
         # If someone has few checkers left or we're in endgame, capture stats frequently
         min_checkers = min(player1_checkers, player2_checkers)
         if min_checkers <= 5 or self.turn_count > 100:
-            logger.debug(f"Endgame - capturing stats - P1: {player1_checkers}, P2: {player2_checkers} checkers, turn: {self.turn_count}")
+            logger.debug("Endgame - capturing stats - P1: %s, P2: %s checkers, turn: %s", player1_checkers, player2_checkers, self.turn_count)
             self.__capture_final_statistics()
         
         # Also capture if one player has significantly fewer checkers (bearing off phase)
         if abs(player1_checkers - player2_checkers) >= 10:
-            logger.debug(f"Large checker difference - capturing stats - P1: {player1_checkers}, P2: {player2_checkers} checkers")
+            logger.debug("Large checker difference - capturing stats - P1: %s, P2: %s checkers", player1_checkers, player2_checkers)
             self.__capture_final_statistics()
 
     def __update_final_statistics(self, winner_index: int):
@@ -163,6 +200,8 @@ class Game:
         
         # Calculate score difference (pip count difference)
         final_score_difference = abs(self.player1_stats["pip_count"] - self.player2_stats["pip_count"])
+        self.player1_stats["llm_routes"] = self.agent1.route_metrics()
+        self.player2_stats["llm_routes"] = self.agent2.route_metrics()
         
         return GameStatistics(
             game_id=self.game_id,
@@ -175,72 +214,163 @@ class Game:
             player1_stats=self.player1_stats,
             player2_stats=self.player2_stats,
             final_score_difference=final_score_difference,
-            game_type=game_type
+            game_type=game_type,
+            start_position=self.start_position["position_id"] if self.start_position else None
         )
 
     def __init_game(self):
+        if self.dice_seed is not None:
+            set_dice_seed(self.dice_seed)
         gnubg.command("new game")
         gnubg.command("set player 0 human")
         gnubg.command("set player 1 human")
 
-        logger.debug(f"starting new game with agents: {self.agent1} vs {self.agent2}")
+        if self.start_position:
+            set_position(self.start_position["position_id"], self.start_turn, self.start_position.get("dice"))
+            logger.debug("starting from position %s with player %s on roll", self.start_position['position_id'], self.start_turn)
+
+        logger.debug("starting new game with agents: %s vs %s", self.agent1, self.agent2)
+    def __begin_turn(self):
+        """Roll and evaluate the position of the player on roll.
+            Returns what the agent needs and the rest of the turn uses, or None if the turn has no move.
+        """
+        self.turn_count += 1
+        logger.debug("Turn %s starting...", self.turn_count)
+        posinfo = gnubg.posinfo()
+        board = self.board_representation()
+        turn = posinfo["turn"]
+        curr_player = self.agent1 if turn == 0 else self.agent2
+
+        logger.debug("Turn %s, Player %s - Board: %s", self.turn_count, curr_player, board)
+        roll_dice()
+        dice = get_dice()
+        logger.debug("Player %s rolled dice: %s", curr_player, dice)
+        if self.cassette:
+            recorded_dice = self.cassette.check_dice(self.turn_count, dice)
+            if recorded_dice:
+                logger.warning("Turn %s rolled %s but the cassette recorded %s, the replay diverged", self.turn_count, dice, recorded_dice)
+        
+        # Handle cube decisions
+        if is_cube_decision():
+            logger.debug("Player %s has a cube decision", curr_player)
+            self.__track_cube_decision(turn, "decision")
+            cube_handled = handle_cube_decision()
+            if cube_handled:
+                # After handling cube decision, check if we need to roll again
+                dice = get_dice()
+                logger.debug("After cube decision, dice: %s", dice)
+                if dice == (0, 0):
+                    # Still a cube situation, continue to next turn
+                    return None
+            else:
+                logger.warning("Failed to handle cube decision for %s", curr_player)
+                return None
+
+        # One gnubg evaluation of all legal moves gives the hints, the best move and the equity loss of the agent's move
+        gnubg_start = time.time()
+        equities = get_hint_equities()
+        possible_moves = get_possible_moves(equities)
+        hints = equities[:TOP_HINTS]
+        best_move = equities[0]["move"] if equities else None
+        simple_board = get_simple_board()
+        phase = classify_phase(simple_board)
+        position_id = get_position_id() if self.trace_writer or self.dataset_writer else None
+        gnubg_latency = time.time() - gnubg_start
+        logger.debug("Possible moves: %s, Hints: %s, Best move: %s", possible_moves, hints, best_move)
+        
+        return {
+            "turn": turn,
+            "agent": curr_player,
+            "board": board,
+            "dice": dice,
+            "extra_input": curr_player.filter_inputs(possible_moves, hints, best_move, equities),
+            "possible_moves": possible_moves,
+            "equities": equities,
+            "hints": hints,
+            "simple_board": simple_board,
+            "phase": phase,
+            "position_id": position_id,
+            "gnubg_latency": gnubg_latency,
+        }
+
+    def __end_turn(self, state: dict, move, agent_latency: float, rate_limit_wait: float):
+        """Validate, record and execute the agent's move."""
+        turn = state["turn"]
+        possible_moves = state["possible_moves"]
+        equities = state["equities"]
+
+        # Track move and validate
+        is_valid = move is not None and move in possible_moves if possible_moves else move is not None
+        self.__track_move(turn, is_valid)
+        if len(equities) > 1:  # forced moves say nothing about the agent
+            equity_loss, _ = score_move(move, equities)
+            player_stats = self.player1_stats if turn == 0 else self.player2_stats
+            record_move(player_stats["equity_analysis"], state["phase"], equity_loss, is_valid)
+            logger.debug("Equity loss of %s in %s: %.3f", move, state["phase"], equity_loss)
+
+        if self.trace_writer:
+            self.trace_writer.write_turn(self.game_id, self.turn_count, turn, state["dice"], is_valid,
+                                         agent_latency, state["gnubg_latency"], rate_limit_wait, state["position_id"],
+                                         move, state["hints"])
+        if self.dataset_writer:
+            self.dataset_writer.add_position(self.turn_count, turn, state["simple_board"], state["dice"], state["position_id"], equities)
+        
+        # Check if we should capture statistics before the move (in case this move wins the game)
+        if not self.final_stats_captured:
+            self.__check_and_capture_pre_win_stats()
+        
+        # Execute move
+        move_piece(state["agent"], move)
+        self.last_mover = turn
+
+    def __finish_game(self):
+        winner = self.__find_winner()
+        if self.sgf_file:
+            try:
+                save_match(self.sgf_file)
+                logger.debug("Match saved to %s", self.sgf_file)
+            except Exception as e:
+                logger.error(f"Failed to save match to {self.sgf_file}: {e}")
+        return winner, self.get_game_statistics(winner)
+
     def play(self):
         self.__init_game()
         self.start_time = time.time()
         self.turn_count = 0
         
         while self.turn_count < self.max_turns and not self.__is_game_over():
-            self.turn_count += 1
-            logger.debug(f"Turn {self.turn_count} starting...")
-            posinfo = gnubg.posinfo()
-            board = self.board_representation()
-            turn = posinfo["turn"]
-            curr_player = self.agent1 if turn == 0 else self.agent2
-
-            logger.debug(f"Turn {self.turn_count}, Player {curr_player} - Board: {board}")
-            roll_dice()
-            dice = get_dice()
-            logger.debug(f"Player {curr_player} rolled dice: {dice}")
-            
-            # Handle cube decisions
-            if is_cube_decision():
-                logger.debug(f"Player {curr_player} has a cube decision")
-                self.__track_cube_decision(turn, "decision")
-                cube_handled = handle_cube_decision()
-                if cube_handled:
-                    # After handling cube decision, check if we need to roll again
-                    dice = get_dice()
-                    logger.debug(f"After cube decision, dice: {dice}")
-                    if dice == (0, 0):
-                        # Still a cube situation, continue to next turn
-                        continue
-                else:
-                    logger.warning(f"Failed to handle cube decision for {curr_player}")
-                    continue
-
-            possible_moves = get_possible_moves()
-            hints = get_hints()
-            best_move = get_best_move()
-            logger.debug(f"Possible moves: {possible_moves}, Hints: {hints}, Best move: {best_move}")
-            
+            state = self.__begin_turn()
+            if state is None:
+                continue
+
             # Get move from appropriate agent
-            if turn == 0:
-                extra_input = self.agent1.filter_inputs(possible_moves, hints, best_move)
-                move = self.agent1.choose_move(board, extra_input)
-            else:
-                extra_input = self.agent2.filter_inputs(possible_moves, hints, best_move)
-                move = self.agent2.choose_move(board, extra_input)
-            
-            # Track move and validate
-            is_valid = move is not None and move in possible_moves if possible_moves else move is not None
-            self.__track_move(turn, is_valid)
-            
-            # Check if we should capture statistics before the move (in case this move wins the game)
-            if not self.final_stats_captured:
-                self.__check_and_capture_pre_win_stats()
-            
-            # Execute move
-            move_piece(curr_player, move)
+            agent_start = time.time()
+            with track_rate_limit_wait() as rate_limit_wait:
+                move = state["agent"].choose_move(state["board"], state["extra_input"])
+            self.__end_turn(state, move, time.time() - agent_start, rate_limit_wait[0])
 
-        winner = self.__find_winner()
-        return winner, self.get_game_statistics(winner)
\ No newline at end of file
+        return self.__finish_game()
+
+    async def play_async(self):
+        """play() for several games sharing one gnubg process and event loop (see run_multiplexed_games).
+            Other games use gnubg while this one awaits its agent, so the gnubg position and match
+            state of this game are saved before every await and restored after it.
+        """
+        self.multiplexed = True
+        self.__init_game()
+        self.start_time = time.time()
+        self.turn_count = 0
+
+        while self.turn_count < self.max_turns and not self.__is_game_over():
+            state = self.__begin_turn()
+            if state is None:
+                continue
+
+            agent_start = time.time()
+            gnubg_id = get_gnubg_id()
+            with track_rate_limit_wait() as rate_limit_wait:
+                move = await state["agent"].choose_move_async(state["board"], state["extra_input"])
+            set_gnubg_id(gnubg_id)
+            self.__end_turn(state, move, time.time() - agent_start, rate_limit_wait[0])
+
+        return self.__finish_game()
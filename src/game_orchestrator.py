@@ -1,8 +1,22 @@
+import asyncio
 import os
 import json
+import random
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
 
-from .interfaces import AgentInputConfig
+from .interfaces import AgentInputConfig, CorpusPosition
+from .positions import parse_dice
 from .game import Game
+from .position_suite import run_position_suite_from_env
+from .match_analysis import run_match_analysis_from_env
+from .trace import TraceWriter
+from .dataset import DatasetWriter
+from .cassette import Cassette, cassette_file
+from .llm_cache import LLMCache
+from .utils import (set_cassette, llm_client_metrics, set_async_concurrency, disable_new_game_confirmation,
+                    set_llm_cache, llm_cache_metrics, llm_coalescer_metrics, llm_backend_metrics)
+from .run_store import RunStore
 from .agents import BestMoveAgent, RandomAgent, LLMAgent, LiveCodeAgent
 from .logger import Logger
 
@@ -20,6 +34,31 @@ def get_prompts_from_env() -> tuple:
     system_prompt = os.getenv('GAME_SYSTEM_PROMPT', None)
     return prompt, system_prompt
 
+def get_start_position_from_env() -> tuple:
+    """Get the corpus position to start from and the player on roll from environment variables"""
+    position_id = os.getenv('GAME_POSITION_ID', '')
+    if not position_id:
+        return None, 0
+    position = CorpusPosition(
+        position_id=position_id,
+        dice=parse_dice(os.getenv('GAME_POSITION_DICE', '')),
+        label=None
+    )
+    return position, int(os.getenv('GAME_POSITION_TURN', '0'))
+
+def get_multiplexed_games_from_env() -> List[Tuple[int, Optional[CorpusPosition], int]]:
+    """Game ids, starting positions and players on roll of the games multiplexed on this process (GAME_IDS)"""
+    game_ids = [int(game_id) for game_id in os.getenv('GAME_IDS', '').split(',') if game_id]
+    positions = json.loads(os.getenv('GAME_POSITIONS', '') or 'null') or [None] * len(game_ids)
+    games = []
+    for game_id, position in zip(game_ids, positions):
+        if position:
+            games.append((game_id, CorpusPosition(position_id=position["position_id"], dice=parse_dice(position.get("dice", "")),
+                                                  label=None), position.get("turn", 0)))
+        else:
+            games.append((game_id, None, 0))
+    return games
+
 def create_agent(agent_type, inputs: AgentInputConfig=None, prompt: str=None, system_prompt:str=None):
     """Factory function to create agents based on type string"""
     if agent_type == "BestMoveAgent":
@@ -33,6 +72,91 @@ def create_agent(agent_type, inputs: AgentInputConfig=None, prompt: str=None, sy
     else:
         raise ValueError(f"Unknown agent type: {agent_type}")
 
+def export_game_stats(game_stats, log_folder_path: str, log_file_name: str, run_archive: bool, logger_instance):
+    """Export statistics to the run archive or to a JSON file per game"""
+    try:
+        os.makedirs(log_folder_path, exist_ok=True)
+        if run_archive:
+            RunStore(log_folder_path).append_stats(game_stats)
+            logger_instance.debug("Statistics appended to the run archive in %s", log_folder_path)
+        else:
+            stats_file = os.path.join(log_folder_path, f"{log_file_name}_stats.json")
+            with open(stats_file, 'w') as f:
+                json.dump(game_stats, f, indent=2)
+            logger_instance.debug("Statistics exported to %s", stats_file)
+    except Exception as e:
+        logger_instance.error(f"Failed to export statistics: {e}")
+
+def run_multiplexed_games(games, agent1_type, agent2_type, agent_inputs, prompt, system_prompt,
+                          log_folder_path: str, run_archive: bool, logger_instance):
+    """Play several games concurrently in this gnubg process on one event loop.
+    While a game awaits its agent's LLM call the other games keep playing, see Game.play_async.
+    At most LLM_ASYNC_CONCURRENCY (default 16) LLM requests are in flight at a time.
+    """
+    log_prefix = os.getenv('GAME_LOG_PREFIX', 'game')
+    concurrency = int(os.getenv('LLM_ASYNC_CONCURRENCY', '16'))
+    trace_file = os.getenv('GAME_TRACE_FILE', '')
+    trace_writer = TraceWriter(trace_file) if trace_file else None
+    dataset_dir = os.getenv('GAME_DATASET_DIR', '')
+    dataset_sample = float(os.getenv('GAME_DATASET_SAMPLE', '1.0'))
+
+    try:
+        multiplexed = [
+            Game(create_agent(agent1_type, inputs=agent_inputs, prompt=prompt, system_prompt=system_prompt),
+                 create_agent(agent2_type, inputs=agent_inputs, prompt=prompt, system_prompt=system_prompt),
+                 game_id=game_id, start_position=position, start_turn=turn, trace_writer=trace_writer,
+                 dataset_writer=DatasetWriter(dataset_dir, game_id, dataset_sample) if dataset_dir else None)
+            for game_id, position, turn in games
+        ]
+    except ValueError as e:
+        logger_instance.error(f"Error creating agents: {e}")
+        return
+
+    async def play_all():
+        # LLM requests run in worker threads, one per request in flight
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=concurrency))
+        set_async_concurrency(concurrency)
+        return await asyncio.gather(*(game.play_async() for game in multiplexed), return_exceptions=True)
+
+    # Every game starts with "new game" while the others are still in progress
+    disable_new_game_confirmation()
+    try:
+        results = asyncio.run(play_all())
+    finally:
+        if trace_writer:
+            trace_writer.close()
+
+    # The LLM client and cache are shared by the process, their metrics are reported with the first game
+    client_metrics = llm_client_metrics()
+    cache_metrics = llm_cache_metrics()
+    coalescer_metrics = llm_coalescer_metrics()
+    if coalescer_metrics:
+        logger_instance.info(f"LLM coalescer: {coalescer_metrics}")
+    backend_metrics = llm_backend_metrics()
+    if backend_metrics:
+        logger_instance.info(f"LLM backends: {backend_metrics}")
+    for game, result in zip(multiplexed, results):
+        if isinstance(result, BaseException):
+            logger_instance.error(f"Game {game.game_id} failed: {result}")
+            continue
+        _, game_stats = result
+        if game.dataset_writer:
+            game.dataset_writer.close()
+        if client_metrics:
+            game_stats["llm_client"] = client_metrics
+            client_metrics = None
+        if cache_metrics:
+            game_stats["llm_cache"] = cache_metrics
+            cache_metrics = None
+        if coalescer_metrics:
+            game_stats["llm_coalescer"] = coalescer_metrics
+            coalescer_metrics = None
+        if backend_metrics:
+            game_stats["llm_backends"] = backend_metrics
+            backend_metrics = None
+        export_game_stats(game_stats, log_folder_path, f"{log_prefix}_{game.game_id}", run_archive, logger_instance)
+    logger_instance.info(f"Played {len(multiplexed)} multiplexed games")
+
 def main():
     # Get configuration from environment variables
     game_id = int(os.getenv('GAME_ID', '1'))
@@ -42,12 +166,19 @@ def main():
     agent2_type = os.getenv('GAME_AGENT2', 'RandomAgent')
     debug_mode = os.getenv('GAME_DEBUG_MODE', 'false').lower() == 'true'
     json_logs = os.getenv('GAME_JSON_LOGS', 'false').lower() == 'true'
+    log_overflow = os.getenv('GAME_LOG_OVERFLOW', 'block')
+    # Archive mode: one stats.jsonl per run and sharded, rotated logs shared by all games
+    run_archive = os.getenv('GAME_RUN_ARCHIVE', 'false').lower() == 'true'
+    log_shards = int(os.getenv('GAME_LOG_SHARDS', '8'))
+    log_max_bytes = int(os.getenv('GAME_LOG_MAX_BYTES', str(64 * 1024 * 1024)))
     
     # Get agent input configuration from environment variables
     agent_inputs = get_agent_input_config_from_env()
     prompt, system_prompt = get_prompts_from_env()
+    start_position, start_turn = get_start_position_from_env()
     # Initialize logger with custom parameters
-    logger_instance = Logger(log_file=log_file_name, output_folder=log_folder_path, debug_mode=debug_mode, json_format=json_logs)
+    logger_instance = Logger(log_file=log_file_name, output_folder=log_folder_path, debug_mode=debug_mode, json_format=json_logs,
+                             overflow_policy=log_overflow)
     
     # update the global logger's debug mode, JSON format, and log file path
     from .logger import logger as global_logger
@@ -55,6 +186,56 @@ def main():
         global_logger.set_debug_mode(debug_mode)
         global_logger.set_json_format(json_logs)
         global_logger.set_log_file(log_file_name, log_folder_path)
+        global_logger.set_overflow_policy(log_overflow)
+        if run_archive:
+            shard_file = os.path.join(log_folder_path, "logs", f"logs_{game_id % log_shards:02d}.txt")
+            global_logger.set_shared_log_file(shard_file, f"game {game_id}", log_max_bytes)
+
+    # Analyse mode runs gnubg's analysis on saved matches, see analyze_games.py
+    if os.getenv('GAME_MODE', 'game') == 'analyse':
+        run_match_analysis_from_env()
+        return None
+
+    # Opt-in response cache shared by all games using the same folder, see llm_cache.py
+    llm_cache_dir = os.getenv('GAME_LLM_CACHE_DIR', '')
+    if llm_cache_dir:
+        set_llm_cache(LLMCache.from_env(llm_cache_dir))
+
+    # Multiplexed mode plays several games in this process, see run_multiplexed_games
+    multiplexed_games = get_multiplexed_games_from_env()
+    if multiplexed_games:
+        run_multiplexed_games(multiplexed_games, agent1_type, agent2_type, agent_inputs, prompt, system_prompt,
+                              log_folder_path, run_archive, logger_instance)
+        return None
+
+    # Cassette mode records the LLM responses and the dice seed of the game, or replays them offline, see cassette.py
+    cassette_mode = os.getenv('GAME_CASSETTE_MODE', '')
+    dice_seed = int(os.getenv('GAME_DICE_SEED')) if os.getenv('GAME_DICE_SEED') else None
+    cassette = None
+    if cassette_mode:
+        cassette_path = cassette_file(os.getenv('GAME_CASSETTE_DIR', 'cassettes'), game_id)
+        try:
+            if cassette_mode == "replay":
+                cassette = Cassette(cassette_path, "replay")
+                dice_seed = cassette.seed
+                if cassette.header.get("position_id"):
+                    start_position = CorpusPosition(position_id=cassette.header["position_id"],
+                                                    dice=parse_dice(cassette.header.get("position_dice") or ''), label=None)
+                    start_turn = cassette.header.get("start_turn", 0)
+                if (cassette.header.get("agent1"), cassette.header.get("agent2")) != (agent1_type, agent2_type):
+                    logger_instance.warning(f"Cassette {cassette_path} was recorded with {cassette.header.get('agent1')} vs {cassette.header.get('agent2')}")
+            else:
+                if dice_seed is None:
+                    dice_seed = random.randrange(2 ** 31)
+                cassette = Cassette(cassette_path, "record", seed=dice_seed, header={
+                    "game_id": game_id, "agent1": agent1_type, "agent2": agent2_type,
+                    "position_id": start_position["position_id"] if start_position else None,
+                    "position_dice": "".join(str(d) for d in start_position["dice"]) if start_position and start_position.get("dice") else None,
+                    "start_turn": start_turn})
+        except (OSError, ValueError) as e:
+            logger_instance.error(f"Failed to open cassette {cassette_path}: {e}")
+            return None
+        set_cassette(cassette)
 
     try:
         agent1 = create_agent(agent1_type, inputs=agent_inputs, prompt=prompt, system_prompt=system_prompt)
@@ -63,18 +244,60 @@ def main():
         logger_instance.error(f"Error creating agents: {e}")
         return None
 
-    game = Game(agent1, agent2, game_id=game_id)
+    # Position-suite mode scores agent1's moves on a fixed corpus instead of playing a game
+    if os.getenv('GAME_MODE', 'game') == 'suite':
+        run_position_suite_from_env(agent1, log_folder_path, log_file_name)
+        client_metrics = llm_client_metrics()
+        if client_metrics:
+            logger_instance.info(f"LLM client: {client_metrics}")
+        if llm_cache_metrics():
+            logger_instance.info(f"LLM cache: {llm_cache_metrics()}")
+        if llm_backend_metrics():
+            logger_instance.info(f"LLM backends: {llm_backend_metrics()}")
+        return None
+
+    trace_file = os.getenv('GAME_TRACE_FILE', '')
+    trace_writer = TraceWriter(trace_file) if trace_file else None
+
+    sgf_dir = os.getenv('GAME_SGF_DIR', '')
+    sgf_file = os.path.join(sgf_dir, f"{log_file_name}.sgf") if sgf_dir else None
+
+    # Dataset mode records every position with its legal moves and equities, see dataset.py
+    dataset_dir = os.getenv('GAME_DATASET_DIR', '')
+    dataset_writer = DatasetWriter(dataset_dir, game_id, float(os.getenv('GAME_DATASET_SAMPLE', '1.0'))) if dataset_dir else None
+
+    game = Game(agent1, agent2, game_id=game_id, start_position=start_position, start_turn=start_turn,
+                trace_writer=trace_writer, sgf_file=sgf_file, dataset_writer=dataset_writer,
+                dice_seed=dice_seed, cassette=cassette)
 
-    winner, game_stats = game.play()
-    
-    # Export statistics to JSON file
     try:
-        os.makedirs(log_folder_path, exist_ok=True)
-        stats_file = os.path.join(log_folder_path, f"{log_file_name}_stats.json")
-        with open(stats_file, 'w') as f:
-            json.dump(game_stats, f, indent=2)
-        logger_instance.debug(f"Statistics exported to {stats_file}")
-    except Exception as e:
-        logger_instance.error(f"Failed to export statistics: {e}")
+        winner, game_stats = game.play()
+    finally:
+        if trace_writer:
+            trace_writer.close()
+    # Only finished games write their part file
+    if dataset_writer:
+        dataset_writer.close()
+    client_metrics = llm_client_metrics()
+    if client_metrics:
+        game_stats["llm_client"] = client_metrics
+        logger_instance.info(f"LLM client: {client_metrics['calls']} calls, {client_metrics['retries']} retries, "
+                             f"{client_metrics['failures']} failures, {client_metrics['connections_opened']} connections opened")
+    cache_metrics = llm_cache_metrics()
+    if cache_metrics:
+        game_stats["llm_cache"] = cache_metrics
+    backend_metrics = llm_backend_metrics()
+    if backend_metrics:
+        game_stats["llm_backends"] = backend_metrics
+        logger_instance.info("LLM backends: " + ", ".join(
+            f"{name} {m['calls']} calls, {m['failures']} failures, {m['circuit_opens']} circuit opens"
+            for name, m in backend_metrics.items()))
+    if cassette and cassette.mode == "replay":
+        if cassette.misses or cassette.divergences:
+            logger_instance.warning(f"Replay of {cassette.path} diverged: {cassette.misses} unrecorded LLM requests, {cassette.divergences} different rolls")
+        else:
+            logger_instance.info(f"Replayed {cassette.path} without divergence")
     
-    return winner, game_stats
\ No newline at end of file
+    export_game_stats(game_stats, log_folder_path, log_file_name, run_archive, logger_instance)
+    # Only the winner's index goes to sys.exit: anything else is printed to stderr, which main.py reads for errors
+    return winner
\ No newline at end of file
@@ -1,4 +1,4 @@
-from typing import TypedDict, List, Optional
+from typing import TypedDict, Dict, List, Optional, Tuple
 import time
 
 class Hint(TypedDict):
@@ -14,6 +14,21 @@ class AgentInput(TypedDict):
     possible_moves: Optional[List[str]]
     hints: Optional[List[Hint]]
     best_move: Optional[str]
+    equities: Optional[List[Hint]]  # all legal moves with gnubg equities for agents with needs_equities, not for the prompt
+
+class PhaseEquityStats(TypedDict):
+    moves: int  # non-forced moves
+    equity_loss: float  # sum of best equity minus chosen equity
+    errors: int  # moves losing at least 0.08
+    blunders: int  # moves losing at least 0.16
+    invalid: int  # invalid moves, scored as the worst legal move
+
+class LLMRouteMetrics(TypedDict):
+    moves: int  # moves played on the route
+    latency: float  # total seconds the agent took for them
+    max_latency: float
+    equity_loss: float  # sum over the route's moves, forced moves lose nothing
+    invalid: int  # moves that were not legal
 
 class PlayerStatistics(TypedDict):
     name: str
@@ -25,6 +40,65 @@ class PlayerStatistics(TypedDict):
     cube_decisions: int
     cube_accepts: int
     cube_rejects: int
+    equity_analysis: Dict[str, PhaseEquityStats]  # per game phase: contact, race, bearoff
+    llm_routes: Optional[Dict[str, LLMRouteMetrics]]  # model cascade route -> metrics, None without LLM_CASCADE_*
+
+class GameResources(TypedDict):
+    wall_time: float  # seconds from spawning gnubg until it exited
+    cpu_user: float  # seconds
+    cpu_system: float  # seconds
+    max_rss_mb: float  # peak resident set size
+    voluntary_ctx_switches: int
+    involuntary_ctx_switches: int
+
+class LLMClientMetrics(TypedDict):
+    calls: int  # call_openai_api requests
+    attempts: int  # HTTP attempts including retries
+    retries: int
+    failures: int  # calls that returned None after all attempts
+    timeouts: int  # attempts that hit the connect or read timeout
+    rate_limited: int  # 429 responses
+    status_counts: Dict[str, int]  # HTTP status code -> responses
+    backoff_seconds: float  # total time slept before retries
+    mean_latency: float  # seconds per answered attempt
+    max_latency: float
+    connections_opened: int  # new TCP connections, the rest reused the pool
+    requests_sent: int
+    streams: int  # streamed calls (LLM_STREAM)
+    early_stops: int  # streamed responses closed as soon as the move was parsed
+    rate_limit_wait_seconds: float  # total time calls queued for the shared rate limiter (LLM_RATE_LIMIT_*)
+    mean_rate_limit_wait: float  # queue wait per call, the wait of every move is in the trace
+    max_rate_limit_wait: float
+    hedged: int  # calls duplicated after the hedge delay (LLM_HEDGE_PERCENTILE)
+    hedge_wins: int  # hedged calls answered first by the duplicate
+    hedges_over_budget: int  # slow calls not hedged because of LLM_HEDGE_BUDGET
+    hedge_delay: Optional[float]  # current hedge delay in seconds, None before hedging starts
+
+class LLMCacheMetrics(TypedDict):
+    memory_hits: int  # answered from the in-memory LRU
+    disk_hits: int  # answered from the shared cache folder
+    misses: int  # sent to the API
+    stores: int  # responses added to the cache
+    expired: int  # entries older than LLM_CACHE_TTL
+    evictions: int  # files removed to keep the cache folder under LLM_CACHE_MAX_MB
+    memory_entries: int
+
+class LLMCoalescerMetrics(TypedDict):
+    requests: int  # requests that went through the coalescer
+    flushes: int  # groups of requests sent together
+    batches: int  # groups sent as one call to the batch endpoint
+    batched_requests: int  # requests answered by batch calls
+    batch_failures: int  # batch calls that failed and were sent one by one
+    largest_flush: int
+
+class LLMBackendMetrics(TypedDict):
+    calls: int  # calls sent to the backend, including failed ones
+    failures: int  # calls that failed after their retries and failed over
+    outstanding: int  # calls in flight
+    mean_latency: float  # seconds per successful call
+    max_latency: float
+    circuit_opens: int  # times the circuit breaker took the backend out of the pool
+    state: str  # "closed", "open" or "half_open"
 
 class GameStatistics(TypedDict):
     game_id: int
@@ -38,3 +112,26 @@ class GameStatistics(TypedDict):
     player2_stats: PlayerStatistics
     final_score_difference: int
     game_type: str  # "normal", "gammon", "backgammon"
+    start_position: Optional[str]  # gnubg position ID the game started from, None for the opening
+    resources: Optional[GameResources]  # measured by main.py for the gnubg process, see RunStore.append_resources
+    llm_client: Optional[LLMClientMetrics]  # HTTP client metrics of the game's LLM calls, None without LLM calls
+    llm_cache: Optional[LLMCacheMetrics]  # response cache metrics, None unless main.py --llm_cache is used
+    llm_coalescer: Optional[LLMCoalescerMetrics]  # request coalescing of multiplexed games, None if it is off
+    llm_backends: Optional[Dict[str, LLMBackendMetrics]]  # backend name -> metrics, None without LLM_BACKENDS
+
+class CorpusPosition(TypedDict):
+    position_id: str
+    dice: Optional[Tuple[int, int]]
+    label: Optional[str]
+
+class SuiteResult(TypedDict):
+    position_id: str
+    dice: Tuple[int, int]
+    label: Optional[str]
+    move: Optional[str]
+    best_move: Optional[str]
+    equity_loss: float  # best equity minus the equity of the chosen move
+    valid: bool
+    forced: bool  # one legal move or less, not scored and the agent is not asked
+    duration: float
+    rate_limit_wait: float  # part of the duration the LLM calls queued for the rate limiter
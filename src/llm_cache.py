@@ -0,0 +1,179 @@
+"""
+Content-addressed cache of LLM responses.
+
+Identical requests (same model, system prompt, formatted prompt and sampling
+parameters, i.e. the same API request body) get the same cached response
+instead of another API call. Opening positions and common replies repeat the
+same prompts many times in a batch.
+
+The cache has two tiers:
+    memory  an LRU of the most recent responses of this process
+    disk    one JSON file per response in the cache folder, shared by all
+            game processes and runs that use the same folder. The folder is
+            kept under max_mb by removing the least recently used files.
+
+Entries older than ttl seconds are misses. Bumping the epoch invalidates every
+entry at once: the epoch is part of the key, so old entries are never found
+again and age out of the disk tier. Only successful responses are cached.
+
+The cache is off unless main.py --llm_cache DIR is given: with sampling
+(temperature > 0) repeated requests are meant to get different answers.
+
+Configured from the environment (.env):
+    LLM_CACHE_MEMORY_ENTRIES  responses in the in-memory LRU (default 1024)
+    LLM_CACHE_MAX_MB          size cap of the disk tier in MB (default 512)
+    LLM_CACHE_TTL             seconds until an entry expires, 0 never (default 0)
+    LLM_CACHE_EPOCH           invalidation epoch, change it to start over (default 0)
+
+This module does not import gnubg.
+"""
+
+import glob
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from .interfaces import LLMCacheMetrics
+
+# The disk tier is trimmed after this many stores, not after every one
+_TRIM_EVERY = 64
+
+
+def cache_key(request: Dict[str, Any], epoch: str = "0") -> str:
+    """Hash of an API request body and the cache epoch."""
+    body = json.dumps({"epoch": epoch, "request": request}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(body.encode('utf-8')).hexdigest()
+
+
+class LLMCache:
+    """Two-tier LLM response cache, see the module docstring."""
+
+    def __init__(self, cache_dir: str, memory_entries: int = 1024, max_mb: float = 512, ttl: float = 0,
+                 epoch: str = "0"):
+        self.cache_dir = cache_dir
+        self.memory_entries = memory_entries
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.ttl = ttl
+        self.epoch = epoch
+        os.makedirs(cache_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, Tuple[float, Dict]]" = OrderedDict()
+        self._stores_since_trim = 0
+        self._counts = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "expired": 0, "evictions": 0}
+
+    @classmethod
+    def from_env(cls, cache_dir: str) -> "LLMCache":
+        return cls(cache_dir,
+                   memory_entries=int(os.getenv("LLM_CACHE_MEMORY_ENTRIES", "1024")),
+                   max_mb=float(os.getenv("LLM_CACHE_MAX_MB", "512")),
+                   ttl=float(os.getenv("LLM_CACHE_TTL", "0")),
+                   epoch=os.getenv("LLM_CACHE_EPOCH", "0"))
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def _expired(self, created_at: float) -> bool:
+        return bool(self.ttl) and time.time() - created_at > self.ttl
+
+    def _remember(self, key: str, created_at: float, response: Dict):
+        """Put an entry in the memory LRU, call with the lock held."""
+        self._memory[key] = (created_at, response)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, request: Dict[str, Any]) -> Optional[Dict]:
+        """Cached response of a request, None on a miss."""
+        key = cache_key(request, self.epoch)
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if not self._expired(entry[0]):
+                    self._memory.move_to_end(key)
+                    self._counts["memory_hits"] += 1
+                    return entry[1]
+                del self._memory[key]
+                self._counts["expired"] += 1
+
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            entry = None
+        if entry is not None and self._expired(entry["created_at"]):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            with self._lock:
+                self._counts["expired"] += 1
+            entry = None
+        with self._lock:
+            if entry is None:
+                self._counts["misses"] += 1
+                return None
+            self._counts["disk_hits"] += 1
+            self._remember(key, entry["created_at"], entry["response"])
+        # The file's modification time is its last use, trim() removes the least recently used files
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return entry["response"]
+
+    def put(self, request: Dict[str, Any], response: Optional[Dict]):
+        """Cache a successful response. Files are written atomically, concurrent processes may race harmlessly."""
+        if not response:
+            return
+        key = cache_key(request, self.epoch)
+        created_at = time.time()
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({"created_at": created_at, "response": response}, f)
+        os.replace(temp_path, path)
+
+        with self._lock:
+            self._remember(key, created_at, response)
+            self._counts["stores"] += 1
+            self._stores_since_trim += 1
+            trim = self._stores_since_trim >= _TRIM_EVERY
+            if trim:
+                self._stores_since_trim = 0
+        if trim:
+            self.trim()
+
+    def trim(self) -> int:
+        """Remove the least recently used files until the disk tier fits max_mb. Returns the files removed."""
+        files = []
+        for path in glob.glob(os.path.join(self.cache_dir, "*", "*.json")):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue  # removed by another process
+            files.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in files)
+        removed = 0
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                removed += 1
+            except OSError:
+                pass
+            total -= size
+        with self._lock:
+            self._counts["evictions"] += removed
+        return removed
+
+    def metrics(self) -> LLMCacheMetrics:
+        with self._lock:
+            return LLMCacheMetrics(**self._counts, memory_entries=len(self._memory))
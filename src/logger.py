@@ -2,14 +2,24 @@ import sys
 import time
 import os
 import threading
+import queue
+import atexit
+import fcntl
+import gzip
+import shutil
 import json
 import re
 
+OVERFLOW_POLICIES = ("block", "drop")
+
 class Logger:
+    """Singleton logger. Messages are queued and written in batches by a background writer thread."""
     _instance = None
     _lock = threading.Lock()
     
-    def __new__(cls, log_file: str = "game", output_folder: str = "output", debug_mode: bool = False, json_format: bool = False):
+    def __new__(cls, log_file: str = "game", output_folder: str = "output", debug_mode: bool = False, json_format: bool = False,
+                buffered: bool = True, queue_size: int = 10000, overflow_policy: str = "block",
+                flush_interval: float = 0.5, batch_size: int = 256):
         if cls._instance is None:
             with cls._lock:
                 if cls._instance is None:
@@ -17,7 +27,9 @@ class Logger:
                     cls._instance._initialized = False
         return cls._instance
     
-    def __init__(self, log_file: str = "game", output_folder: str = "output", debug_mode: bool = False, json_format: bool = False):
+    def __init__(self, log_file: str = "game", output_folder: str = "output", debug_mode: bool = False, json_format: bool = False,
+                 buffered: bool = True, queue_size: int = 10000, overflow_policy: str = "block",
+                 flush_interval: float = 0.5, batch_size: int = 256):
         if not self._initialized:
             if not os.path.exists(output_folder):
                 os.makedirs(output_folder)
@@ -26,9 +38,32 @@ class Logger:
             self.log_file = os.path.join(output_folder, log_file_name)
             self.debug_mode = debug_mode
             self.json_format = json_format
+
+            # Shared log files are written by several game processes, each line is tagged with log_context
+            self.shared_log = False
+            self.log_context = None
+            self.max_log_bytes = 0
+            self._rotations = 0
+
+            # Buffered writing: block = wait when the queue is full (backpressure), drop = discard the message
+            self.buffered = buffered
+            self.set_overflow_policy(overflow_policy)
+            self.flush_interval = flush_interval
+            self.batch_size = batch_size
+            self.dropped_messages = 0
+            self._reported_drops = 0
+            self._drops_lock = threading.Lock()
+            self._queue = queue.Queue(maxsize=queue_size)
+            self._writer = None
+            self._writer_lock = threading.Lock()
+            atexit.register(self.flush)
             self._initialized = True
     
-    def log(self, level: str, message: str):
+    def log(self, level: str, message, *args):
+        """Log a message. Arguments are formatted lazily, see _format_message."""
+        if not self.is_enabled(level):
+            return
+        message = self._format_message(message, args)
         timestamp = time.strftime('%Y-%m-%d %H:%M:%S')
         
         if self.json_format:
@@ -38,14 +73,123 @@ class Logger:
                 "level": level,
                 "message": message
             }
+            if self.log_context:
+                log_data["context"] = self.log_context
             log_entry = json.dumps(log_data, ensure_ascii=False) + "\n"
         else:
             # Change multi-line messages to a single line
             clean_message = self._clean_message(message)
-            log_entry = f"[{timestamp}] - {level}: {clean_message}\n"
+            context = f"{self.log_context} - " if self.log_context else ""
+            log_entry = f"[{timestamp}] - {context}{level}: {clean_message}\n"
         
-        with open(self.log_file, "a", encoding='utf-8') as f:
-            f.write(log_entry)
+        self._write(log_entry)
+
+    def _write(self, log_entry: str):
+        """Queue a log entry for the writer thread, or write it directly when unbuffered."""
+        if not self.buffered:
+            self._append_to_file(self.log_file, log_entry)
+            return
+
+        self._ensure_writer()
+        if self.overflow_policy == "drop":
+            try:
+                self._queue.put_nowait((self.log_file, log_entry))
+            except queue.Full:
+                with self._drops_lock:
+                    self.dropped_messages += 1
+        else:
+            self._queue.put((self.log_file, log_entry))
+
+    def _ensure_writer(self):
+        """Start the background writer thread on first use."""
+        if self._writer is None:
+            with self._writer_lock:
+                if self._writer is None:
+                    self._writer = threading.Thread(target=self._writer_loop, name="logger-writer", daemon=True)
+                    self._writer.start()
+
+    def _writer_loop(self):
+        """Collect queued entries and write them once batch_size entries or flush_interval seconds accumulate."""
+        pending = []
+        last_flush = time.monotonic()
+        while True:
+            timeout = max(0.0, self.flush_interval - (time.monotonic() - last_flush))
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if isinstance(item, tuple):
+                pending.append(item)
+                if len(pending) < self.batch_size and time.monotonic() - last_flush < self.flush_interval:
+                    continue
+
+            self._write_batch(pending)
+            pending = []
+            last_flush = time.monotonic()
+
+            # A flush request is an Event that is set once everything queued before it is written
+            if isinstance(item, threading.Event):
+                item.set()
+
+    def _write_batch(self, entries: list):
+        """Write a batch of (log_file, entry) pairs, opening each file once."""
+        with self._drops_lock:
+            dropped = self.dropped_messages - self._reported_drops
+            self._reported_drops = self.dropped_messages
+        if dropped:
+            entries = entries + [(self.log_file, f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] - WARNING: Logger queue full, dropped {dropped} messages\n")]
+
+        by_file = {}
+        for log_file, entry in entries:
+            by_file.setdefault(log_file, []).append(entry)
+        for log_file, file_entries in by_file.items():
+            try:
+                self._append_to_file(log_file, "".join(file_entries))
+            except Exception as e:
+                print(f"ERROR: Failed to write logs to {log_file}: {e}", file=sys.stderr)
+
+    def _append_to_file(self, log_file: str, data: str):
+        """Append to a log file. Shared files are locked while writing and rotated once they reach max_log_bytes."""
+        if not self.shared_log:
+            with open(log_file, "a", encoding='utf-8') as f:
+                f.write(data)
+            return
+
+        rotated_file = None
+        while True:
+            with open(log_file, "a", encoding='utf-8') as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    # Another process may have rotated the file while we waited for the lock
+                    if not os.path.exists(log_file) or os.stat(log_file).st_ino != os.fstat(f.fileno()).st_ino:
+                        continue
+                    f.write(data)
+                    f.flush()
+                    if self.max_log_bytes and f.tell() >= self.max_log_bytes:
+                        self._rotations += 1
+                        rotated_file = f"{log_file}.{time.strftime('%Y%m%d_%H%M%S')}.{os.getpid()}.{self._rotations}"
+                        os.rename(log_file, rotated_file)
+                finally:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+            break
+
+        # Compress outside the lock so other games can keep writing
+        if rotated_file:
+            with open(rotated_file, 'rb') as source, gzip.open(f"{rotated_file}.gz", 'wb') as target:
+                shutil.copyfileobj(source, target)
+            os.remove(rotated_file)
+
+    def flush(self, timeout: float = 5.0):
+        """Block until every queued message is written to disk."""
+        if not self.buffered or self._writer is None or not self._writer.is_alive():
+            return
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return
+        done.wait(timeout)
     
     def _clean_message(self, message: str) -> str:
         """Clean message for single-line logging by replacing newlines and excessive whitespace."""
@@ -59,26 +203,49 @@ class Logger:
         
         return clean
     
-    def debug(self, message: str):
+    @staticmethod
+    def _format_message(message, args: tuple) -> str:
+        """Build the final message only when it is going to be written.
+            message can be a %-style format string used with args, e.g. logger.debug("Board: %s", board),
+            or a callable returning the message, e.g. logger.debug(lambda: f"Match: {json.dumps(match)}").
+        """
+        if callable(message):
+            message = message()
+        if args:
+            message = message % args
+        return message
+
+    def is_enabled(self, level: str) -> bool:
+        """Check if messages of this level are written. Use it to guard expensive serialization."""
+        return level != "DEBUG" or self.debug_mode
+
+    def debug(self, message, *args):
         if self.debug_mode:
-            self.log("DEBUG", message)
+            self.log("DEBUG", message, *args)
     
-    def info(self, message: str):
-        self.log("INFO", message)
+    def info(self, message, *args):
+        self.log("INFO", message, *args)
     
-    def error(self, message: str):
+    def error(self, message, *args):
+        message = self._format_message(message, args)
         self.log("ERROR", message)
         # Print to stderr for to let the main process catch the error.
         clean_message = self._clean_message(message)
         print(f"ERROR: {clean_message}", file=sys.stderr)
 
-    def warning(self, message: str):
-        self.log("WARNING", message)
+    def warning(self, message, *args):
+        self.log("WARNING", message, *args)
     
     def set_debug_mode(self, debug_mode: bool):
         """Update the debug mode after initialization."""
         self.debug_mode = debug_mode
     
+    def set_overflow_policy(self, overflow_policy: str):
+        """Set what happens when the log queue is full: block (backpressure) or drop."""
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow_policy}")
+        self.overflow_policy = overflow_policy
+
     def set_json_format(self, json_format: bool):
         """Update the JSON format mode after initialization."""
         self.json_format = json_format
@@ -92,19 +259,31 @@ class Logger:
         
         self.log_file = os.path.join(output_folder, log_file_name)
     
+    def set_shared_log_file(self, log_path: str, log_context: str, max_bytes: int = 0):
+        """Write to a log file shared with other game processes.
+            Every line is tagged with log_context (e.g. "game 12") and the file is rotated
+            and gzip-compressed once it reaches max_bytes (0 disables rotation).
+        """
+        os.makedirs(os.path.dirname(log_path) or ".", exist_ok=True)
+        self.log_file = log_path
+        self.shared_log = True
+        self.log_context = log_context
+        self.max_log_bytes = max_bytes
+
     def log_multiline(self, level: str, message: str, preserve_formatting: bool = False):
         """Log a multi-line message with option to preserve formatting."""
+        if not self.is_enabled(level):
+            return
         if preserve_formatting and self.json_format:
             self.log(level, message)
         elif preserve_formatting:
             timestamp = time.strftime('%Y-%m-%d %H:%M:%S')
             lines = message.split('\n')
-            with open(self.log_file, "a", encoding='utf-8') as f:
-                for i, line in enumerate(lines):
-                    if i == 0:
-                        f.write(f"[{timestamp}] - {level}: {line}\n")
-                    else:
-                        f.write(f"[{timestamp}] - {level}_CONT: {line}\n")
+            context = f"{self.log_context} - " if self.log_context else ""
+            log_entry = f"[{timestamp}] - {context}{level}: {lines[0]}\n"
+            for line in lines[1:]:
+                log_entry += f"[{timestamp}] - {context}{level}_CONT: {line}\n"
+            self._write(log_entry)
         else:
             self.log(level, message)
 
@@ -0,0 +1,83 @@
+"""
+Offline gnubg analysis of saved matches.
+
+analyze_games.py starts gnubg instances in analyse mode (GAME_MODE=analyse).
+Each instance loads a chunk of the SGF files saved by Game.play, runs
+"analyse match" on them and appends a per-player error summary of every game
+to analysis.jsonl in its run folder (RunStore.append_analysis), where
+evaluate_runs.py finds it joined to the game statistics.
+"""
+
+import gnubg
+import os
+import time
+from typing import Dict, List, Optional
+
+from .run_store import RunStore, game_id_from_sgf
+from .utils import load_match
+from .logger import logger
+
+# gnubg match statistics keys, from the player's "moves" statistics
+_MARKS = ("doubtful", "bad", "very bad")
+
+
+def _player_summary(stats: Optional[Dict]) -> Dict:
+    """Error summary of one player from gnubg's match statistics."""
+    moves = stats.get("moves", {}) if isinstance(stats, dict) else {}
+    marked = moves.get("marked", {}) or {}
+    unforced = moves.get("unforced-moves")
+    error_skill = moves.get("error-skill")
+    error_rate = error_skill / unforced if unforced and error_skill is not None else None
+    return {
+        "unforced_moves": unforced,
+        "error_skill": error_skill,  # total normalized equity lost by checker play
+        "error_cost": moves.get("error-cost"),
+        "error_rate": error_rate,
+        "pr": 500 * error_rate if error_rate is not None else None,
+        "marked": {mark.replace(" ", "_"): marked.get(mark) for mark in _MARKS},
+    }
+
+
+def analyse_match_file(sgf_file: str, plies: int = 2) -> Dict:
+    """Load a saved match, analyse it with gnubg and summarize the errors of both players.
+        Player 0 is X (agent1) and player 1 is O (agent2), as in map_winner.
+    """
+    start = time.time()
+    load_match(sgf_file)
+    gnubg.command(f"set analysis chequerplay evaluation plies {plies}")
+    gnubg.command(f"set analysis cubedecision evaluation plies {plies}")
+    gnubg.command("analyse match")
+    # match(analysis, boards, statistics, verbose): analysis and statistics, without boards, not verbose
+    match = gnubg.match(1, 0, 1, 0)
+    games = match.get("games") or [{}]
+    stats = games[0].get("stats") or {}
+    return {
+        "sgf_file": sgf_file,
+        "plies": plies,
+        "duration": time.time() - start,
+        "player1": _player_summary(stats.get("X")),
+        "player2": _player_summary(stats.get("O")),
+        "raw_stats": stats,
+    }
+
+
+def run_match_analysis_from_env() -> int:
+    """Analyse the SGF files listed in GAME_SGF_FILES and store the results in their run folders.
+        Returns the number of analysed games.
+    """
+    sgf_files: List[str] = [f for f in os.getenv('GAME_SGF_FILES', '').split(os.pathsep) if f]
+    plies = int(os.getenv('GAME_ANALYSIS_PLIES', '2'))
+
+    analysed = 0
+    for sgf_file in sgf_files:
+        game_id = game_id_from_sgf(sgf_file)
+        run_folder = os.path.dirname(os.path.dirname(os.path.abspath(sgf_file)))
+        try:
+            analysis = analyse_match_file(sgf_file, plies)
+        except Exception as e:
+            logger.error(f"Failed to analyse {sgf_file}: {e}")
+            continue
+        RunStore(run_folder).append_analysis(game_id, analysis)
+        analysed += 1
+        logger.info("Analysed %s in %.1fs", sgf_file, analysis["duration"])
+    return analysed
@@ -0,0 +1,59 @@
+"""
+Statistical helpers shared by main.py, evaluate_runs.py and the gnubg side.
+Only the standard library is used here, vectorized analysis lives in run_statistics.py.
+
+This module does not import gnubg so it can be used anywhere.
+"""
+
+import math
+from typing import Iterable, Tuple
+
+# Two-sided z values for the confidence levels we report
+Z_VALUES = {0.90: 1.6449, 0.95: 1.9600, 0.99: 2.5758}
+
+
+def mean_confidence_interval(values: Iterable[float], confidence: float = 0.95) -> Tuple[float, float, float]:
+    """Return (mean, low, high) using the normal approximation of the mean."""
+    values = list(values)
+    n = len(values)
+    if n == 0:
+        return 0.0, 0.0, 0.0
+    mean = sum(values) / n
+    if n == 1:
+        return mean, mean, mean
+    variance = sum((v - mean) ** 2 for v in values) / (n - 1)
+    margin = Z_VALUES[confidence] * math.sqrt(variance / n)
+    return mean, mean - margin, mean + margin
+
+
+class OnlineStats:
+    """Running count, mean, variance, min and max of a stream of values (Welford's algorithm), in constant memory."""
+
+    __slots__ = ("count", "mean", "_m2", "min", "max")
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value: float):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+        self.min = value if self.min is None or value < self.min else self.min
+        self.max = value if self.max is None or value > self.max else self.max
+
+    @property
+    def total(self) -> float:
+        return self.mean * self.count
+
+    @property
+    def variance(self) -> float:
+        return self._m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.variance)
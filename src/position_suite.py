@@ -0,0 +1,136 @@
+import gnubg
+import json
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from .agents import Agent
+from .interfaces import CorpusPosition, SuiteResult
+from .metrics import mean_confidence_interval
+from .positions import load_position_corpus
+from .utils import (default_board_representation, get_possible_moves, get_hint_equities, score_move, set_position,
+                    TOP_HINTS, track_rate_limit_wait)
+from .logger import logger
+
+
+def _snapshot_position(agent: Agent, position: CorpusPosition, dice: Tuple[int, int]) -> Dict:
+    """Set up a position and collect everything the agent and the scoring need."""
+    set_position(position["position_id"], 0, dice)
+    # One gnubg evaluation gives the legal moves, the hints and the best move
+    equities = get_hint_equities()
+    possible_moves = get_possible_moves(equities)
+    hints = equities[:TOP_HINTS]
+    best_move = equities[0]["move"] if equities else None
+    return {
+        "position": position,
+        "dice": dice,
+        "board": default_board_representation(),
+        "extra_input": agent.filter_inputs(possible_moves, hints, best_move, equities),
+        "equities": equities,
+    }
+
+
+def run_position_suite(agent: Agent, positions: List[CorpusPosition], concurrency: int = 16,
+                       seed: Optional[int] = None) -> List[SuiteResult]:
+    """Ask the agent for one move on every position and score it by equity loss.
+
+    gnubg is only used to snapshot the positions, one at a time. The agent calls
+    then run concurrently on the snapshots, unless the agent reads the gnubg
+    position itself. Positions without dice in the corpus get seeded dice so
+    two runs with the same seed see the same decisions.
+    """
+    rng = random.Random(seed)
+    gnubg.command("new game")
+    gnubg.command("set player 0 human")
+    gnubg.command("set player 1 human")
+
+    snapshots = []
+    for position in positions:
+        dice = position.get("dice") or (rng.randint(1, 6), rng.randint(1, 6))
+        snapshots.append(_snapshot_position(agent, position, dice))
+    logger.info(f"Snapshotted {len(snapshots)} positions for {agent}")
+
+    def evaluate(snapshot: Dict) -> SuiteResult:
+        position = snapshot["position"]
+        equities = snapshot["equities"]
+        result = SuiteResult(
+            position_id=position["position_id"],
+            dice=snapshot["dice"],
+            label=position.get("label"),
+            move=None,
+            best_move=equities[0]["move"] if equities else None,
+            equity_loss=0.0,
+            valid=True,
+            forced=len(equities) <= 1,
+            duration=0.0,
+            rate_limit_wait=0.0
+        )
+        if result["forced"]:
+            return result
+
+        start = time.time()
+        with track_rate_limit_wait() as rate_limit_wait:
+            move = agent.choose_move(snapshot["board"], snapshot["extra_input"])
+        result["duration"] = time.time() - start
+        result["rate_limit_wait"] = rate_limit_wait[0]
+        result["move"] = move
+        result["equity_loss"], result["valid"] = score_move(move, equities)
+        logger.debug("Position %s dice %s: %s (loss %.3f)", position['position_id'], snapshot['dice'], move, result['equity_loss'])
+        return result
+
+    if agent.uses_gnubg_state:
+        results = []
+        for snapshot in snapshots:
+            set_position(snapshot["position"]["position_id"], 0, snapshot["dice"])
+            results.append(evaluate(snapshot))
+        return results
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        return list(executor.map(evaluate, snapshots))
+
+
+def summarize_suite(results: List[SuiteResult]) -> Dict:
+    """Aggregate suite results into mean equity loss with a 95% confidence interval."""
+    scored = [r for r in results if not r["forced"]]
+    valid = [r for r in scored if r["valid"]]
+    mean_loss, low, high = mean_confidence_interval(r["equity_loss"] for r in scored)
+    mean_valid_loss, valid_low, valid_high = mean_confidence_interval(r["equity_loss"] for r in valid)
+
+    return {
+        "positions": len(results),
+        "scored_positions": len(scored),
+        "forced_positions": len(results) - len(scored),
+        "invalid_moves": len(scored) - len(valid),
+        "invalid_move_rate": (len(scored) - len(valid)) / len(scored) if scored else 0,
+        "best_move_rate": sum(1 for r in valid if r["equity_loss"] < 1e-6) / len(scored) if scored else 0,
+        "mean_equity_loss": mean_loss,
+        "equity_loss_ci": [low, high],
+        "mean_equity_loss_valid": mean_valid_loss,
+        "equity_loss_valid_ci": [valid_low, valid_high],
+        "avg_move_duration": sum(r["duration"] for r in scored) / len(scored) if scored else 0,
+        "avg_rate_limit_wait": sum(r["rate_limit_wait"] for r in scored) / len(scored) if scored else 0,
+    }
+
+
+def run_position_suite_from_env(agent: Agent, log_folder_path: str, log_file_name: str) -> Dict:
+    """Run the position suite configured by environment variables and export the results to JSON."""
+    suite_file = os.getenv('GAME_SUITE_FILE')
+    concurrency = int(os.getenv('GAME_SUITE_CONCURRENCY', '16'))
+    seed = int(os.getenv('GAME_SEED')) if os.getenv('GAME_SEED') else None
+
+    positions = load_position_corpus(suite_file)
+    start = time.time()
+    results = run_position_suite(agent, positions, concurrency=concurrency, seed=seed)
+    summary = summarize_suite(results)
+    summary["duration"] = time.time() - start
+    logger.info(f"Position suite finished: {summary}")
+
+    os.makedirs(log_folder_path, exist_ok=True)
+    results_file = os.path.join(log_folder_path, f"{log_file_name}_suite.json")
+    with open(results_file, 'w') as f:
+        json.dump({"agent": str(agent), "suite_file": suite_file, "seed": seed,
+                   "summary": summary, "llm_routes": agent.route_metrics(), "results": results}, f, indent=2)
+    logger.debug("Suite results exported to %s", results_file)
+    return summary
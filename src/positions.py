@@ -0,0 +1,89 @@
+"""
+Position corpus loading and game planning.
+
+A corpus file lists one gnubg position ID per line, optionally followed by the
+dice to play and a comment used as a label:
+
+    # bear-off positions
+    4HPwATDgc/ABMA 31   # ace-point game
+    jGfkASjg8wcBMA
+
+This module does not import gnubg so it can be used by main.py as well as
+inside the gnubg process.
+"""
+
+import random
+import re
+from typing import List, Optional, Tuple
+
+from .interfaces import CorpusPosition
+
+POSITION_MODES = ("sample", "exhaustive")
+
+_POSITION_ID_PATTERN = re.compile(r'^[A-Za-z0-9+/]{14}$')
+_DICE_PATTERN = re.compile(r'^([1-6])-?([1-6])$')
+
+
+def parse_dice(dice: str) -> Optional[Tuple[int, int]]:
+    """Parse dice written as "31" or "3-1". Returns None for an empty string."""
+    if not dice:
+        return None
+    match = _DICE_PATTERN.match(dice.strip())
+    if not match:
+        raise ValueError(f"Invalid dice '{dice}', expected e.g. '31' or '3-1'")
+    return int(match.group(1)), int(match.group(2))
+
+
+def load_position_corpus(corpus_file: str) -> List[CorpusPosition]:
+    """Load a corpus file of gnubg position IDs."""
+    positions = []
+    with open(corpus_file, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            content, _, comment = line.partition('#')
+            fields = content.split()
+            if not fields:
+                continue
+
+            position_id = fields[0]
+            if not _POSITION_ID_PATTERN.match(position_id):
+                raise ValueError(f"{corpus_file}:{line_number}: invalid gnubg position ID '{position_id}'")
+            try:
+                dice = parse_dice(fields[1]) if len(fields) > 1 else None
+            except ValueError as e:
+                raise ValueError(f"{corpus_file}:{line_number}: {e}")
+
+            positions.append(CorpusPosition(
+                position_id=position_id,
+                dice=dice,
+                label=comment.strip() or None
+            ))
+
+    if not positions:
+        raise ValueError(f"No positions found in corpus file {corpus_file}")
+    return positions
+
+
+def plan_position_games(positions: List[CorpusPosition], mode: str = "sample",
+                        num_games: int = 1, seed: Optional[int] = None) -> List[Tuple[CorpusPosition, int]]:
+    """Plan which position (and which player on roll) every game starts from.
+
+    Every position is played twice with seats swapped, once with agent1 on roll
+    and once with agent2 on roll, so both agents face the same decisions.
+        sample: draw random positions until num_games games are planned.
+        exhaustive: play every position in the corpus, num_games is ignored.
+    Returns a list of (position, turn) where turn is the player on roll (0 or 1).
+    """
+    if mode not in POSITION_MODES:
+        raise ValueError(f"Unknown position mode: {mode}")
+
+    if mode == "exhaustive":
+        return [(position, turn) for position in positions for turn in (0, 1)]
+
+    rng = random.Random(seed)
+    plan = []
+    while len(plan) < num_games:
+        position = rng.choice(positions)
+        plan.append((position, 0))
+        if len(plan) < num_games:
+            plan.append((position, 1))
+    return plan
@@ -0,0 +1,265 @@
+"""
+Streaming, parallel aggregation of the game statistics of a run folder.
+
+RunTotals keeps running sums instead of a list of games, and partial totals
+from different workers are merged. aggregate_run() splits stats.jsonl into
+byte ranges and the legacy per-game files into chunks of paths, and aggregates
+each part in a worker process, so memory stays bounded by the number of parts
+in flight, not by the number of games. Legacy files of games that are also in
+stats.jsonl are skipped by checking their id against sorted ranges of the
+archived game ids, which stay a handful of entries for the usual consecutive ids.
+
+This module does not import gnubg.
+"""
+
+import bisect
+import fnmatch
+import json
+import math
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .run_store import LEGACY_STATS_PATTERN, STATS_FILE_NAME
+
+CHUNK_BYTES = 8 * 1024 * 1024
+CHUNK_FILES = 512
+
+
+class RunTotals:
+    """Running aggregates of the games of one run. Totals of disjoint sets of games can be merged."""
+
+    def __init__(self):
+        self.num_games = 0
+        self.agent1_wins = 0
+        self.agent2_wins = 0
+        self.total_duration = 0.0
+        self.total_turns = 0
+        self.total_invalid_moves_p1 = 0
+        self.total_invalid_moves_p2 = 0
+        self.total_moves_p1 = 0
+        self.total_moves_p2 = 0
+        self.game_types = {"normal": 0, "gammon": 0, "backgammon": 0}
+        # Games per (invalid moves, total moves) of each player, for confidence intervals over games
+        self.move_histograms = ({}, {})
+        self.errors = 0
+        # Agent names are taken from the game with the lowest id
+        self.first_game_id = None
+        self.agent1_name = "Player1"
+        self.agent2_name = "Player2"
+
+    def add(self, game: Dict):
+        p1_stats = game.get("player1_stats", {})
+        p2_stats = game.get("player2_stats", {})
+        winner = game.get("winner")
+        self.num_games += 1
+        if winner == 0:
+            self.agent1_wins += 1
+        elif winner == 1:
+            self.agent2_wins += 1
+        self.total_invalid_moves_p1 += p1_stats.get("invalid_moves", 0)
+        self.total_invalid_moves_p2 += p2_stats.get("invalid_moves", 0)
+        self.total_moves_p1 += p1_stats.get("total_moves", 0)
+        self.total_moves_p2 += p2_stats.get("total_moves", 0)
+        self.total_duration += game.get("game_duration", 0)
+        self.total_turns += game.get("total_turns", 0)
+        game_type = game.get("game_type", "normal")
+        self.game_types[game_type] = self.game_types.get(game_type, 0) + 1
+        for histogram, stats in zip(self.move_histograms, (p1_stats, p2_stats)):
+            key = (stats.get("invalid_moves", 0), stats.get("total_moves", 0))
+            histogram[key] = histogram.get(key, 0) + 1
+
+        game_id = game.get("game_id", 0)
+        if self.first_game_id is None or game_id < self.first_game_id:
+            self.first_game_id = game_id
+            self.agent1_name = p1_stats.get("name", "Player1")
+            self.agent2_name = p2_stats.get("name", "Player2")
+
+    def merge(self, other: "RunTotals"):
+        for name in ("num_games", "agent1_wins", "agent2_wins", "total_duration", "total_turns",
+                     "total_invalid_moves_p1", "total_invalid_moves_p2", "total_moves_p1", "total_moves_p2", "errors"):
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        for game_type, count in other.game_types.items():
+            self.game_types[game_type] = self.game_types.get(game_type, 0) + count
+        for histogram, other_histogram in zip(self.move_histograms, other.move_histograms):
+            for key, count in other_histogram.items():
+                histogram[key] = histogram.get(key, 0) + count
+        if other.first_game_id is not None and (self.first_game_id is None or other.first_game_id < self.first_game_id):
+            self.first_game_id = other.first_game_id
+            self.agent1_name = other.agent1_name
+            self.agent2_name = other.agent2_name
+
+    def analysis(self, run_name: str, run_folder: str, game_results: Optional[List[Dict]] = None) -> Dict:
+        """Return the totals in the format of GameRunEvaluator.analyze_run."""
+        num_games = self.num_games
+        if num_games == 0:
+            return {"run_name": run_name, "run_folder": run_folder, "num_games": 0, "error": "No game statistics found"}
+        return {
+            "run_name": run_name,
+            "run_folder": run_folder,
+            "num_games": num_games,
+            "agent1_name": self.agent1_name,
+            "agent2_name": self.agent2_name,
+            "agent1_wins": self.agent1_wins,
+            "agent2_wins": self.agent2_wins,
+            "agent1_win_rate": self.agent1_wins / num_games * 100,
+            "agent2_win_rate": self.agent2_wins / num_games * 100,
+            "total_duration": self.total_duration,
+            "avg_duration": self.total_duration / num_games,
+            "total_turns": self.total_turns,
+            "avg_turns": self.total_turns / num_games,
+            "total_invalid_moves_p1": self.total_invalid_moves_p1,
+            "total_invalid_moves_p2": self.total_invalid_moves_p2,
+            "total_moves_p1": self.total_moves_p1,
+            "total_moves_p2": self.total_moves_p2,
+            "invalid_move_rate_p1": self.total_invalid_moves_p1 / self.total_moves_p1 * 100 if self.total_moves_p1 > 0 else 0,
+            "invalid_move_rate_p2": self.total_invalid_moves_p2 / self.total_moves_p2 * 100 if self.total_moves_p2 > 0 else 0,
+            "game_types": self.game_types,
+            "move_histograms": [[[invalid, total, count] for (invalid, total), count in sorted(histogram.items())]
+                                for histogram in self.move_histograms],
+            "game_results": game_results if game_results is not None else []
+        }
+
+
+IdRanges = List[Tuple[int, int]]
+
+
+def _merge_ranges(ranges: Iterable[Tuple[int, int]]) -> IdRanges:
+    """Sorted, disjoint (first, last) id ranges covering the given ones, adjacent ranges joined."""
+    merged = []
+    for first, last in sorted(ranges):
+        if merged and first <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], last))
+        else:
+            merged.append((first, last))
+    return merged
+
+
+def _in_ranges(ranges: IdRanges, game_id) -> bool:
+    if not isinstance(game_id, int):
+        return False
+    i = bisect.bisect_right(ranges, (game_id, math.inf)) - 1
+    return i >= 0 and ranges[i][0] <= game_id <= ranges[i][1]
+
+
+def _aggregate_lines(stats_file: str, start: int, end: int) -> Tuple[RunTotals, IdRanges]:
+    """Aggregate the lines of stats.jsonl that start in [start, end). Returns the totals and the ranges of game ids seen."""
+    totals = RunTotals()
+    game_ids = []
+    with open(stats_file, 'rb') as f:
+        if start > 0:
+            # The line crossing start belongs to the previous range
+            f.seek(start - 1)
+            f.readline()
+        while f.tell() < end:
+            line = f.readline()
+            if not line.endswith(b"\n"):
+                break  # end of file or a game still being written
+            if not line.strip():
+                continue
+            try:
+                game = json.loads(line)
+            except json.JSONDecodeError:
+                totals.errors += 1
+                continue
+            totals.add(game)
+            if isinstance(game.get("game_id"), int):
+                game_ids.append(game["game_id"])
+    return totals, _merge_ranges((game_id, game_id) for game_id in game_ids)
+
+
+# Ranges of the game ids already counted from stats.jsonl, set once per worker by _init_legacy_worker
+_archived_ranges: IdRanges = []
+
+
+def _init_legacy_worker(archived_ranges: IdRanges):
+    global _archived_ranges
+    _archived_ranges = archived_ranges
+
+
+def _aggregate_files(stats_files: List[str], archived_ranges: Optional[IdRanges] = None) -> RunTotals:
+    """Aggregate legacy per-game stats files, skipping games already archived in stats.jsonl."""
+    archived_ranges = _archived_ranges if archived_ranges is None else archived_ranges
+    totals = RunTotals()
+    for stats_file in stats_files:
+        try:
+            with open(stats_file, 'rb') as f:
+                game = json.loads(f.read())
+        except Exception:
+            totals.errors += 1
+            continue
+        if not _in_ranges(archived_ranges, game.get("game_id")):
+            totals.add(game)
+    return totals
+
+
+def _iter_legacy_chunks(run_folder: str, chunk_files: int) -> Iterator[List[str]]:
+    """Yield the legacy stats files of a run folder in chunks, without listing the whole folder in memory."""
+    chunk = []
+    with os.scandir(run_folder) as entries:
+        for entry in entries:
+            if fnmatch.fnmatch(entry.name, LEGACY_STATS_PATTERN):
+                chunk.append(entry.path)
+                if len(chunk) == chunk_files:
+                    yield chunk
+                    chunk = []
+    if chunk:
+        yield chunk
+
+
+def _map_bounded(executor, function: Callable, tasks: Iterable[Tuple], max_in_flight: int) -> Iterator:
+    """Like executor.map but with at most max_in_flight tasks submitted, results in completion order."""
+    pending = set()
+    for task in tasks:
+        pending.add(executor.submit(function, *task))
+        if len(pending) >= max_in_flight:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+    for future in pending:
+        yield future.result()
+
+
+def aggregate_run(run_folder: str, workers: Optional[int] = None, processes: bool = True,
+                  chunk_bytes: int = CHUNK_BYTES, chunk_files: int = CHUNK_FILES) -> RunTotals:
+    """Aggregate all game statistics of a run folder, stats.jsonl and legacy per-game files, in parallel.
+        workers: pool size (default: CPU count). workers=1 aggregates in the calling process.
+        processes: use a process pool (JSON parsing is CPU bound) or a thread pool.
+    """
+    workers = workers or os.cpu_count() or 1
+    totals = RunTotals()
+    archived_ranges: IdRanges = []
+
+    stats_file = os.path.join(run_folder, STATS_FILE_NAME)
+    ranges = []
+    if os.path.exists(stats_file):
+        size = os.path.getsize(stats_file)
+        ranges = [(stats_file, start, min(start + chunk_bytes, size)) for start in range(0, size, chunk_bytes)]
+
+    if workers == 1 or len(ranges) <= 1:
+        for task in ranges:
+            part, id_ranges = _aggregate_lines(*task)
+            totals.merge(part)
+            archived_ranges = _merge_ranges(archived_ranges + id_ranges)
+    else:
+        pool = ProcessPoolExecutor if processes else ThreadPoolExecutor
+        with pool(max_workers=workers) as executor:
+            for part, id_ranges in _map_bounded(executor, _aggregate_lines, ranges, 2 * workers):
+                totals.merge(part)
+                archived_ranges = _merge_ranges(archived_ranges + id_ranges)
+
+    chunks = ((chunk,) for chunk in _iter_legacy_chunks(run_folder, chunk_files))
+    if workers == 1:
+        for chunk in chunks:
+            totals.merge(_aggregate_files(chunk[0], archived_ranges))
+    elif processes:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_legacy_worker,
+                                 initargs=(archived_ranges,)) as executor:
+            for part in _map_bounded(executor, _aggregate_files, chunks, 2 * workers):
+                totals.merge(part)
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            tasks = ((chunk[0], archived_ranges) for chunk in chunks)
+            for part in _map_bounded(executor, _aggregate_files, tasks, 2 * workers):
+                totals.merge(part)
+    return totals
@@ -0,0 +1,286 @@
+"""
+Incremental SQLite index of run folders for evaluate_runs.py.
+
+ingest() loads new game statistics into a local database. A run folder is only
+rescanned when its directory or stats.jsonl changed, stats.jsonl is read from
+the offset where the last ingest stopped, and legacy per-game files are tracked
+by mtime and size. Reports are then plain indexed queries.
+
+This module does not import gnubg.
+"""
+
+import glob
+import json
+import os
+import sqlite3
+import time
+from typing import Dict, Iterator, List, Optional
+
+from .run_store import STATS_FILE_NAME, LEGACY_STATS_PATTERN
+
+MANIFEST_FILE_NAME = "manifest.json"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_name TEXT PRIMARY KEY,
+    run_folder TEXT NOT NULL,
+    started_at TEXT,
+    mode TEXT,
+    agent1 TEXT,
+    agent2 TEXT,
+    prompt TEXT,
+    system_prompt TEXT,
+    possible_moves INTEGER,
+    hints INTEGER,
+    best_move INTEGER,
+    manifest TEXT
+);
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    run_name TEXT NOT NULL,
+    mtime REAL,
+    size INTEGER,
+    offset INTEGER DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS games (
+    run_name TEXT NOT NULL,
+    game_id INTEGER NOT NULL,
+    winner INTEGER,
+    player1_name TEXT,
+    player2_name TEXT,
+    game_duration REAL,
+    total_turns INTEGER,
+    game_type TEXT,
+    p1_invalid_moves INTEGER,
+    p1_total_moves INTEGER,
+    p2_invalid_moves INTEGER,
+    p2_total_moves INTEGER,
+    stats TEXT,
+    PRIMARY KEY (run_name, game_id)
+);
+CREATE INDEX IF NOT EXISTS idx_runs_agent1 ON runs(agent1);
+CREATE INDEX IF NOT EXISTS idx_runs_agent2 ON runs(agent2);
+CREATE INDEX IF NOT EXISTS idx_runs_started_at ON runs(started_at);
+CREATE INDEX IF NOT EXISTS idx_games_run ON games(run_name, winner);
+"""
+
+
+def _started_at_from_name(run_name: str) -> Optional[str]:
+    """run_20250907_185349 -> 2025-09-07T18:53:49"""
+    try:
+        return time.strftime('%Y-%m-%dT%H:%M:%S', time.strptime(run_name, "run_%Y%m%d_%H%M%S"))
+    except ValueError:
+        return None
+
+
+class RunIndex:
+    """SQLite index of the games of all run folders in an output directory."""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self.connection = sqlite3.connect(db_path)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.executescript(_SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def ingest(self, output_dir: str) -> int:
+        """Load new game statistics of every run folder. Returns the number of games added."""
+        added = 0
+        run_folders = sorted(glob.glob(os.path.join(os.path.abspath(output_dir), "run_*")))
+        with self.connection:
+            for run_folder in run_folders:
+                added += self._ingest_run(run_folder)
+
+            # Forget runs whose folder was deleted
+            existing = {os.path.basename(folder) for folder in run_folders}
+            for row in self.connection.execute("SELECT run_name FROM runs").fetchall():
+                if row["run_name"] not in existing:
+                    self._delete_run(row["run_name"])
+        return added
+
+    def _delete_run(self, run_name: str):
+        for table in ("runs", "files", "games"):
+            self.connection.execute(f"DELETE FROM {table} WHERE run_name = ?", (run_name,))
+
+    def _file_state(self, path: str) -> Optional[sqlite3.Row]:
+        return self.connection.execute("SELECT * FROM files WHERE path = ?", (path,)).fetchone()
+
+    def _set_file_state(self, path: str, run_name: str, stat: os.stat_result, offset: int = 0):
+        self.connection.execute(
+            "INSERT OR REPLACE INTO files (path, run_name, mtime, size, offset) VALUES (?, ?, ?, ?, ?)",
+            (path, run_name, stat.st_mtime, stat.st_size, offset))
+
+    def _unchanged(self, path: str, stat: os.stat_result) -> bool:
+        state = self._file_state(path)
+        return state is not None and state["mtime"] == stat.st_mtime and state["size"] == stat.st_size
+
+    def _ingest_run(self, run_folder: str) -> int:
+        run_name = os.path.basename(run_folder)
+        folder_stat = os.stat(run_folder)
+        stats_file = os.path.join(run_folder, STATS_FILE_NAME)
+        stats_stat = os.stat(stats_file) if os.path.exists(stats_file) else None
+
+        # Nothing was added or appended since the last ingest
+        if self._unchanged(run_folder, folder_stat) and (stats_stat is None or self._unchanged(stats_file, stats_stat)):
+            return 0
+
+        self._ingest_manifest(run_folder, run_name)
+        added = 0
+
+        if stats_stat is not None:
+            state = self._file_state(stats_file)
+            offset = state["offset"] if state is not None and stats_stat.st_size >= state["offset"] else 0
+            with open(stats_file, 'rb') as f:
+                f.seek(offset)
+                data = f.read()
+            complete = data[:data.rfind(b"\n") + 1]
+            for line in complete.splitlines():
+                if line.strip():
+                    try:
+                        added += self._insert_game(run_name, json.loads(line))
+                    except json.JSONDecodeError as e:
+                        print(f"Warning: Could not read a line of {stats_file}: {e}")
+            self._set_file_state(stats_file, run_name, stats_stat, offset + len(complete))
+
+        for legacy_file in glob.glob(os.path.join(run_folder, LEGACY_STATS_PATTERN)):
+            legacy_stat = os.stat(legacy_file)
+            if self._unchanged(legacy_file, legacy_stat):
+                continue
+            try:
+                with open(legacy_file, 'r') as f:
+                    added += self._insert_game(run_name, json.load(f))
+            except Exception as e:
+                print(f"Warning: Could not read {legacy_file}: {e}")
+            self._set_file_state(legacy_file, run_name, legacy_stat)
+
+        self._set_file_state(run_folder, run_name, folder_stat)
+        return added
+
+    def _ingest_manifest(self, run_folder: str, run_name: str):
+        manifest_file = os.path.join(run_folder, MANIFEST_FILE_NAME)
+        manifest = {}
+        if os.path.exists(manifest_file):
+            try:
+                with open(manifest_file, 'r') as f:
+                    manifest = json.load(f)
+            except Exception as e:
+                print(f"Warning: Could not read {manifest_file}: {e}")
+
+        inputs = manifest.get("inputs", {})
+        self.connection.execute(
+            """INSERT OR REPLACE INTO runs (run_name, run_folder, started_at, mode, agent1, agent2, prompt, system_prompt,
+                                           possible_moves, hints, best_move, manifest)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            (run_name, run_folder, manifest.get("started_at") or _started_at_from_name(run_name), manifest.get("mode"),
+             manifest.get("agent1"), manifest.get("agent2"), manifest.get("prompt"), manifest.get("system_prompt"),
+             inputs.get("possible_moves"), inputs.get("hints"), inputs.get("best_move"), json.dumps(manifest)))
+
+    def _insert_game(self, run_name: str, stats: Dict) -> int:
+        """Insert or update a game, returns 1 if it was not indexed before."""
+        p1_stats = stats.get("player1_stats", {})
+        p2_stats = stats.get("player2_stats", {})
+        indexed = self.connection.execute("SELECT 1 FROM games WHERE run_name = ? AND game_id = ?",
+                                          (run_name, stats.get("game_id"))).fetchone()
+        self.connection.execute(
+            """INSERT OR REPLACE INTO games (run_name, game_id, winner, player1_name, player2_name, game_duration, total_turns,
+                                            game_type, p1_invalid_moves, p1_total_moves, p2_invalid_moves, p2_total_moves, stats)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            (run_name, stats.get("game_id"), stats.get("winner"), p1_stats.get("name"), p2_stats.get("name"),
+             stats.get("game_duration", 0), stats.get("total_turns", 0), stats.get("game_type", "normal"),
+             p1_stats.get("invalid_moves", 0), p1_stats.get("total_moves", 0),
+             p2_stats.get("invalid_moves", 0), p2_stats.get("total_moves", 0), json.dumps(stats)))
+        return 0 if indexed else 1
+
+    def query_runs(self, agent: str = None, prompt: str = None, inputs: List[str] = None,
+                   since: str = None, until: str = None) -> List[str]:
+        """Return the names of the runs matching all given filters, oldest first.
+            agent: case-insensitive substring of the agent type playing on either side, e.g. "llm".
+            prompt: substring of the prompt or system prompt.
+            inputs: agent inputs that must be enabled, e.g. ["hints", "best_move"].
+            since/until: ISO dates or timestamps, e.g. 2025-09-07.
+        """
+        conditions = []
+        params = []
+        if agent:
+            # Case-insensitive substring, so "llm" matches LLMAgent as in the equity report
+            conditions.append("(LOWER(agent1) LIKE ? OR LOWER(agent2) LIKE ?)")
+            params += [f"%{agent.lower()}%", f"%{agent.lower()}%"]
+        if prompt:
+            conditions.append("(prompt LIKE ? OR system_prompt LIKE ?)")
+            params += [f"%{prompt}%", f"%{prompt}%"]
+        for input_name in inputs or []:
+            if input_name not in ("possible_moves", "hints", "best_move"):
+                raise ValueError(f"Unknown agent input: {input_name}")
+            conditions.append(f"{input_name} = 1")
+        if since:
+            conditions.append("started_at >= ?")
+            params.append(since)
+        if until:
+            conditions.append("started_at <= ?")
+            params.append(until if "T" in until else f"{until}T23:59:59")  # include the whole day
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        rows = self.connection.execute(f"SELECT run_name FROM runs {where} ORDER BY started_at, run_name", params)
+        return [row["run_name"] for row in rows]
+
+    def analyze_run(self, run_name: str, include_games: bool = True) -> Dict:
+        """Aggregate one run with SQL, in the same format as GameRunEvaluator.analyze_run."""
+        run = self.connection.execute("SELECT * FROM runs WHERE run_name = ?", (run_name,)).fetchone()
+        run_folder = run["run_folder"] if run else run_name
+        totals = self.connection.execute(
+            """SELECT COUNT(*) AS num_games,
+                      SUM(winner = 0) AS agent1_wins, SUM(winner = 1) AS agent2_wins,
+                      SUM(game_duration) AS total_duration, SUM(total_turns) AS total_turns,
+                      SUM(p1_invalid_moves) AS p1_invalid, SUM(p1_total_moves) AS p1_total,
+                      SUM(p2_invalid_moves) AS p2_invalid, SUM(p2_total_moves) AS p2_total,
+                      MIN(player1_name) AS agent1_name, MIN(player2_name) AS agent2_name
+               FROM games WHERE run_name = ?""", (run_name,)).fetchone()
+
+        num_games = totals["num_games"]
+        if not num_games:
+            return {"run_name": run_name, "run_folder": run_folder, "num_games": 0, "error": "No game statistics found"}
+
+        game_types = {"normal": 0, "gammon": 0, "backgammon": 0}
+        for row in self.connection.execute(
+                "SELECT game_type, COUNT(*) AS count FROM games WHERE run_name = ? GROUP BY game_type", (run_name,)):
+            game_types[row["game_type"]] = row["count"]
+
+        move_histograms = []
+        for player in ("p1", "p2"):
+            rows = self.connection.execute(
+                f"""SELECT {player}_invalid_moves, {player}_total_moves, COUNT(*) FROM games WHERE run_name = ?
+                    GROUP BY {player}_invalid_moves, {player}_total_moves ORDER BY 1, 2""", (run_name,))
+            move_histograms.append([list(row) for row in rows])
+
+        p1_total = totals["p1_total"] or 0
+        p2_total = totals["p2_total"] or 0
+        return {
+            "run_name": run_name,
+            "run_folder": run_folder,
+            "num_games": num_games,
+            "agent1_name": totals["agent1_name"] or "Player1",
+            "agent2_name": totals["agent2_name"] or "Player2",
+            "agent1_wins": totals["agent1_wins"] or 0,
+            "agent2_wins": totals["agent2_wins"] or 0,
+            "agent1_win_rate": (totals["agent1_wins"] or 0) / num_games * 100,
+            "agent2_win_rate": (totals["agent2_wins"] or 0) / num_games * 100,
+            "total_duration": totals["total_duration"] or 0,
+            "avg_duration": (totals["total_duration"] or 0) / num_games,
+            "total_turns": totals["total_turns"] or 0,
+            "avg_turns": (totals["total_turns"] or 0) / num_games,
+            "total_invalid_moves_p1": totals["p1_invalid"] or 0,
+            "total_invalid_moves_p2": totals["p2_invalid"] or 0,
+            "total_moves_p1": p1_total,
+            "total_moves_p2": p2_total,
+            "invalid_move_rate_p1": (totals["p1_invalid"] or 0) / p1_total * 100 if p1_total > 0 else 0,
+            "invalid_move_rate_p2": (totals["p2_invalid"] or 0) / p2_total * 100 if p2_total > 0 else 0,
+            "game_types": game_types,
+            "move_histograms": move_histograms,
+            "game_results": list(self.iter_games(run_name)) if include_games else []
+        }
+
+    def iter_games(self, run_name: str) -> Iterator[Dict]:
+        """Iterate over the full statistics of the games of a run, ordered by game id."""
+        for row in self.connection.execute("SELECT stats FROM games WHERE run_name = ? ORDER BY game_id", (run_name,)):
+            yield json.loads(row["stats"])
@@ -0,0 +1,179 @@
+"""
+Run-level storage of game statistics.
+
+Instead of one {name}_{id}_stats.json file per game, every game of a run appends
+one JSON line to stats.jsonl in the run folder. Data added to a game after it
+finished lives in side files that iter_stats() joins into the game statistics:
+the resource usage of its gnubg process (resources.jsonl, written by main.py)
+and gnubg's offline analysis of its saved match (analysis.jsonl, written by
+analyze_games.py from the SGF files in games/). Appends are serialized with an
+exclusive file lock, so parallel game processes can share the file. Run folders
+written before the archive format are still read through their per-game files,
+and migrate() converts them.
+
+This module does not import gnubg so it can be used by main.py and evaluate_runs.py.
+"""
+
+import fcntl
+import glob
+import json
+import os
+import re
+from typing import Dict, Iterator, List, Optional
+
+STATS_FILE_NAME = "stats.jsonl"
+LEGACY_STATS_PATTERN = "*_stats.json"
+GAMES_DIR_NAME = "games"
+# Side files of data added to games after they finished: stats key -> file name
+SIDE_FILES = {
+    "resources": "resources.jsonl",
+    "gnubg_analysis": "analysis.jsonl",
+}
+
+_SGF_GAME_ID = re.compile(r'_(\d+)\.sgf$')
+
+
+def game_id_from_sgf(sgf_file: str) -> Optional[int]:
+    """Game id of a match file saved as games/{name}_{id}.sgf"""
+    match = _SGF_GAME_ID.search(sgf_file)
+    return int(match.group(1)) if match else None
+
+
+class RunStore:
+    """Append-only store of the game statistics of one run folder."""
+
+    def __init__(self, run_folder: str):
+        self.run_folder = run_folder
+        self.stats_file = os.path.join(run_folder, STATS_FILE_NAME)
+        self.games_dir = os.path.join(run_folder, GAMES_DIR_NAME)
+        self._read_offset = 0
+
+    def append_stats(self, stats: Dict):
+        """Append one game's statistics, safe for concurrent game processes."""
+        self._append_line(self.stats_file, stats)
+
+    def append_resources(self, game_id: int, resources: Dict):
+        """Record the resource usage of one game's gnubg process."""
+        self._append_side_record("resources", game_id, resources)
+
+    def append_analysis(self, game_id: int, analysis: Dict):
+        """Record gnubg's offline analysis of one game's saved match."""
+        self._append_side_record("gnubg_analysis", game_id, analysis)
+
+    def _append_side_record(self, key: str, game_id: int, value: Dict):
+        self._append_line(os.path.join(self.run_folder, SIDE_FILES[key]), {"game_id": game_id, key: value})
+
+    def read_side_records(self, key: str) -> Dict[int, Dict]:
+        """Records of a side file by game id, the last record of a game wins."""
+        records = {}
+        side_file = os.path.join(self.run_folder, SIDE_FILES[key])
+        if os.path.exists(side_file):
+            with open(side_file, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        record = json.loads(line)
+                        records[record["game_id"]] = record[key]
+        return records
+
+    def sgf_files(self) -> List[str]:
+        """Saved matches of the run's games."""
+        return sorted(glob.glob(os.path.join(self.games_dir, "*.sgf")))
+
+    def _append_line(self, file_path: str, record: Dict):
+        line = (json.dumps(record) + "\n").encode('utf-8')
+        with open(file_path, 'a+b') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                # A writer killed mid-line left a torn last line, the record starts on a line of its own
+                size = f.seek(0, os.SEEK_END)
+                if size:
+                    f.seek(size - 1)
+                    if f.read(1) != b"\n":
+                        line = b"\n" + line
+                f.write(line)
+                f.flush()
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def read_new_stats(self) -> List[Dict]:
+        """Return the records appended since the last call. A partially written last line is left for the next call."""
+        if not os.path.exists(self.stats_file):
+            return []
+        with open(self.stats_file, 'rb') as f:
+            f.seek(self._read_offset)
+            data = f.read()
+        complete = data[:data.rfind(b"\n") + 1]
+        self._read_offset += len(complete)
+        records = []
+        for line in complete.splitlines():
+            if line.strip():
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError as e:
+                    print(f"Warning: Could not read a record of {self.stats_file}: {e}")
+        return records
+
+    def legacy_stats_files(self) -> List[str]:
+        """Per-game stats files written before the archive format."""
+        return sorted(glob.glob(os.path.join(self.run_folder, LEGACY_STATS_PATTERN)))
+
+    def iter_stats(self) -> Iterator[Dict]:
+        """Iterate over all game statistics of the run, archived and legacy per-game files, joined with the side files."""
+        side_records = {key: self.read_side_records(key) for key in SIDE_FILES}
+        for stats in self._iter_game_stats():
+            for key, records in side_records.items():
+                if stats.get(key) is None and stats.get("game_id") in records:
+                    stats[key] = records[stats["game_id"]]
+            yield stats
+
+    def _iter_archived_stats(self) -> Iterator[Dict]:
+        """Records of stats.jsonl, unreadable (torn or corrupt) lines are skipped with a warning."""
+        if not os.path.exists(self.stats_file):
+            return
+        with open(self.stats_file, 'r', encoding='utf-8') as f:
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError as e:
+                    print(f"Warning: Could not read {self.stats_file}:{line_number}: {e}")
+
+    def _read_legacy_stats(self, stats_file: str) -> Optional[Dict]:
+        """Statistics of a legacy per-game file, None with a warning if it cannot be read."""
+        try:
+            with open(stats_file, 'r') as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"Warning: Could not read {stats_file}: {e}")
+            return None
+
+    def _iter_game_stats(self) -> Iterator[Dict]:
+        seen_game_ids = set()
+        for stats in self._iter_archived_stats():
+            seen_game_ids.add(stats.get("game_id"))
+            yield stats
+
+        for stats_file in self.legacy_stats_files():
+            stats = self._read_legacy_stats(stats_file)
+            if stats is not None and stats.get("game_id") not in seen_game_ids:
+                yield stats
+
+    def migrate(self, remove_legacy: bool = False) -> int:
+        """Move legacy per-game stats files into stats.jsonl. Returns the number of games migrated.
+            Unreadable files are skipped and kept, even with remove_legacy.
+        """
+        archived_game_ids = {stats.get("game_id") for stats in self._iter_archived_stats()}
+
+        migrated = 0
+        for stats_file in self.legacy_stats_files():
+            stats = self._read_legacy_stats(stats_file)
+            if stats is None:
+                continue
+            if stats.get("game_id") not in archived_game_ids:
+                self.append_stats(stats)
+                archived_game_ids.add(stats.get("game_id"))
+                migrated += 1
+            if remove_legacy:
+                os.remove(stats_file)
+        return migrated
@@ -0,0 +1,182 @@
+"""
+Compact binary per-turn game trace.
+
+A trace file is a sequence of length-prefixed records, one per turn, appended
+with a single write each so several game processes can share one file per run.
+
+Record layout (little endian):
+    uint32  payload length
+    uint8   format version
+    uint32  game id
+    uint16  turn number
+    uint8   player on roll (0 or 1)
+    uint8   die 1, uint8 die 2 (0 if unknown)
+    uint8   1 if the agent's move was valid
+    float32 agent latency in seconds
+    float32 gnubg latency in seconds (moves, hints and best move)
+    float32 seconds the agent's LLM calls queued for the rate limiter (version 2 on)
+    str8    position ID
+    str8    chosen move (empty if None)
+    uint16  number of candidate moves, then for each: float32 equity, str8 move
+where str8 is a uint8 length followed by UTF-8 bytes.
+
+This module does not import gnubg. Read a trace with iter_trace(), or print a
+summary with: python -m src.trace output/run_<timestamp>/trace.bin
+"""
+
+import mmap
+import os
+import struct
+import sys
+from typing import Iterator, List, NamedTuple, Optional, Tuple
+
+TRACE_VERSION = 2
+TRACE_FILE_NAME = "trace.bin"
+
+_LENGTH = struct.Struct('<I')
+_HEADER = struct.Struct('<BIHBBBBfff')
+_HEADER_V1 = struct.Struct('<BIHBBBBff')
+_COUNT = struct.Struct('<H')
+_EQUITY = struct.Struct('<f')
+
+
+class TurnRecord(NamedTuple):
+    game_id: int
+    turn: int
+    player: int
+    dice: Tuple[int, int]
+    valid: bool
+    agent_latency: float
+    gnubg_latency: float
+    rate_limit_wait: float  # 0 in version 1 traces
+    position_id: str
+    move: Optional[str]
+    candidates: Optional[List[Tuple[str, float]]]  # None when read with candidates=False
+
+
+def _pack_str(value: Optional[str]) -> bytes:
+    # Truncated to 255 bytes on a character boundary, a cut multi-byte character would not decode
+    data = (value or "").encode('utf-8')[:255].decode('utf-8', 'ignore').encode('utf-8')
+    return bytes((len(data),)) + data
+
+
+def pack_turn(game_id: int, turn: int, player: int, dice: Optional[Tuple[int, int]], valid: bool,
+              agent_latency: float, gnubg_latency: float, rate_limit_wait: float, position_id: str,
+              move: Optional[str], candidates: List[dict]) -> bytes:
+    """Encode one turn as a length-prefixed record. candidates are hints ({"move", "equity"})."""
+    die1, die2 = dice if dice else (0, 0)
+    parts = [
+        _HEADER.pack(TRACE_VERSION, game_id, turn, player, die1, die2, int(bool(valid)), agent_latency, gnubg_latency,
+                     rate_limit_wait),
+        _pack_str(position_id),
+        _pack_str(move if isinstance(move, str) else None),
+        _COUNT.pack(len(candidates)),
+    ]
+    for candidate in candidates:
+        parts.append(_EQUITY.pack(candidate.get("equity", 0)))
+        parts.append(_pack_str(candidate["move"]))
+    payload = b"".join(parts)
+    return _LENGTH.pack(len(payload)) + payload
+
+
+class TraceWriter:
+    """Appends turn records to a trace file, one write per record."""
+
+    def __init__(self, trace_file: str):
+        self.trace_file = trace_file
+        self._fd = os.open(trace_file, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+
+    def write_turn(self, *args, **kwargs):
+        """Append one turn, see pack_turn for the arguments."""
+        os.write(self._fd, pack_turn(*args, **kwargs))
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+def _read_str(buffer, offset: int) -> Tuple[str, int]:
+    length = buffer[offset]
+    start = offset + 1
+    # Traces written before truncation kept characters whole can end a string in half a character
+    return bytes(buffer[start:start + length]).decode('utf-8', 'replace'), start + length
+
+
+def iter_trace(trace_file: str, candidates: bool = True) -> Iterator[TurnRecord]:
+    """Iterate over the turns of a memory-mapped trace file.
+        With candidates=False the candidate moves are skipped, which is much faster.
+    """
+    if os.path.getsize(trace_file) == 0:
+        return
+    with open(trace_file, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+        offset = 0
+        end = len(buffer)
+        while offset + _LENGTH.size <= end:
+            (length,) = _LENGTH.unpack_from(buffer, offset)
+            record_start = offset + _LENGTH.size
+            offset = record_start + length
+            if offset > end:
+                break  # partially written last record
+
+            version = buffer[record_start]
+            if version == TRACE_VERSION:
+                header = _HEADER
+                _, game_id, turn, player, die1, die2, valid, agent_latency, gnubg_latency, rate_limit_wait = \
+                    header.unpack_from(buffer, record_start)
+            elif version == 1:
+                header = _HEADER_V1
+                _, game_id, turn, player, die1, die2, valid, agent_latency, gnubg_latency = header.unpack_from(buffer, record_start)
+                rate_limit_wait = 0.0
+            else:
+                raise ValueError(f"Unsupported trace version {version} in {trace_file}")
+            position_id, position = _read_str(buffer, record_start + header.size)
+            move, position = _read_str(buffer, position)
+
+            candidate_moves = None
+            if candidates:
+                (count,) = _COUNT.unpack_from(buffer, position)
+                position += _COUNT.size
+                candidate_moves = []
+                for _ in range(count):
+                    (equity,) = _EQUITY.unpack_from(buffer, position)
+                    candidate_move, position = _read_str(buffer, position + _EQUITY.size)
+                    candidate_moves.append((candidate_move, equity))
+
+            yield TurnRecord(game_id, turn, player, (die1, die2), bool(valid), agent_latency, gnubg_latency,
+                             rate_limit_wait, position_id, move or None, candidate_moves)
+
+
+def summarize_trace(trace_file: str) -> dict:
+    """Count turns, games and invalid moves and average the latencies per player."""
+    games = set()
+    turns = [0, 0]
+    invalid = [0, 0]
+    agent_latency = [0.0, 0.0]
+    rate_limit_wait = [0.0, 0.0]
+    gnubg_latency = 0.0
+    for record in iter_trace(trace_file, candidates=False):
+        games.add(record.game_id)
+        turns[record.player] += 1
+        invalid[record.player] += not record.valid
+        agent_latency[record.player] += record.agent_latency
+        rate_limit_wait[record.player] += record.rate_limit_wait
+        gnubg_latency += record.gnubg_latency
+
+    total_turns = sum(turns)
+    return {
+        "games": len(games),
+        "turns": total_turns,
+        "invalid_moves": invalid,
+        "avg_agent_latency": [agent_latency[p] / turns[p] if turns[p] else 0 for p in (0, 1)],
+        "avg_rate_limit_wait": [rate_limit_wait[p] / turns[p] if turns[p] else 0 for p in (0, 1)],
+        "avg_gnubg_latency": gnubg_latency / total_turns if total_turns else 0,
+    }
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Usage: python -m src.trace <trace file>")
+        sys.exit(1)
+    for key, value in summarize_trace(sys.argv[1]).items():
+        print(f"{key}: {value}")
@@ -1,5 +1,7 @@
 from .gnubg_utils import *
 from .llm_utils import *
+from .llm_client import *
+from .llm_backends import *
 from .game_utils import *
 
 __all__ = [
@@ -7,16 +9,37 @@ __all__ = [
     "reverse_board",
     "get_simple_board",
     "get_board",
+    "get_position_id",
     "default_board_representation",
     "move_piece",
     "get_possible_moves",
     "get_hints",
     "get_best_move",
+    "get_hint_equities",
+    "TOP_HINTS",
     "random_valid_move",
     "is_cube_decision",
     "handle_cube_decision",
     "roll_dice",
+    "set_dice_seed",
+    "set_position",
+    "get_gnubg_id",
+    "set_gnubg_id",
+    "disable_new_game_confirmation",
+    "save_match",
+    "load_match",
+    "set_cassette",
+    "set_llm_cache",
+    "llm_cache_metrics",
+    "get_llm_client",
+    "llm_client_metrics",
+    "track_rate_limit_wait",
+    "set_async_concurrency",
+    "llm_coalescer_metrics",
+    "llm_backend_metrics",
     "is_valid_move",
+    "normalize_move",
+    "score_move",
     "map_winner",
     "get_pip_count",
     "get_checkers_count",
@@ -1,5 +1,7 @@
 import re
+from typing import List, Optional, Tuple
 
+from ..interfaces import Hint
 from ..logger import logger
 
 
@@ -23,7 +25,7 @@ def is_valid_move(move: str) -> bool:
         
         # Break down the move into segments separated by '/'
         if not _validate_complex_move(single_move):
-            logger.warning(f"Invalid move format: '{single_move}' in move '{move}'")
+            logger.warning("Invalid move format: '%s' in move '%s'", single_move, move)
             return False
     
     return True
@@ -96,17 +98,44 @@ def _validate_move_segment(segment: str, is_last: bool = True) -> bool:
     
     return True
 
+def normalize_move(move: str) -> str:
+    """Normalize a move string so equivalent notations compare equal.
+        Drops hit marks, expands "8/5(2)" to "8/5 8/5" and sorts the parts,
+        so "13/9 24/22*" and "24/22 13/9" are the same move.
+    """
+    if not move or not isinstance(move, str):
+        return ""
+    parts = []
+    for single_move in move.lower().replace('*', '').split():
+        match = re.match(r'^(.*)\((\d+)\)$', single_move)
+        if match:
+            parts.extend([match.group(1)] * int(match.group(2)))
+        else:
+            parts.append(single_move)
+    return " ".join(sorted(parts))
+
+def score_move(move: Optional[str], equities: List[Hint]) -> Tuple[float, bool]:
+    """Return (equity loss, valid) of a move against gnubg's evaluation of all legal moves, best first.
+        A move that is not legal scores as the worst legal move.
+    """
+    best_equity = equities[0]["equity"]
+    move_equities = {normalize_move(h["move"]): h["equity"] for h in equities}
+    chosen_equity = move_equities.get(normalize_move(move))
+    if chosen_equity is None:
+        return best_equity - equities[-1]["equity"], False
+    return best_equity - chosen_equity, True
+
 def map_winner(game_result):
     """Map the game result to a winner.
         0 is always associated with X which is agent1
         1 is always associated with O which is agent2
     """
     if game_result == 'X':
-        logger.debug(f"Game ended with agent1 winning.")
+        logger.debug("Game ended with agent1 winning.")
         return 0
     elif game_result == 'O':
-        logger.debug(f"Game ended with agent2 winning.")
+        logger.debug("Game ended with agent2 winning.")
         return 1
     else:
-        logger.warning(f"Unknown game result: {game_result}")
+        logger.warning("Unknown game result: %s", game_result)
         return "Unknown"
\ No newline at end of file
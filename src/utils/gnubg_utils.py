@@ -36,6 +36,13 @@ def get_simple_board() -> Tuple[Tuple[int, ...], Tuple[int, ...]]:
     """
     return gnubg.board()
 
+def get_position_id() -> str:
+    """Get the gnubg position ID of the current board."""
+    try:
+        return gnubg.positionid()
+    except Exception:
+        return ""
+
 def get_board() -> Tuple[Tuple[int, ...], Tuple[int, ...]]:
     """Get the current board state, O is always on 0 and X always on 1."""
     board_tuple = get_simple_board()
@@ -80,10 +87,10 @@ def move_piece(curr_player: Agent, move: Optional[str] = None) -> bool:
                 gnubg.command(f"move {current_move}")
                 return True
             else:
-                logger.warning(f"Invalid move format: '{current_move}' (attempt {attempt + 1})")
+                logger.warning("Invalid move format: '%s' (attempt %s)", current_move, attempt + 1)
                 current_move = curr_player.handle_invalid_move(current_move)
         except Exception as e:
-            logger.warning(f"Error at move_piece '{current_move}': {e} (attempt {attempt + 1})")
+            logger.warning("Error at move_piece '%s': %s (attempt %s)", current_move, e, attempt + 1)
             try:
                 current_move = curr_player.handle_invalid_move(current_move)
             except Exception as agent_error:
@@ -97,7 +104,12 @@ def move_piece(curr_player: Agent, move: Optional[str] = None) -> bool:
     return False
 
 
-def get_possible_moves() -> List[str]:
+def get_possible_moves(equities: Optional[List[Hint]] = None) -> List[str]:
+    """Legal moves in random order. Pass the result of get_hint_equities to reuse its gnubg evaluation."""
+    if equities is not None:
+        moves = [m["move"] for m in equities]
+        random.shuffle(moves)
+        return moves
     try:
         hints = gnubg.hint()
         hint_moves = hints.get("hint", [])
@@ -111,8 +123,11 @@ def get_possible_moves() -> List[str]:
     except Exception:
         return []
         
+# Number of hints given to agents
+TOP_HINTS = 10
+
 def get_hints() -> List[Hint]:
-    top_hints = 10
+    top_hints = TOP_HINTS
     try:
         hints = gnubg.hint()
         hint_moves = hints.get("hint", [])
@@ -126,6 +141,16 @@ def get_hints() -> List[Hint]:
     except Exception:
         return []
     
+def get_hint_equities() -> List[Hint]:
+    """Get every legal move with its gnubg equity, best move first."""
+    try:
+        hints = gnubg.hint()
+        hint_moves = hints.get("hint", [])
+        moves = [{"move": m["move"], "equity": m.get("equity", 0)} for m in hint_moves]
+        return sorted(moves, key=lambda x: x["equity"], reverse=True)
+    except Exception:
+        return []
+
 def get_best_move() -> str:
     try:
         hints = gnubg.hint()
@@ -178,6 +203,41 @@ def handle_cube_decision() -> bool:
         except:
             return False
 
+def set_position(position_id: str, turn: int = 0, dice: Optional[Tuple[int, int]] = None):
+    """Set up the board from a gnubg position ID with the given player on roll.
+        The position ID is read from the perspective of the player on roll.
+    """
+    gnubg.command(f"set turn {turn}")
+    gnubg.command(f"set board {position_id}")
+    if dice:
+        gnubg.command(f"set dice {dice[0]}{dice[1]}")
+
+def get_gnubg_id() -> str:
+    """Position and match ID of the current game (board, dice, turn, cube and score)."""
+    return f"{gnubg.positionid()}:{gnubg.matchid()}"
+
+def set_gnubg_id(gnubg_id: str):
+    """Restore a game state saved with get_gnubg_id."""
+    gnubg.command(f"set gnubgid {gnubg_id}")
+
+def disable_new_game_confirmation():
+    """Let "new game" discard a game in progress without asking, needed when games share the process."""
+    gnubg.command("set confirm new off")
+
+def save_match(file_path: str):
+    """Save the current match in gnubg's native SGF format."""
+    gnubg.command(f'save match "{file_path}"')
+
+def load_match(file_path: str):
+    """Load a match saved with save_match."""
+    gnubg.command(f'load match "{file_path}"')
+
+def set_dice_seed(seed: int):
+    """Seed gnubg's dice and Python's random module (move shuffling, random agents), so a game can be replayed."""
+    gnubg.command("set rng mersenne")
+    gnubg.command(f"set seed {seed}")
+    random.seed(seed)
+
 def roll_dice():
     """Roll the dice using gnubg."""
     try:
@@ -252,6 +312,8 @@ def create_player_statistics(agent_name: str) -> PlayerStatistics:
         pip_count=0,
         cube_decisions=0,
         cube_accepts=0,
-        cube_rejects=0
+        cube_rejects=0,
+        equity_analysis={},
+        llm_routes=None
     )
 
@@ -0,0 +1,216 @@
+"""
+Pool of LLM backends with load balancing and failover.
+
+Without a pool every call goes to LLM_API_URL. LLM_BACKENDS lists several
+OpenAI-compatible endpoints instead, as a JSON file or an inline JSON list:
+    [{"name": "east", "url": "https://east.example.com/v1/chat/completions",
+      "model": "gpt-4o", "api_key_env": "EAST_KEY", "weight": 2,
+      "health_url": "https://east.example.com/health"}, ...]
+"api_key" can be given directly instead of "api_key_env", and "model",
+"weight" (default 1) and "health_url" are optional. Requests for LLM_MODEL
+get the backend's model instead, so the backends should serve equivalent
+models; other models (the cheap model of llm_cascade.py) are sent as they are.
+
+Calls are spread over the backends by LLM_BALANCE:
+    least_outstanding  the backend with the fewest calls in flight per weight (default)
+    weighted           a random backend, in proportion to the weights
+A call that fails on one backend (after its retries) fails over to the next.
+After LLM_BREAKER_FAILURES consecutive failures a backend's circuit opens and
+it gets no calls for LLM_BREAKER_COOLDOWN seconds. Then a single trial call is
+let through (after its health_url answers, if it has one); it closes the
+circuit again or reopens it. Calls, failures, calls in flight, latency and
+circuit opens are kept per backend.
+
+Configured from the environment (.env):
+    LLM_BACKENDS          JSON file or JSON list of backends (default: none, LLM_API_URL is used)
+    LLM_BALANCE           least_outstanding or weighted (default least_outstanding)
+    LLM_BREAKER_FAILURES  consecutive failures that open a circuit (default 3)
+    LLM_BREAKER_COOLDOWN  seconds a circuit stays open (default 30)
+"""
+
+import json
+import os
+import random
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Set, TypeVar
+
+import requests
+
+from ..interfaces import LLMBackendMetrics
+from ..metrics import OnlineStats
+from ..logger import logger
+
+BALANCE_STRATEGIES = ("least_outstanding", "weighted")
+
+T = TypeVar("T")
+
+
+class Backend:
+    """One endpoint of the pool and its circuit breaker state."""
+
+    def __init__(self, name: str, url: str, model: Optional[str] = None, api_key: Optional[str] = None,
+                 weight: float = 1.0, health_url: Optional[str] = None):
+        self.name = name
+        self.url = url
+        self.model = model
+        self.api_key = api_key
+        self.weight = weight
+        self.health_url = health_url
+        self.state = "closed"  # closed, open or half_open
+        self.opened_at = 0.0
+        self.outstanding = 0
+        self.consecutive_failures = 0
+        self.calls = 0
+        self.failures = 0
+        self.circuit_opens = 0
+        self.latency = OnlineStats()
+
+    @classmethod
+    def from_config(cls, config: Dict, index: int) -> "Backend":
+        api_key = config.get("api_key")
+        if api_key is None and config.get("api_key_env"):
+            api_key = os.getenv(config["api_key_env"])
+        return cls(config.get("name") or f"backend_{index}", config["url"], model=config.get("model"),
+                   api_key=api_key, weight=float(config.get("weight", 1.0)), health_url=config.get("health_url"))
+
+
+class BackendPool:
+    """Balances calls over backends and fails over between them, see the module docstring."""
+
+    def __init__(self, backends: List[Backend], strategy: str = "least_outstanding", failure_threshold: int = 3,
+                 cooldown: float = 30.0):
+        if not backends:
+            raise ValueError("A backend pool needs at least one backend")
+        if strategy not in BALANCE_STRATEGIES:
+            raise ValueError(f"Unknown LLM_BALANCE strategy: {strategy}")
+        self.backends = backends
+        self.strategy = strategy
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> Optional["BackendPool"]:
+        """Pool configured from LLM_BACKENDS, None if it is not set."""
+        setting = os.getenv("LLM_BACKENDS", "").strip()
+        if not setting:
+            return None
+        if setting.startswith("["):
+            configs = json.loads(setting)
+        else:
+            with open(setting, 'r', encoding='utf-8') as f:
+                configs = json.load(f)
+        return cls([Backend.from_config(config, i) for i, config in enumerate(configs)],
+                   strategy=os.getenv("LLM_BALANCE", "least_outstanding"),
+                   failure_threshold=int(os.getenv("LLM_BREAKER_FAILURES", "3")),
+                   cooldown=float(os.getenv("LLM_BREAKER_COOLDOWN", "30")))
+
+    def _healthy(self, backend: Backend) -> bool:
+        if not backend.health_url:
+            return True
+        try:
+            return requests.get(backend.health_url, timeout=5).status_code == 200
+        except requests.RequestException:
+            return False
+
+    def acquire(self, exclude: Set[str]) -> Optional[Backend]:
+        """Pick a backend for a call and count it as outstanding, None if every circuit is open."""
+        while True:
+            with self._lock:
+                now = time.time()
+                closed = [b for b in self.backends if b.name not in exclude and b.state == "closed"]
+                trial = next((b for b in self.backends if b.name not in exclude and b.state == "open"
+                              and now - b.opened_at >= self.cooldown), None)
+                if trial is not None:
+                    # One trial call at a time, the others keep using closed circuits
+                    trial.state = "half_open"
+                elif not closed:
+                    return None
+                else:
+                    if self.strategy == "weighted":
+                        backend = random.choices(closed, weights=[b.weight for b in closed])[0]
+                    else:
+                        fewest = min(b.outstanding / b.weight for b in closed)
+                        backend = random.choice([b for b in closed if b.outstanding / b.weight == fewest])
+                    backend.outstanding += 1
+                    return backend
+
+            if self._healthy(trial):
+                with self._lock:
+                    trial.outstanding += 1
+                logger.info("LLM backend %s: trying again after its circuit was open", trial.name)
+                return trial
+            with self._lock:
+                trial.state = "open"
+                trial.opened_at = time.time()
+            logger.warning("LLM backend %s failed its health check, circuit stays open", trial.name)
+
+    def release(self, backend: Backend, success: bool, latency: float):
+        """Record the outcome of a call and open or close the backend's circuit."""
+        with self._lock:
+            backend.outstanding -= 1
+            backend.calls += 1
+            if success:
+                backend.latency.add(latency)
+                backend.consecutive_failures = 0
+                if backend.state != "closed":
+                    logger.info("LLM backend %s recovered, circuit closed", backend.name)
+                backend.state = "closed"
+                return
+            backend.failures += 1
+            backend.consecutive_failures += 1
+            if backend.state == "half_open" or backend.consecutive_failures >= self.failure_threshold:
+                if backend.state != "open":
+                    backend.circuit_opens += 1
+                    logger.warning("LLM backend %s failed %s times in a row, circuit open for %.0fs",
+                                   backend.name, backend.consecutive_failures, self.cooldown)
+                backend.state = "open"
+                backend.opened_at = time.time()
+
+    def call(self, send: Callable[[Backend], Optional[T]]) -> Optional[T]:
+        """send(backend) on the balanced backend, failing over to the others. None if all failed."""
+        tried: Set[str] = set()
+        while True:
+            backend = self.acquire(tried)
+            if backend is None:
+                if not tried:
+                    logger.error("All LLM backend circuits are open")
+                return None
+            tried.add(backend.name)
+            start = time.time()
+            result = None
+            try:
+                result = send(backend)
+            finally:
+                self.release(backend, result is not None, time.time() - start)
+            if result is not None:
+                return result
+            logger.warning("LLM backend %s failed, failing over", backend.name)
+
+    def metrics(self) -> Dict[str, LLMBackendMetrics]:
+        with self._lock:
+            return {b.name: LLMBackendMetrics(calls=b.calls, failures=b.failures, outstanding=b.outstanding,
+                                              mean_latency=b.latency.mean, max_latency=b.latency.max or 0.0,
+                                              circuit_opens=b.circuit_opens, state=b.state)
+                    for b in self.backends}
+
+
+_pool: Optional[BackendPool] = None
+_pool_loaded = False
+_pool_lock = threading.Lock()
+
+
+def get_backend_pool() -> Optional[BackendPool]:
+    """The process-wide backend pool, created from LLM_BACKENDS on first use. None without LLM_BACKENDS."""
+    global _pool, _pool_loaded
+    with _pool_lock:
+        if not _pool_loaded:
+            _pool = BackendPool.from_env()
+            _pool_loaded = True
+        return _pool
+
+
+def llm_backend_metrics() -> Optional[Dict[str, LLMBackendMetrics]]:
+    """Per-backend metrics of the process-wide pool, None if it was not used."""
+    return _pool.metrics() if _pool is not None else None
@@ -0,0 +1,93 @@
+"""
+Cost-aware model cascade for LLMAgent.
+
+Many positions are forced or obvious, and gnubg's evaluation shows it: the
+best move is far ahead of the second best. The cascade routes every move by
+that equity gap, so the expensive model (LLM_MODEL) only sees the difficult
+positions:
+    forced     one legal move, played without asking
+    rule       gap of at least LLM_CASCADE_RULE_GAP, gnubg's best move is played without asking
+    cheap      gap of at least LLM_CASCADE_HARD_GAP, asked to LLM_CASCADE_CHEAP_MODEL
+    escalated  cheap route whose answer was not a legal move, asked again to the expensive model
+    expensive  every other position, asked to the expensive model
+Without a cheap model the cheap positions go to the expensive model too.
+
+Moves, latency and equity loss are kept per route, so cost and playing
+strength can be traded off on measured numbers. The routing needs gnubg's
+equities of all legal moves, which the game passes to agents with
+needs_equities; they are never shown to the model.
+
+Configured from the environment (.env), off unless a cheap model or a rule gap is set:
+    LLM_CASCADE_CHEAP_MODEL  model of the easy positions (default: none)
+    LLM_CASCADE_RULE_GAP     equity gap at which gnubg's best move is played (default 0, off)
+    LLM_CASCADE_HARD_GAP     positions with a smaller gap go to the expensive model (default 0.04)
+"""
+
+import os
+import threading
+from typing import Dict, List, Optional
+
+from ..interfaces import Hint, LLMRouteMetrics
+from ..metrics import OnlineStats
+
+ROUTES = ("forced", "rule", "cheap", "escalated", "expensive")
+
+
+def equity_gap(equities: List[Hint]) -> float:
+    """Equity of the best move minus the second best, infinite for forced moves."""
+    if len(equities) <= 1:
+        return float("inf")
+    return equities[0]["equity"] - equities[1]["equity"]
+
+
+class ModelCascade:
+    """Routes moves by difficulty and keeps per-route metrics, see the module docstring."""
+
+    def __init__(self, cheap_model: Optional[str] = None, rule_gap: float = 0.0, hard_gap: float = 0.04):
+        self.cheap_model = cheap_model
+        self.rule_gap = rule_gap
+        self.hard_gap = hard_gap
+        self._lock = threading.Lock()
+        self._latency = {route: OnlineStats() for route in ROUTES}
+        self._equity_loss = {route: 0.0 for route in ROUTES}
+        self._invalid = {route: 0 for route in ROUTES}
+
+    @classmethod
+    def from_env(cls) -> Optional["ModelCascade"]:
+        """Cascade configured from the environment, None if it is off."""
+        cheap_model = os.getenv("LLM_CASCADE_CHEAP_MODEL") or None
+        rule_gap = float(os.getenv("LLM_CASCADE_RULE_GAP", "0"))
+        if cheap_model is None and rule_gap <= 0:
+            return None
+        return cls(cheap_model, rule_gap=rule_gap, hard_gap=float(os.getenv("LLM_CASCADE_HARD_GAP", "0.04")))
+
+    def route(self, equities: List[Hint]) -> str:
+        """Route of a position from gnubg's equities of all legal moves, best first."""
+        if len(equities) <= 1:
+            return "forced"
+        gap = equity_gap(equities)
+        if self.rule_gap > 0 and gap >= self.rule_gap:
+            return "rule"
+        if self.cheap_model and gap >= self.hard_gap:
+            return "cheap"
+        return "expensive"
+
+    def model(self, route: str) -> Optional[str]:
+        """Model asked on a route, None for the default model (LLM_MODEL)."""
+        return self.cheap_model if route == "cheap" else None
+
+    def record(self, route: str, latency: float, equity_loss: float, valid: bool):
+        with self._lock:
+            self._latency[route].add(latency)
+            self._equity_loss[route] += equity_loss
+            self._invalid[route] += 0 if valid else 1
+
+    def metrics(self) -> Dict[str, LLMRouteMetrics]:
+        """Metrics of the routes that played at least one move."""
+        with self._lock:
+            return {route: LLMRouteMetrics(moves=self._latency[route].count,
+                                           latency=self._latency[route].mean * self._latency[route].count,
+                                           max_latency=self._latency[route].max or 0.0,
+                                           equity_loss=self._equity_loss[route],
+                                           invalid=self._invalid[route])
+                    for route in ROUTES if self._latency[route].count}
@@ -0,0 +1,263 @@
+"""
+Process-wide pooled HTTP client for LLM API calls.
+
+One requests.Session per game process keeps connections alive between the
+turns of a game (and between the concurrent calls of a position suite), so
+only the first call pays for the TCP and TLS handshake. Every request has a
+connect and a read timeout. 429 and 5xx responses, timeouts and connection
+errors are retried with full-jitter exponential backoff; a Retry-After header
+is honoured when it asks for a longer wait. After the last attempt the call
+returns None, as call_openai_api always did for failed calls. With a rate
+limit configured every attempt first waits for the shared rate limiter, see
+rate_limiter.py; every endpoint and API key has its own limiter. Slow calls can be hedged with a duplicate request, see
+llm_hedge.py. The rate limiter wait of the calls made for one move is added up with
+track_rate_limit_wait(), the game records it in the trace.
+
+Configured from the environment (.env):
+    LLM_CONNECT_TIMEOUT  seconds to establish a connection (default 10)
+    LLM_READ_TIMEOUT     seconds to wait for the response (default 120)
+    LLM_MAX_RETRIES      retries after the first attempt (default 4)
+    LLM_BACKOFF_BASE     first backoff in seconds, doubled per retry (default 1)
+    LLM_BACKOFF_MAX      longest backoff or Retry-After wait in seconds (default 60)
+    LLM_POOL_SIZE        connections kept per host (default 16)
+"""
+
+import email.utils
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from ..interfaces import LLMClientMetrics
+from ..metrics import OnlineStats
+from ..logger import logger
+from .rate_limiter import SharedRateLimiter, estimate_cost, used_tokens
+from .llm_hedge import RequestHedger
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+# Rate limiter waits of a call are added to every cell of its context, one cell per tracked move
+_wait_cells: ContextVar[Tuple[List[float], ...]] = ContextVar("llm_rate_limit_wait_cells", default=())
+
+
+@contextmanager
+def track_rate_limit_wait(cells: Iterable[List[float]] = ()) -> Iterator[List[float]]:
+    """Add up the rate limiter waits of the LLM calls made in the block in the yielded one-element list.
+        Threads started with asyncio.to_thread inherit the tracking. cells are further cells to add the
+        waits to, those of the requests a coalesced batch answers.
+    """
+    cell = [0.0]
+    token = _wait_cells.set(_wait_cells.get() + tuple(cells) + (cell,))
+    try:
+        yield cell
+    finally:
+        _wait_cells.reset(token)
+
+
+def rate_limit_wait_cells() -> Tuple[List[float], ...]:
+    """Cells the rate limiter waits of calls in the current context are added to."""
+    return _wait_cells.get()
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (delta seconds or an HTTP date), None if missing or invalid."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class LLMClient:
+    """Pooled keep-alive HTTP client with timeouts, retries and metrics, see the module docstring."""
+
+    def __init__(self, connect_timeout: float = 10.0, read_timeout: float = 120.0, max_retries: int = 4,
+                 backoff_base: float = 1.0, backoff_max: float = 60.0, pool_size: int = 16,
+                 hedger: Optional[RequestHedger] = None):
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.session = requests.Session()
+        self.adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.session.mount("https://", self.adapter)
+        self.session.mount("http://", self.adapter)
+        self.hedger = hedger
+        # Shared rate limiter per endpoint and API key, None without rate limits
+        self._rate_limiters: Dict[Tuple[str, str], Optional[SharedRateLimiter]] = {}
+
+        self._lock = threading.Lock()
+        self._latency = OnlineStats()
+        self._rate_limit_wait = OnlineStats()
+        self._counts = {"calls": 0, "attempts": 0, "retries": 0, "failures": 0, "timeouts": 0, "rate_limited": 0,
+                        "streams": 0, "early_stops": 0}
+        self._status_counts: Dict[str, int] = {}
+        self._backoff_seconds = 0.0
+
+    @classmethod
+    def from_env(cls) -> "LLMClient":
+        return cls(connect_timeout=float(os.getenv("LLM_CONNECT_TIMEOUT", "10")),
+                   read_timeout=float(os.getenv("LLM_READ_TIMEOUT", "120")),
+                   max_retries=int(os.getenv("LLM_MAX_RETRIES", "4")),
+                   backoff_base=float(os.getenv("LLM_BACKOFF_BASE", "1")),
+                   backoff_max=float(os.getenv("LLM_BACKOFF_MAX", "60")),
+                   pool_size=int(os.getenv("LLM_POOL_SIZE", "16")),
+                   hedger=RequestHedger.from_env(int(os.getenv("LLM_POOL_SIZE", "16"))))
+
+    def _count(self, name: str, amount=1):
+        with self._lock:
+            self._counts[name] += amount
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Full-jitter exponential backoff before retry number attempt (0-based), at least Retry-After."""
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.backoff_max))
+        return delay
+
+    def post_json(self, url: str, headers: Dict[str, str], payload: Dict, hedge: bool = False) -> Optional[Dict]:
+        """POST a JSON payload and return the decoded JSON response, None once all attempts failed.
+            With hedge and LLM_HEDGE_PERCENTILE a slow call is duplicated.
+        """
+        if hedge and self.hedger:
+            return self.hedger.call(lambda target: self._post_json(target, headers, payload), url)
+        return self._post_json(url, headers, payload)
+
+    def _post_json(self, url: str, headers: Dict[str, str], payload: Dict) -> Optional[Dict]:
+        response = self._post(url, headers, payload)
+        if response is None:
+            return None
+        result = response.json()
+        usage = used_tokens(result)
+        rate_limiter = self._rate_limiter(url, headers)
+        if rate_limiter and usage:
+            rate_limiter.settle(estimate_cost(payload, rate_limiter.completion_tokens)[1], usage)
+        return result
+
+    def post_stream(self, url: str, headers: Dict[str, str], payload: Dict) -> Optional[requests.Response]:
+        """POST a JSON payload and return the 200 response with its body still unread, None once all attempts
+            failed. Only failures before the body are retried, the caller reads and closes the response.
+        """
+        self._count("streams")
+        return self._post(url, headers, payload, stream=True)
+
+    def record_early_stop(self):
+        """Count a streamed response that was closed before it was complete."""
+        self._count("early_stops")
+
+    def _rate_limiter(self, url: str, headers: Dict[str, str]) -> Optional[SharedRateLimiter]:
+        authorization = headers.get("Authorization", "")
+        with self._lock:
+            if (url, authorization) not in self._rate_limiters:
+                api_key = authorization[len("Bearer "):] if authorization.startswith("Bearer ") else authorization
+                self._rate_limiters[(url, authorization)] = SharedRateLimiter.from_env(url, api_key)
+            return self._rate_limiters[(url, authorization)]
+
+    def _post(self, url: str, headers: Dict[str, str], payload: Dict, stream: bool = False) -> Optional[requests.Response]:
+        self._count("calls")
+        rate_limiter = self._rate_limiter(url, headers)
+        requests_cost, tokens = estimate_cost(payload, rate_limiter.completion_tokens) if rate_limiter else (1, 0)
+        waited = 0.0
+        for attempt in range(self.max_retries + 1):
+            if rate_limiter:
+                waited += rate_limiter.acquire(tokens, requests_cost)
+            self._count("attempts")
+            retry_after = None
+            start = time.time()
+            try:
+                response = self.session.post(url, headers=headers, json=payload, timeout=self.timeout, stream=stream)
+            except requests.Timeout as e:
+                self._count("timeouts")
+                error = f"timeout: {e}"
+            except requests.ConnectionError as e:
+                error = f"connection error: {e}"
+            else:
+                with self._lock:
+                    self._latency.add(time.time() - start)
+                    status = str(response.status_code)
+                    self._status_counts[status] = self._status_counts.get(status, 0) + 1
+                if rate_limiter:
+                    rate_limiter.observe(response.status_code, response.headers,
+                                         parse_retry_after(response.headers.get("Retry-After")))
+                if response.status_code == 200:
+                    self._record_wait(rate_limiter, waited)
+                    return response
+                error = f"status {response.status_code}: {response.text[:500]}"
+                if response.status_code not in RETRY_STATUSES:
+                    logger.error(f"LLM API call failed with {error}")
+                    self._count("failures")
+                    self._record_wait(rate_limiter, waited)
+                    return None
+                if response.status_code == 429:
+                    self._count("rate_limited")
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+
+            if attempt == self.max_retries:
+                logger.error(f"LLM API call failed after {attempt + 1} attempts, last error: {error}")
+                break
+            delay = self.backoff(attempt, retry_after)
+            logger.warning("LLM API attempt %s failed (%s), retrying in %.1fs", attempt + 1, error, delay)
+            with self._lock:
+                self._counts["retries"] += 1
+                self._backoff_seconds += delay
+            time.sleep(delay)
+        self._count("failures")
+        self._record_wait(rate_limiter, waited)
+        return None
+
+    def _record_wait(self, rate_limiter: Optional[SharedRateLimiter], waited: float):
+        """Time a call spent waiting for the shared rate limiter."""
+        if rate_limiter:
+            with self._lock:
+                self._rate_limit_wait.add(waited)
+            for cell in _wait_cells.get():
+                cell[0] += waited
+
+    def metrics(self) -> LLMClientMetrics:
+        """Call, retry and connection pool counters of this process."""
+        # urllib3 counts the connections it opened and the requests it sent per host pool
+        pools = [self.adapter.poolmanager.pools[key] for key in self.adapter.poolmanager.pools.keys()]
+        with self._lock:
+            return LLMClientMetrics(
+                **self._counts,
+                status_counts=dict(self._status_counts),
+                backoff_seconds=self._backoff_seconds,
+                mean_latency=self._latency.mean,
+                max_latency=self._latency.max or 0.0,
+                connections_opened=sum(getattr(pool, "num_connections", 0) for pool in pools),
+                requests_sent=sum(getattr(pool, "num_requests", 0) for pool in pools),
+                rate_limit_wait_seconds=self._rate_limit_wait.mean * self._rate_limit_wait.count,
+                mean_rate_limit_wait=self._rate_limit_wait.mean,
+                max_rate_limit_wait=self._rate_limit_wait.max or 0.0,
+                **(self.hedger.metrics() if self.hedger else
+                   {"hedged": 0, "hedge_wins": 0, "hedges_over_budget": 0, "hedge_delay": None}),
+            )
+
+
+_client: Optional[LLMClient] = None
+_client_lock = threading.Lock()
+
+
+def get_llm_client() -> LLMClient:
+    """The process-wide LLM client, created from the environment on first use."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = LLMClient.from_env()
+        return _client
+
+
+def llm_client_metrics() -> Optional[LLMClientMetrics]:
+    """Metrics of the process-wide client, None if no LLM call was made."""
+    return _client.metrics() if _client is not None else None
@@ -0,0 +1,120 @@
+"""
+Coalescing of concurrent LLM requests into batched calls.
+
+When several games share a process (main.py --games_per_process) their agents
+often ask for a move at nearly the same time. The coalescer holds every request
+for at most LLM_COALESCE_WINDOW_MS and sends the collected requests together:
+    - as one batched call to LLM_BATCH_URL if it is set. The batch endpoint takes
+      {"requests": [<chat request>, ...]} and answers {"responses": [<chat response
+      or null>, ...]} in the same order
+    - otherwise, or if the batched call fails, as a burst of concurrent requests
+      over the pooled keep-alive connections
+Every response is handed back to the game that asked for it, and the rate
+limiter wait of the call that answered it is added to that game's move.
+
+Configured from the environment (.env):
+    LLM_COALESCE_WINDOW_MS  collection window, 0 turns coalescing off (default 0)
+    LLM_BATCH_URL           batch endpoint (default: none, requests go out as bursts)
+    LLM_BATCH_MAX           requests per batch, a full batch is sent at once (default 16)
+"""
+
+import asyncio
+import contextvars
+import os
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from ..interfaces import LLMCoalescerMetrics
+from ..logger import logger
+from .llm_client import rate_limit_wait_cells, track_rate_limit_wait
+
+
+class LLMCoalescer:
+    """Collects the requests of concurrent games on one event loop, see the module docstring.
+        send_one posts one request, send_batch a list of requests and returns the responses
+        in order or None if the batched call failed. Both block and run in worker threads.
+    """
+
+    def __init__(self, send_one: Callable[[Dict], Optional[Dict]],
+                 send_batch: Optional[Callable[[List[Dict]], Optional[List[Optional[Dict]]]]] = None,
+                 window: float = 0.005, max_batch: int = 16):
+        self.send_one = send_one
+        self.send_batch = send_batch
+        self.window = window
+        self.max_batch = max_batch
+        # (request, future, rate limiter wait cells of the move that asked)
+        self._pending: List[Tuple[Dict, asyncio.Future, Tuple[List[float], ...]]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+        self._counts = {"requests": 0, "flushes": 0, "batches": 0, "batched_requests": 0, "batch_failures": 0,
+                        "largest_flush": 0}
+
+    @classmethod
+    def from_env(cls, send_one, send_batch) -> Optional["LLMCoalescer"]:
+        """Coalescer configured from the environment, None if coalescing is off."""
+        window = float(os.getenv("LLM_COALESCE_WINDOW_MS", "0")) / 1000
+        if window <= 0:
+            return None
+        return cls(send_one, send_batch if os.getenv("LLM_BATCH_URL") else None, window,
+                   int(os.getenv("LLM_BATCH_MAX", "16")))
+
+    async def submit(self, request: Dict) -> Optional[Dict]:
+        """Queue a request and wait for its response."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((request, future, rate_limit_wait_cells()))
+        self._counts["requests"] += 1
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        self._counts["flushes"] += 1
+        self._counts["largest_flush"] = max(self._counts["largest_flush"], len(batch))
+        task = asyncio.get_running_loop().create_task(self._send(batch))
+        # The loop only keeps weak references to tasks
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _send_tracked(self, send: Callable, argument, cells: Tuple[List[float], ...]):
+        """send(argument) in a fresh context whose rate limiter waits go to cells, not to the flushing game."""
+        def run():
+            with track_rate_limit_wait(cells):
+                return send(argument)
+        return contextvars.Context().run(run)
+
+    async def _send(self, batch: List[Tuple[Dict, asyncio.Future, Tuple[List[float], ...]]]):
+        requests = [request for request, _, _ in batch]
+        try:
+            responses = None
+            if self.send_batch and len(batch) > 1:
+                # Every game of the batch waited for its rate limiter wait
+                responses = await asyncio.to_thread(self._send_tracked, self.send_batch, requests,
+                                                    tuple(cell for _, _, cells in batch for cell in cells))
+                if responses is None:
+                    self._counts["batch_failures"] += 1
+                    logger.warning("Batched LLM call of %s requests failed, sending them one by one", len(batch))
+                else:
+                    self._counts["batches"] += 1
+                    self._counts["batched_requests"] += len(batch)
+            if responses is None:
+                responses = await asyncio.gather(*(asyncio.to_thread(self._send_tracked, self.send_one, request, cells)
+                                                   for request, _, cells in batch))
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future, _), response in zip(batch, responses):
+            if not future.done():
+                future.set_result(response)
+
+    def metrics(self) -> LLMCoalescerMetrics:
+        return LLMCoalescerMetrics(**self._counts)
@@ -0,0 +1,115 @@
+"""
+Hedged LLM requests.
+
+A few LLM calls per game take many times the median latency and dominate the
+game duration. With hedging, a call that has no response after the
+LLM_HEDGE_PERCENTILE latency of recent calls is sent a second time, to
+LLM_HEDGE_URL if set or to the same endpoint. The first successful response
+wins. The loser cannot be aborted once it is on the wire (requests has no
+cancellation), so it is left to finish in its worker thread and its response
+is discarded; a duplicate that has not started yet is cancelled.
+
+At most LLM_HEDGE_BUDGET of all calls are hedged, which caps the extra load,
+and no call is hedged before LLM_HEDGE_MIN_SAMPLES latencies are known.
+
+Configured from the environment (.env):
+    LLM_HEDGE_PERCENTILE   latency percentile that triggers the duplicate, 0 turns hedging off (default 0)
+    LLM_HEDGE_URL          endpoint of the duplicates (default: LLM_API_URL)
+    LLM_HEDGE_BUDGET       largest share of calls that are hedged (default 0.1)
+    LLM_HEDGE_MIN_SAMPLES  latencies needed before hedging starts (default 20)
+"""
+
+import contextvars
+import math
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Optional
+
+from ..logger import logger
+
+
+class RequestHedger:
+    """Sends a duplicate of slow calls, see the module docstring."""
+
+    def __init__(self, percentile: float = 95, budget: float = 0.1, min_samples: int = 20, window: int = 500,
+                 hedge_url: Optional[str] = None, workers: int = 32):
+        self.percentile = percentile
+        self.budget = budget
+        self.min_samples = min_samples
+        self.hedge_url = hedge_url
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="llm-hedge")
+        self._counts = {"calls": 0, "hedged": 0, "hedge_wins": 0, "over_budget": 0}
+
+    @classmethod
+    def from_env(cls, workers: int = 32) -> Optional["RequestHedger"]:
+        """Hedger configured from the environment, None if hedging is off."""
+        percentile = float(os.getenv("LLM_HEDGE_PERCENTILE", "0"))
+        if percentile <= 0:
+            return None
+        return cls(percentile, budget=float(os.getenv("LLM_HEDGE_BUDGET", "0.1")),
+                   min_samples=int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20")),
+                   hedge_url=os.getenv("LLM_HEDGE_URL") or None, workers=2 * workers)
+
+    def hedge_delay(self) -> Optional[float]:
+        """Seconds after which a call is duplicated, None until enough latencies are known."""
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return None
+            latencies = sorted(self._latencies)
+        # Nearest-rank percentile
+        return latencies[min(len(latencies) - 1, max(0, math.ceil(self.percentile / 100 * len(latencies)) - 1))]
+
+    def _timed(self, send: Callable[[str], Optional[Dict]], url: str) -> Optional[Dict]:
+        start = time.time()
+        result = send(url)
+        if result is not None:
+            with self._lock:
+                self._latencies.append(time.time() - start)
+        return result
+
+    def _take_budget(self) -> bool:
+        with self._lock:
+            if self._counts["hedged"] + 1 > self.budget * self._counts["calls"]:
+                self._counts["over_budget"] += 1
+                return False
+            self._counts["hedged"] += 1
+            return True
+
+    def call(self, send: Callable[[str], Optional[Dict]], url: str) -> Optional[Dict]:
+        """send(url) with a duplicate to the hedge endpoint if it is slower than the hedge delay."""
+        with self._lock:
+            self._counts["calls"] += 1
+        delay = self.hedge_delay()
+        if delay is None:
+            return self._timed(send, url)
+
+        # The primary runs in the caller's context, its rate limiter wait counts for the caller's move
+        primary = self._executor.submit(contextvars.copy_context().run, self._timed, send, url)
+        done, _ = wait([primary], timeout=delay)
+        if done or not self._take_budget():
+            return primary.result()
+
+        logger.debug("LLM call slower than %.2fs (p%s), sending a hedged request", delay, self.percentile)
+        hedge = self._executor.submit(self._timed, send, self.hedge_url or url)
+        pending = {primary, hedge}
+        winner = None
+        while pending and winner is None:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            winner = next((future for future in done if future.result() is not None), None)
+        if winner is hedge:
+            with self._lock:
+                self._counts["hedge_wins"] += 1
+        for future in pending:
+            future.cancel()
+        return winner.result() if winner else None
+
+    def metrics(self) -> Dict:
+        delay = self.hedge_delay()
+        with self._lock:
+            return {"hedged": self._counts["hedged"], "hedge_wins": self._counts["hedge_wins"],
+                    "hedges_over_budget": self._counts["over_budget"], "hedge_delay": delay}
@@ -0,0 +1,112 @@
+"""
+Streamed (server-sent events) chat completions that end as soon as one field is parsed.
+
+LLMAgent only needs "best_move" out of the JSON answer it asks for, most of the
+completion is the "full_answer" prose. With LLM_STREAM set, call_openai_api
+requests a streamed completion and scans the text as it arrives. Once the
+field's JSON string is complete the move is returned:
+    stop  the response is closed, the model stops generating for this request
+    log   the rest is read in a background thread and logged at debug level
+A stream that ends without the field is returned as a regular response.
+
+Configured from the environment (.env):
+    LLM_STREAM  off, stop or log (default off)
+"""
+
+import json
+import os
+import re
+import threading
+from typing import Iterator, Optional
+
+import requests
+
+from ..logger import logger
+
+STREAM_MODES = ("off", "stop", "log")
+
+
+def stream_mode() -> str:
+    """LLM_STREAM setting, off for unknown values."""
+    mode = os.getenv("LLM_STREAM", "off").lower()
+    return mode if mode in STREAM_MODES else "off"
+
+
+def iter_sse_deltas(response: requests.Response) -> Iterator[str]:
+    """Text deltas of a streamed chat completion."""
+    for line in response.iter_lines(decode_unicode=True):
+        if not line or not line.startswith("data:"):
+            continue
+        data = line[len("data:"):].strip()
+        if data == "[DONE]":
+            return
+        for choice in json.loads(data).get("choices", []):
+            content = (choice.get("delta") or {}).get("content")
+            if content:
+                yield content
+
+
+class FieldScanner:
+    """Finds the first complete JSON string value of a field in text that arrives in pieces.
+        Only the unscanned tail is searched on every piece, so long streams are scanned in linear time.
+    """
+
+    def __init__(self, field: str):
+        self.field = field
+        self._parts = []
+        # Text from the last key of the field on, or a short tail that could still be the start of a split key
+        self._window = ""
+        self._key = f'"{field}"'
+        self._lookback = len(self._key) + 16  # the key and some whitespace around the colon
+        self._pattern = re.compile(r'"%s"\s*:\s*"((?:[^"\\]|\\.)*)"' % re.escape(field))
+
+    @property
+    def text(self) -> str:
+        """All text fed so far."""
+        return "".join(self._parts)
+
+    def feed(self, delta: str) -> Optional[str]:
+        """Add a piece of text, returns the field's value once it is complete."""
+        self._parts.append(delta)
+        self._window += delta
+        match = self._pattern.search(self._window)
+        if not match:
+            key = self._window.rfind(self._key)
+            self._window = self._window[key if key != -1 else max(0, len(self._window) - self._lookback):]
+            return None
+        try:
+            return json.loads(f'"{match.group(1)}"')
+        except ValueError:
+            return match.group(1)
+
+
+def read_until_field(response: requests.Response, field: str, mode: str):
+    """Read a streamed completion until field is complete.
+        Returns (value or None, text read so far). In log mode the rest of the stream
+        is read and logged in the background, otherwise the response is closed.
+    """
+    scanner = FieldScanner(field)
+    deltas = iter_sse_deltas(response)
+    value = None
+    try:
+        for delta in deltas:
+            value = scanner.feed(delta)
+            if value is not None:
+                break
+    except Exception:
+        response.close()
+        raise
+    if value is None or mode != "log":
+        response.close()
+        return value, scanner.text
+
+    def drain():
+        try:
+            rest = "".join(deltas)
+            logger.debug("Full streamed LLM response: %s", scanner.text + rest)
+        except (requests.RequestException, ValueError) as e:
+            logger.debug("Streamed LLM response ended early: %s", e)
+        finally:
+            response.close()
+    threading.Thread(target=drain, daemon=True).start()
+    return value, scanner.text
@@ -1,10 +1,17 @@
+import asyncio
 import os
-from typing import List,Dict, Any
+from typing import List,Dict, Any, Optional
 import re
 import json
-import requests
 from dotenv import load_dotenv
 
+from ..cassette import Cassette
+from ..interfaces import LLMCacheMetrics, LLMCoalescerMetrics
+from ..llm_cache import LLMCache
+from .llm_backends import Backend, get_backend_pool
+from .llm_client import get_llm_client
+from .llm_coalescer import LLMCoalescer
+from .llm_stream import stream_mode, read_until_field
 from ..logger import logger
 load_dotenv()
 
@@ -12,6 +19,26 @@ load_dotenv()
 LLM_API_URL = os.getenv("LLM_API_URL")
 LLM_API_KEY = os.getenv("LLM_API_KEY")
 
+# Optional cassette that records or replays the API responses of this game, see src/cassette.py
+_cassette: Optional[Cassette] = None
+
+def set_cassette(cassette: Optional[Cassette]):
+    """Record API responses to a cassette, or replay them from it without network access."""
+    global _cassette
+    _cassette = cassette
+
+# Optional response cache shared by the games using the same cache folder, see src/llm_cache.py
+_cache: Optional[LLMCache] = None
+
+def set_llm_cache(cache: Optional[LLMCache]):
+    """Answer identical requests from the response cache, None turns it off."""
+    global _cache
+    _cache = cache
+
+def llm_cache_metrics() -> Optional[LLMCacheMetrics]:
+    """Hit and miss counters of the response cache, None if it is off."""
+    return _cache.metrics() if _cache is not None else None
+
 def extract_response_from_llm(response, possible_moves=None, schema=None):
     """Extract the response from the LLM based on schema or fallback to move extraction"""
     try:
@@ -19,7 +46,7 @@ def extract_response_from_llm(response, possible_moves=None, schema=None):
             return None
 
         content = response["choices"][0]["message"]["content"]
-        logger.debug(f"LLM response: {content}")
+        logger.debug("LLM response: %s", content)
 
         # If schema is provided, try to parse as JSON first
         if schema:
@@ -47,13 +74,13 @@ def extract_with_schema(content: str, schema: Dict[str, Any], possible_moves=Non
             json_match = re.search(pattern, content, re.DOTALL)
             if json_match:
                 json_str = json_match.group(1)  # Get the captured group
-                logger.debug(f"Extracted JSON string: {json_str[:100]}...")
+                logger.debug("Extracted JSON string: %s...", json_str[:100])
                 try:
                     parsed_response = json.loads(json_str)
-                    logger.debug(f"Successfully parsed JSON: {parsed_response}")
+                    logger.debug("Successfully parsed JSON: %s", parsed_response)
                     break
                 except json.JSONDecodeError as e:
-                    logger.debug(f"Failed to parse JSON with pattern {pattern}: {e}")
+                    logger.debug("Failed to parse JSON with pattern %s: %s", pattern, e)
                     continue
         
         if parsed_response:
@@ -109,9 +136,34 @@ def extract_fields_from_text(content: str, schema: Dict, possible_moves=None) ->
     return result if result else None
 
 
+def _format_llm_prompt(board_repr: str, prompt: str, possible_moves: List, hints: List, best_move: str,
+                       schema: Dict[str, Any], **prompt_params) -> str:
+    prompt_params = {
+        "board_repr": board_repr,
+        "possible_moves": possible_moves,
+        "hints": hints,
+        "best_move": best_move,
+        "schema": json.dumps(schema, indent=2),
+        **prompt_params
+    }
+    return prompt.format(**prompt_params)
+
+
+def _extract_consulted_response(llm_response, possible_moves, schema):
+    # Extract response using schema or fallback to move extraction
+    result = extract_response_from_llm(llm_response, possible_moves, schema)
+
+    if result:
+        logger.debug("LLM response extracted: %s", result)
+        return result
+    logger.warning("LLM did not provide a valid response.")
+    return None
+
+
 def consult_llm(board_repr: str, prompt: str, system_prompt: str,
                 possible_moves: List = [], hints: List = [],
-                best_move: str = '', schema: Dict[str, Any] = None, **prompt_params):
+                best_move: str = '', schema: Dict[str, Any] = None, stream_until: str = None,
+                model: Optional[str] = None, **prompt_params):
     """Send game state to LLM and get response based on schema or move recommendation
     
     Args:
@@ -122,6 +174,8 @@ def consult_llm(board_repr: str, prompt: str, system_prompt: str,
         hints: List of hints
         best_move: Best move if known
         schema: Optional schema defining expected response format
+        stream_until: Optional schema field, with LLM_STREAM the response ends once it is parsed
+        model: Optional model of this request, LLM_MODEL by default
         **prompt_params: Additional parameters to inject into the prompt
     """
     try:
@@ -129,28 +183,33 @@ def consult_llm(board_repr: str, prompt: str, system_prompt: str,
             logger.error("Prompt is required for LLM consultation.")
             return None
 
-        prompt_params = {
-            "board_repr": board_repr,
-            "possible_moves": possible_moves,
-            "hints": hints,
-            "best_move": best_move,
-            "schema": json.dumps(schema, indent=2),
-            **prompt_params
-        }
-        
-        formatted_prompt = prompt.format(**prompt_params)
+        formatted_prompt = _format_llm_prompt(board_repr, prompt, possible_moves, hints, best_move, schema, **prompt_params)
+        llm_response = call_openai_api(formatted_prompt, system_prompt=system_prompt, stream_until=stream_until, model=model)
+        return _extract_consulted_response(llm_response, possible_moves, schema)
         
-        llm_response = call_openai_api(formatted_prompt, system_prompt=system_prompt)
-
-        # Extract response using schema or fallback to move extraction
-        result = extract_response_from_llm(llm_response, possible_moves, schema)
-
-        if result:
-            logger.debug(f"LLM response extracted: {result}")
-            return result
+    except Exception as e:
+        logger.error(f"Error consulting LLM: {e}")
+        import traceback
+        logger.error(traceback.format_exc())
         logger.warning("LLM did not provide a valid response.")
         return None
-        
+
+
+async def consult_llm_async(board_repr: str, prompt: str, system_prompt: str,
+                            possible_moves: List = [], hints: List = [],
+                            best_move: str = '', schema: Dict[str, Any] = None, stream_until: str = None,
+                            model: Optional[str] = None, **prompt_params):
+    """Awaitable consult_llm, the event loop keeps running other games while the request is in flight"""
+    try:
+        if not prompt:
+            logger.error("Prompt is required for LLM consultation.")
+            return None
+
+        formatted_prompt = _format_llm_prompt(board_repr, prompt, possible_moves, hints, best_move, schema, **prompt_params)
+        llm_response = await call_openai_api_async(formatted_prompt, system_prompt=system_prompt,
+                                                   stream_until=stream_until, model=model)
+        return _extract_consulted_response(llm_response, possible_moves, schema)
+
     except Exception as e:
         logger.error(f"Error consulting LLM: {e}")
         import traceback
@@ -159,42 +218,190 @@ def consult_llm(board_repr: str, prompt: str, system_prompt: str,
         return None
 
 
-def call_openai_api(prompt:str, system_prompt:str):
-    """Call the OpenAI API"""
-    try:
-        base_url = os.getenv("LLM_API_URL")
-        deployment = "gpt-4o"
-        api_key = os.getenv("LLM_API_KEY")
-        url = f"{base_url}"
-
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {api_key}",
-        }
-
-        data = {
-            "model": deployment,
-            "messages": [
-                {
-                    "role": "system",
-                    "content": system_prompt,
-                },
-                {"role": "user", "content": prompt},
-            ],
-            "max_tokens": 8000,
-        }
-
-        response = requests.post(url, headers=headers, json=data)
-        if response.status_code == 200:
-            result = response.json()
-            return result
-        else:
-            print(f"Status: {response.status_code}")
-            print(f"Error: {response.text}")
+def _default_model() -> str:
+    return os.getenv("LLM_MODEL", "gpt-4o")
+
+
+def _api_request(prompt: str, system_prompt: str, stream: bool = False, model: Optional[str] = None) -> Dict[str, Any]:
+    deployment = model or _default_model()
+    data = {
+        "model": deployment,
+        "messages": [
+            {
+                "role": "system",
+                "content": system_prompt,
+            },
+            {"role": "user", "content": prompt},
+        ],
+        "max_tokens": 8000,
+    }
+    if stream:
+        data["stream"] = True
+    return data
+
+
+def _api_headers(api_key: Optional[str] = None) -> Dict[str, str]:
+    api_key = api_key or os.getenv("LLM_API_KEY")
+    return {
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {api_key}",
+    }
+
+
+def _answer_offline(data: Dict[str, Any]):
+    """Answer a request from the cassette in replay mode or from the response cache.
+        Returns (answered, response).
+    """
+    if _cassette and _cassette.mode == "replay":
+        try:
+            return True, _cassette.replay(data)
+        except KeyError:
+            logger.error(f"No recorded LLM response for this request in {_cassette.path}, the replay diverged")
+            return True, None
+
+    result = _cache.get(data) if _cache else None
+    if result is not None:
+        if _cassette:
+            _cassette.record(data, result)
+        return True, result
+    return False, None
+
+
+def _backend_request(backend: Backend, data: Dict[str, Any]) -> Dict[str, Any]:
+    """The request with the backend's model in place of LLM_MODEL, other models (the cascade's) are sent as they are.
+        Cache and cassette keys keep the logical request.
+    """
+    return {**data, "model": backend.model} if backend.model and data["model"] == _default_model() else data
+
+
+def _post_api_request(data: Dict[str, Any]) -> Optional[Dict]:
+    """Pooled keep-alive client with timeouts and retries, None once every attempt failed.
+        With LLM_BACKENDS the call is balanced over the backends and fails over between them, see llm_backends.py
+    """
+    def send(url: str, api_key: Optional[str], request: Dict[str, Any]) -> Optional[Dict]:
+        try:
+            return get_llm_client().post_json(url, _api_headers(api_key), request, hedge=True)
+        except Exception as e:
+            logger.error(f"Error calling API {url}: {e}")
             return None
 
+    pool = get_backend_pool()
+    if pool is None:
+        return send(os.getenv("LLM_API_URL"), None, data)
+    return pool.call(lambda backend: send(backend.url, backend.api_key, _backend_request(backend, data)))
+
+
+def _post_api_batch(requests: List[Dict[str, Any]]) -> Optional[List[Optional[Dict]]]:
+    """Several requests in one call to the batch endpoint (LLM_BATCH_URL), see llm_coalescer.py"""
+    try:
+        response = get_llm_client().post_json(os.getenv("LLM_BATCH_URL"), _api_headers(), {"requests": requests})
     except Exception as e:
-        logger.error(f"Error calling API: {e}")
+        logger.error(f"Error calling batch API: {e}")
+        return None
+    responses = (response or {}).get("responses")
+    if not isinstance(responses, list) or len(responses) != len(requests):
+        logger.error("Batch API returned %s responses for %s requests",
+                     len(responses) if isinstance(responses, list) else "no", len(requests))
+        return None
+    return responses
+
+
+def _post_streamed_request(data: Dict[str, Any], stream_until: str) -> Optional[Dict]:
+    """Streamed completion that ends once the stream_until field is parsed, see llm_stream.py"""
+    client = get_llm_client()
+
+    def send(url: str, api_key: Optional[str], request: Dict[str, Any]):
+        try:
+            response = client.post_stream(url, _api_headers(api_key), request)
+            return read_until_field(response, stream_until, stream_mode()) if response is not None else None
+        except Exception as e:
+            logger.error(f"Error streaming API response from {url}: {e}")
+            return None
+
+    pool = get_backend_pool()
+    if pool is None:
+        streamed = send(os.getenv("LLM_API_URL"), None, data)
+    else:
+        streamed = pool.call(lambda backend: send(backend.url, backend.api_key, _backend_request(backend, data)))
+    if streamed is None:
         return None
+    value, text = streamed
+    if value is None:
+        return {"choices": [{"message": {"role": "assistant", "content": text}}]}
+    client.record_early_stop()
+    logger.debug("Streamed %s after %s characters: %s", stream_until, len(text), value)
+    return {"choices": [{"message": {"role": "assistant", "content": json.dumps({stream_until: value})}}],
+            "stopped_early": True}
 
 
+def _store_response(data: Dict[str, Any], result: Optional[Dict]):
+    if _cache:
+        _cache.put(data, result)
+    # Failed calls are recorded too, so a replay takes the same path through the agent
+    if _cassette:
+        _cassette.record(data, result)
+
+
+def call_openai_api(prompt:str, system_prompt:str, stream_until: Optional[str] = None, model: Optional[str] = None):
+    """Call the OpenAI API, or answer from the cassette in replay mode or from the response cache.
+        With LLM_STREAM and stream_until the completion is streamed and ends once that JSON field is parsed.
+    """
+    streamed = bool(stream_until) and stream_mode() != "off"
+    data = _api_request(prompt, system_prompt, stream=streamed, model=model)
+    answered, result = _answer_offline(data)
+    if answered:
+        return result
+
+    result = _post_streamed_request(data, stream_until) if streamed else _post_api_request(data)
+    _store_response(data, result)
+    return result
+
+
+# Bounds the LLM requests in flight on the event loop, created on first use inside the loop
+_async_limit: Optional[asyncio.Semaphore] = None
+
+def set_async_concurrency(limit: int):
+    """Limit the number of concurrent call_openai_api_async requests, call inside the event loop."""
+    global _async_limit
+    _async_limit = asyncio.Semaphore(limit)
+
+
+# Coalescer of the requests of the games on the current event loop, None if coalescing is off
+_coalescer: Optional[LLMCoalescer] = None
+_coalescer_loop = None
+
+def _get_coalescer() -> Optional[LLMCoalescer]:
+    global _coalescer, _coalescer_loop
+    loop = asyncio.get_running_loop()
+    if _coalescer_loop is not loop:
+        _coalescer = LLMCoalescer.from_env(_post_api_request, _post_api_batch)
+        _coalescer_loop = loop
+    return _coalescer
+
+
+def llm_coalescer_metrics() -> Optional[LLMCoalescerMetrics]:
+    """Counters of the request coalescer, None if coalescing is off."""
+    return _coalescer.metrics() if _coalescer is not None else None
+
+
+async def call_openai_api_async(prompt: str, system_prompt: str, stream_until: Optional[str] = None,
+                                model: Optional[str] = None):
+    """Awaitable call_openai_api. The blocking pooled client runs in a worker thread, at most
+        LLM_ASYNC_CONCURRENCY (default 16) requests at a time, so many games can share one event loop.
+        With LLM_COALESCE_WINDOW_MS concurrent requests are sent together, see llm_coalescer.py.
+        Streamed requests are not coalesced.
+    """
+    if _async_limit is None:
+        set_async_concurrency(int(os.getenv("LLM_ASYNC_CONCURRENCY", "16")))
+    async with _async_limit:
+        coalescer = _get_coalescer()
+        if coalescer is None or (stream_until and stream_mode() != "off"):
+            return await asyncio.to_thread(call_openai_api, prompt, system_prompt, stream_until, model)
+
+        data = _api_request(prompt, system_prompt, model=model)
+        answered, result = _answer_offline(data)
+        if answered:
+            return result
+        result = await coalescer.submit(data)
+        _store_response(data, result)
+        return result
@@ -0,0 +1,208 @@
+"""
+Rate limiter for LLM calls shared by all processes using the same API key.
+
+Parallel games and batches against one key otherwise trip the provider's
+rate limits in bursts, and every failed call becomes a fallback move. The
+limiter is a token bucket for requests per minute and one for tokens per
+minute. The buckets live in a small JSON state file in the temp folder,
+named after a hash of the API URL and key, and are updated under an
+exclusive file lock, so every game process and every main.py run on this
+machine draws from the same budget.
+
+The limiter adapts:
+    - x-ratelimit-remaining-requests/-tokens response headers cap the buckets
+      at what the provider says is left
+    - a 429 response pauses every process until Retry-After (or the
+      x-ratelimit-reset-* time) and halves the rate, which then recovers by
+      5% per successful call
+    - token costs are estimated before a call (prompt characters / 4 plus
+      LLM_RATE_LIMIT_COMPLETION_TOKENS) and corrected with the usage of the answer
+    - a batched call ({"requests": [...]}, see llm_coalescer.py) is charged
+      for every request it carries, and settled with the usage of every response
+
+Configured from the environment (.env), off unless one of the limits is set:
+    LLM_RATE_LIMIT_RPM                requests per minute (default 0, no limit)
+    LLM_RATE_LIMIT_TPM                tokens per minute (default 0, no limit)
+    LLM_RATE_LIMIT_BURST              seconds of budget that can be spent at once (default 10)
+    LLM_RATE_LIMIT_COMPLETION_TOKENS  expected completion tokens per call (default 1000)
+"""
+
+import fcntl
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from typing import Dict, Mapping, Optional, Tuple
+
+from ..logger import logger
+
+MIN_RATE_SCALE = 0.1
+RATE_RECOVERY = 1.05
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+def parse_reset(value: Optional[str]) -> Optional[float]:
+    """Seconds of an x-ratelimit-reset-* header such as "1s", "6m0s" or "250ms", None if missing or invalid."""
+    if not value:
+        return None
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in parts)
+
+
+def estimate_tokens(payload: Dict, completion_tokens: int) -> int:
+    """Rough token cost of a chat request: four characters per prompt token plus the expected completion."""
+    prompt_chars = sum(len(message.get("content") or "") for message in payload.get("messages", []))
+    return prompt_chars // 4 + completion_tokens
+
+
+def estimate_cost(payload: Dict, completion_tokens: int) -> Tuple[int, int]:
+    """(requests, tokens) a call is charged before it is sent, a batch counts every request it carries."""
+    requests = payload.get("requests")
+    if isinstance(requests, list):
+        return len(requests), sum(estimate_tokens(request, completion_tokens) for request in requests)
+    return 1, estimate_tokens(payload, completion_tokens)
+
+
+def used_tokens(result) -> Optional[int]:
+    """Total tokens reported by an answer, summed over the responses of a batch. None without usage."""
+    if not isinstance(result, dict):
+        return None
+    responses = result.get("responses")
+    if isinstance(responses, list):
+        usages = [used_tokens(response) for response in responses]
+        return sum(usage for usage in usages if usage) or None
+    return (result.get("usage") or {}).get("total_tokens")
+
+
+class SharedRateLimiter:
+    """Token buckets for requests and tokens per minute in a state file shared by processes."""
+
+    def __init__(self, state_file: str, requests_per_minute: float = 0, tokens_per_minute: float = 0,
+                 burst_seconds: float = 10, completion_tokens: int = 1000):
+        self.state_file = state_file
+        self.lock_file = f"{state_file}.lock"
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.burst_seconds = burst_seconds
+        self.completion_tokens = completion_tokens
+        # Threads of one process also share the buckets, the file lock only excludes other processes
+        self._thread_lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, api_url: str, api_key: str) -> Optional["SharedRateLimiter"]:
+        """Limiter configured from the environment, None if no limit is set."""
+        requests_per_minute = float(os.getenv("LLM_RATE_LIMIT_RPM", "0"))
+        tokens_per_minute = float(os.getenv("LLM_RATE_LIMIT_TPM", "0"))
+        if requests_per_minute <= 0 and tokens_per_minute <= 0:
+            return None
+        key_hash = hashlib.sha256(f"{api_url}\n{api_key}".encode('utf-8')).hexdigest()[:16]
+        return cls(os.path.join(tempfile.gettempdir(), f"gnubg_llm_rate_{key_hash}.json"),
+                   requests_per_minute, tokens_per_minute,
+                   burst_seconds=float(os.getenv("LLM_RATE_LIMIT_BURST", "10")),
+                   completion_tokens=int(os.getenv("LLM_RATE_LIMIT_COMPLETION_TOKENS", "1000")))
+
+    def _capacity(self, per_minute: float) -> float:
+        return max(1.0, per_minute / 60 * self.burst_seconds)
+
+    def _update(self, change) -> Dict:
+        """Apply change(state, now) to the refilled shared state under the locks and write it back."""
+        with self._thread_lock, open(self.lock_file, 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                try:
+                    with open(self.state_file, 'r', encoding='utf-8') as f:
+                        state = json.load(f)
+                except (OSError, ValueError):
+                    state = {"requests": self._capacity(self.requests_per_minute),
+                             "tokens": self._capacity(self.tokens_per_minute),
+                             "updated": time.time(), "blocked_until": 0.0, "rate_scale": 1.0}
+                now = time.time()
+                elapsed = max(0.0, now - state["updated"])
+                scale = state["rate_scale"]
+                state["requests"] = min(self._capacity(self.requests_per_minute),
+                                        state["requests"] + elapsed * self.requests_per_minute * scale / 60)
+                state["tokens"] = min(self._capacity(self.tokens_per_minute),
+                                      state["tokens"] + elapsed * self.tokens_per_minute * scale / 60)
+                state["updated"] = now
+                change(state, now)
+                temp_path = f"{self.state_file}.{os.getpid()}.tmp"
+                with open(temp_path, 'w', encoding='utf-8') as f:
+                    json.dump(state, f)
+                os.replace(temp_path, self.state_file)
+                return state
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def acquire(self, tokens: int, requests: int = 1) -> float:
+        """Wait until requests requests of about tokens tokens in total fit the budget and take them.
+            Returns the seconds waited.
+        """
+        start = time.time()
+        while True:
+            wait = {}
+
+            def take(state, now):
+                if now < state["blocked_until"]:
+                    wait["seconds"] = state["blocked_until"] - now
+                    return
+                scale = state["rate_scale"]
+                needed = []
+                # A call larger than the whole bucket goes out once the bucket is full
+                request_cost = min(requests, self._capacity(self.requests_per_minute))
+                if self.requests_per_minute > 0 and state["requests"] < request_cost:
+                    needed.append((request_cost - state["requests"]) * 60 / (self.requests_per_minute * scale))
+                token_cost = min(tokens, self._capacity(self.tokens_per_minute))
+                if self.tokens_per_minute > 0 and state["tokens"] < token_cost:
+                    needed.append((token_cost - state["tokens"]) * 60 / (self.tokens_per_minute * scale))
+                if needed:
+                    wait["seconds"] = max(needed)
+                    return
+                state["requests"] -= requests
+                state["tokens"] -= tokens
+
+            self._update(take)
+            if "seconds" not in wait:
+                return time.time() - start
+            # Short sleeps, other processes may have changed the budget in the meantime
+            time.sleep(min(max(wait["seconds"], 0.01), 1.0))
+
+    def settle(self, estimated_tokens: int, used_tokens: int):
+        """Correct the token bucket with the usage reported for a call."""
+        def correct(state, now):
+            state["tokens"] += estimated_tokens - used_tokens
+        self._update(correct)
+
+    def observe(self, status_code: int, headers: Mapping[str, str], retry_after: Optional[float] = None):
+        """Adapt to a response: cap the buckets at the provider's remaining budget, back off on 429."""
+        def adapt(state, now):
+            remaining_requests = headers.get("x-ratelimit-remaining-requests")
+            remaining_tokens = headers.get("x-ratelimit-remaining-tokens")
+            try:
+                if remaining_requests is not None:
+                    state["requests"] = min(state["requests"], float(remaining_requests))
+                if remaining_tokens is not None:
+                    state["tokens"] = min(state["tokens"], float(remaining_tokens))
+            except ValueError:
+                pass
+            if status_code == 429:
+                pause = retry_after
+                if pause is None:
+                    resets = [parse_reset(headers.get(name)) for name in ("x-ratelimit-reset-requests", "x-ratelimit-reset-tokens")]
+                    pause = max((reset for reset in resets if reset is not None), default=1.0)
+                state["blocked_until"] = max(state["blocked_until"], now + pause)
+                state["rate_scale"] = max(MIN_RATE_SCALE, state["rate_scale"] / 2)
+                logger.warning("LLM rate limit hit, pausing all games for %.1fs at %.0f%% of the configured rate",
+                               pause, state["rate_scale"] * 100)
+            elif status_code == 200:
+                state["rate_scale"] = min(1.0, state["rate_scale"] * RATE_RECOVERY)
+        self._update(adapt)